@@ -1,34 +1,89 @@
 from .components.screenshot import ScreenCapturer
+from .components.label_index import LabelIndex
 from .components.s3_uploader import s3_uploader
+from .components.session_client import session_client
 import os
+import threading
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
 import requests
 
+
+def parse_server_timing(header):
+    """Parse a Server-Timing header into {name: duration_ms}; entries without dur are skipped."""
+    timings = {}
+    for entry in (header or "").split(","):
+        name, *params = [part.strip() for part in entry.split(";")]
+        for param in params:
+            if param.startswith("dur="):
+                try:
+                    timings[name] = float(param[len("dur="):])
+                except ValueError:
+                    pass
+    return timings
+
 class FlyVisionAaaS:
     def __init__(self):
         load_dotenv()
-        self.screen_capturer = ScreenCapturer()
+        # Frames are encoded in memory and uploaded directly; disk copies are optional
+        self.screen_capturer = ScreenCapturer(
+            image_format=os.getenv("CAPTURE_FORMAT", "JPEG"),
+            quality=int(os.getenv("CAPTURE_QUALITY", "85")),
+            max_dimension=int(os.getenv("CAPTURE_MAX_DIMENSION", "0")) or None,
+            save_to_disk=os.getenv("CAPTURE_SAVE_TO_DISK", "0") == "1",
+            change_threshold=int(os.getenv("CAPTURE_CHANGE_THRESHOLD", "8")),
+        )
+        # S3 URL of the last uploaded frame, reused while the screen is unchanged
+        self.last_image_url = None
         self.s3_uploader = s3_uploader()
         self.bucket_name = os.getenv("S3_BUCKET_NAME")
         self.backend_url = os.getenv("BACKEND_URL")
+        # Post frames straight to the backend instead of going through S3 first
+        self.direct_upload = os.getenv("DIRECT_UPLOAD", "0") == "1"
+        # Keep a WebSocket session so touches on an unchanged frame skip re-analysis
+        self.session_client = session_client(self.backend_url) if os.getenv("SESSION_CHANNEL", "0") == "1" else None
+        # Resolve touches locally from one detect-labels call per frame
+        self.local_resolution = os.getenv("LOCAL_RESOLUTION", "0") == "1"
+        # (image URL, LabelIndex with product URLs) of the last frame analyzed locally
+        self.local_frame = None
+        # Ask the backend to analyze each new frame as soon as it is uploaded, before the recommend call
+        self.prefetch_enabled = os.getenv("PREFETCH", "0") == "1"
+        # Client-side stage timings (ms) of the last recognize_image call, plus the backend's Server-Timing
+        self.last_timings = {}
+
+    @contextmanager
+    def _timed(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.last_timings[stage] = (time.perf_counter() - start) * 1000.0
 
     def recognize_image(self):
-        imgpath = self.screen_capturer.screenshot_full()
-        # print(f"Screenshot saved at: {imgpath}")
-        url = self.s3_uploader.upload_to_s3(imgpath, self.bucket_name)
-
-        payload = {
-                    "image_s3_url": url,
-                    "touch_point": {
-                        "x": 540,
-                        "y": 960
-                    },
-                    "screen_resolution": {
-                        "width": 1080,
-                        "height": 1920
+        touch_point = {"x": 540, "y": 960}
+        screen_resolution = {"width": 1080, "height": 1920}
+        self.last_timings = {}
+
+        if self.local_resolution and not self.direct_upload:
+            return self.recognize_locally(touch_point, screen_resolution)
+        if self.session_client is not None and not self.direct_upload:
+            return self.recognize_via_session(touch_point, screen_resolution)
+
+        if self.direct_upload:
+            url = None
+            response = self.recommend_direct(touch_point, screen_resolution)
+        else:
+            url = self.capture_and_upload()
+            payload = {
+                        "image_s3_url": url,
+                        "touch_point": touch_point,
+                        "screen_resolution": screen_resolution
                     }
-                }
-        response = requests.post(f"{self.backend_url}/api/recommend", json=payload)
+            with self._timed("recommend"):
+                response = requests.post(f"{self.backend_url}/api/recommend", json=payload)
+        self.last_timings["server"] = parse_server_timing(response.headers.get("Server-Timing"))
+        self.print_timings()
         if response.ok:
             try:
                 result = response.json()
@@ -43,4 +98,102 @@ class FlyVisionAaaS:
             print(f"Request failed with status code: {response.status_code}")
             return None
 
+    def capture_and_upload(self):
+        """Upload the current screen, or reuse the previous S3 URL when the frame has not changed."""
+        with self._timed("capture"):
+            frame = self.screen_capturer.capture_if_changed(force=self.last_image_url is None)
+        if frame is None:
+            print(f"Screen unchanged, reusing: {self.last_image_url}")
+            return self.last_image_url
+
+        buffer, filename, content_type = frame
+        with self._timed("upload"):
+            url = self.s3_uploader.upload_bytes(buffer, self.bucket_name, filename, content_type)
+        if url is None:
+            self.screen_capturer.reset_reference()
+        elif self.prefetch_enabled:
+            self.prefetch(url)
+        self.last_image_url = url
+        return url
+
+    def prefetch(self, image_url):
+        """Start backend analysis of an uploaded frame without waiting for it."""
+        def send():
+            try:
+                requests.post(f"{self.backend_url}/api/prefetch", json={"image_url": image_url}, timeout=5)
+            except requests.RequestException as e:
+                print(f"Prefetch failed: {str(e)}")
+
+        threading.Thread(target=send, daemon=True).start()
+
+    def recognize_via_session(self, touch_point, screen_resolution):
+        """Register the frame on the session channel when it changed, then resolve the touch in memory."""
+        url = self.capture_and_upload()
+        if url is None:
+            return None
+        try:
+            if url != self.session_client.image_url:
+                with self._timed("register"):
+                    self.session_client.register(url, screen_resolution)
+            with self._timed("recommend"):
+                result = self.session_client.touch(touch_point, screen_resolution)
+        except Exception as e:
+            print(f"Session request failed: {str(e)}")
+            return None
+        self.print_timings()
+        print(f"Response JSON: {str(result)}")
+        if result.get("product_url") is not None:
+            url = result.get("product_url")
+        return url
+
+    def recognize_locally(self, touch_point, screen_resolution):
+        """Analyze each new frame once, then resolve touches on it without any network call."""
+        url = self.capture_and_upload()
+        if url is None:
+            return None
+        try:
+            index = self.load_frame(url)
+        except Exception as e:
+            print(f"Frame analysis failed: {str(e)}")
+            return None
+        with self._timed("resolve"):
+            label, product_url = index.resolve(touch_point, screen_resolution)
+        self.print_timings()
+        print(f"Resolved locally: {label} -> {product_url}")
+        return product_url if product_url is not None else url
+
+    def load_frame(self, image_url):
+        """Return the LabelIndex for a frame, calling detect-labels and product-urls only for a new one."""
+        if self.local_frame is not None and self.local_frame[0] == image_url:
+            return self.local_frame[1]
+        with self._timed("detect"):
+            response = requests.post(f"{self.backend_url}/api/detect-labels", json={"image_url": image_url})
+            response.raise_for_status()
+            index = LabelIndex.from_labels(response.json().get("Labels") or [])
+        self.last_timings["server"] = parse_server_timing(response.headers.get("Server-Timing"))
+        candidates = index.candidates()
+        if candidates:
+            # Every label a touch could land on, so later touches never go back to the backend
+            with self._timed("product_urls"):
+                response = requests.post(f"{self.backend_url}/api/product-urls", json={"labels": candidates})
+                response.raise_for_status()
+                index.product_urls = response.json().get("product_urls") or {}
+        self.local_frame = (image_url, index)
+        return index
+
+    def recommend_direct(self, touch_point, screen_resolution):
+        """Send the frame bytes with the touch point to /api/recommend-image in one request."""
+        with self._timed("capture"):
+            buffer, filename, content_type = self.screen_capturer.capture_full()
+        # Upload and recommendation share one request here, so they are timed together
+        with self._timed("recommend"):
+            return requests.post(
+                f"{self.backend_url}/api/recommend-image",
+                files={"image": (filename, buffer, content_type)},
+                data={**touch_point, **screen_resolution},
+            )
 
+    def print_timings(self):
+        client = ", ".join(f"{stage}={ms:.1f}" for stage, ms in self.last_timings.items() if stage != "server")
+        server = ", ".join(f"{stage}={ms:.1f}" for stage, ms in self.last_timings.get("server", {}).items())
+        print(f"Timings (ms): {client} | server: {server or 'n/a'}")
@@ -0,0 +1,84 @@
+class LabelIndex:
+    """Compact local copy of one frame's DetectLabels boxes.
+
+    Resolves touches with the same rules as the backend's LabelIndex.query:
+    boxes containing the point win, tie-broken by smallest area, then highest
+    confidence, then distance to the box centre; otherwise the closest box,
+    lightly weighted by confidence; with no boxes, the most confident label.
+    """
+
+    def __init__(self, names, boxes, fallback, related):
+        self.names = names
+        # One tuple per instance: (left, top, right, bottom, cx, cy, area, confidence, name index)
+        self.boxes = boxes
+        self.fallback = fallback
+        # Label name -> Aliases then Parents, sent along when fetching product URLs
+        self.related = related
+        self.product_urls = {}
+
+    @classmethod
+    def from_labels(cls, labels):
+        names, boxes, related = [], [], {}
+        name_ids = {}
+        for label in labels:
+            name = label.get("Name")
+            if name:
+                related[name] = [
+                    r["Name"] for r in (label.get("Aliases") or []) + (label.get("Parents") or [])
+                    if isinstance(r, dict) and r.get("Name")
+                ]
+            for inst in label.get("Instances") or []:
+                box = inst.get("BoundingBox") or {}
+                width = float(box.get("Width", 0))
+                height = float(box.get("Height", 0))
+                if width <= 0 or height <= 0:
+                    continue
+                left = float(box.get("Left", 0))
+                top = float(box.get("Top", 0))
+                conf = float(inst.get("Confidence", label.get("Confidence", 0.0)))
+                if name not in name_ids:
+                    name_ids[name] = len(names)
+                    names.append(name)
+                boxes.append((left, top, left + width, top + height, left + width / 2.0, top + height / 2.0,
+                              width * height, conf, name_ids[name]))
+
+        fallback = None
+        if labels:
+            fallback = max(labels, key=lambda l: float(l.get("Confidence", 0.0))).get("Name")
+        return cls(names, boxes, fallback, related)
+
+    def candidates(self):
+        """Every label a touch can resolve to, with its related names, for a product URL prefetch."""
+        names = list(self.names)
+        if self.fallback is not None and self.fallback not in names:
+            names.append(self.fallback)
+        return [{"name": name, "related": self.related.get(name, [])} for name in names if name]
+
+    def query(self, u, v):
+        """Pick the label under normalized point (u, v)."""
+        if not self.boxes:
+            return self.fallback
+
+        inside = None
+        closest = None
+        for left, top, right, bottom, cx, cy, area, conf, name_id in self.boxes:
+            dist2 = (u - cx) ** 2 + (v - cy) ** 2
+            if left <= u <= right and top <= v <= bottom:
+                key = (area, -conf, dist2)
+                # Strict comparisons keep the first of equal boxes, like the backend's stable sort
+                if inside is None or key < inside[0]:
+                    inside = (key, name_id)
+            elif inside is None:
+                score = -dist2 + conf / 1000.0
+                if closest is None or score > closest[0]:
+                    closest = (score, name_id)
+        return self.names[(inside or closest)[1]]
+
+    def resolve(self, touch_point, screen_resolution):
+        """Return (label, product_url) for a touch in screen pixels; no network involved."""
+        width = float(screen_resolution["width"])
+        height = float(screen_resolution["height"])
+        if width <= 0 or height <= 0:
+            raise ValueError("Invalid screen resolution")
+        label = self.query(float(touch_point["x"]) / width, float(touch_point["y"]) / height)
+        return label, self.product_urls.get(label)
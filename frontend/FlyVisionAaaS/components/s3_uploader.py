@@ -1,17 +1,32 @@
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import uuid
 import os
+import mimetypes
+
+MB = 1024 * 1024
 
 class s3_uploader:
-    def __init__(self):
+    def __init__(self, transfer_config=None, max_workers=None):
+        # Multipart threshold, part size and per-object concurrency for every upload
+        self.transfer_config = transfer_config or TransferConfig(
+            multipart_threshold=int(os.getenv("S3_MULTIPART_THRESHOLD_MB", "8")) * MB,
+            multipart_chunksize=int(os.getenv("S3_MULTIPART_CHUNKSIZE_MB", "8")) * MB,
+            max_concurrency=int(os.getenv("S3_MAX_CONCURRENCY", "10")),
+        )
+        # Objects uploaded in parallel by upload_many
+        self.max_workers = max_workers or int(os.getenv("S3_UPLOAD_WORKERS", "8"))
         self.s3_client = self.get_s3_client()
 
     def get_s3_client(self):
         try:
             s3_client = boto3.client(
                 's3',
+                config=Config(max_pool_connections=self.max_workers * self.transfer_config.max_concurrency),
             )
             return s3_client
         except Exception as e:
@@ -24,12 +39,14 @@ class s3_uploader:
         
         try:
             filename = os.path.basename(imgpath)
+            content_type = mimetypes.guess_type(filename)[0] or "image/png"
             with open(imgpath, "rb") as file:
                 self.s3_client.upload_fileobj(
                     file,
                     bucket_name,
                     filename,
-                    ExtraArgs={"ContentType": "image/png"}
+                    ExtraArgs={"ContentType": content_type},
+                    Config=self.transfer_config
                 )
             # Generate URL
             # url = f"https://{bucket_name}.s3.ap-northeast-1.amazonaws.com/{filename}"
@@ -43,5 +60,70 @@ class s3_uploader:
         except Exception as e:
             print(f"Unexpected error: {str(e)}")
             return None
+
+    def upload_bytes(self, buffer, bucket_name, filename, content_type, callback=None):
+        """
+        Upload an in-memory image (file-like object) without touching disk.
+        callback, if given, receives the number of bytes sent since its previous call.
+        """
+        if not self.s3_client:
+            return None
+
+        try:
+            self.s3_client.upload_fileobj(
+                buffer,
+                bucket_name,
+                filename,
+                ExtraArgs={"ContentType": content_type},
+                Config=self.transfer_config,
+                Callback=callback
+            )
+            url = self.object_url(bucket_name, filename)
+            print(f"Uploaded to S3: {url}")
+            return url
+
+        except ClientError as e:
+            print(f"Error uploading to S3: {str(e)}")
+            return None
+        except Exception as e:
+            print(f"Unexpected error: {str(e)}")
+            return None
+
+    def upload_many(self, items, bucket_name, progress=None):
+        """
+        Upload many images through a bounded thread pool.
+        items: a directory path, or a list of (filename, buffer, content_type) tuples.
+        progress, if given, is called as progress(filename, bytes_sent).
+        Returns one {"filename", "url", "error"} dict per item, in input order.
+        """
+        if not self.s3_client:
+            return []
+
+        if isinstance(items, str):
+            items = [
+                (name, os.path.join(items, name), mimetypes.guess_type(name)[0] or "application/octet-stream")
+                for name in sorted(os.listdir(items))
+                if os.path.isfile(os.path.join(items, name))
+            ]
+
+        def run(item):
+            filename, source, content_type = item
+            callback = (lambda sent: progress(filename, sent)) if progress else None
+            try:
+                if isinstance(source, str):
+                    with open(source, "rb") as file:
+                        url = self.upload_bytes(file, bucket_name, filename, content_type, callback)
+                else:
+                    url = self.upload_bytes(source, bucket_name, filename, content_type, callback)
+            except Exception as e:
+                return {"filename": filename, "url": None, "error": str(e)}
+            return {"filename": filename, "url": url, "error": None if url else "upload failed"}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(run, items))
+
+    def object_url(self, bucket_name, key):
+        region = os.getenv("S3_REGION", "ap-northeast-1")
+        return f"https://{bucket_name}.s3.{region}.amazonaws.com/{key}"
         
 
@@ -1,11 +1,31 @@
 import pyscreenshot as ImageGrab
+from PIL import Image
 from datetime import datetime
+import io
 import uuid
 import os
 
+# Pillow format name -> (file extension, content type)
+IMAGE_FORMATS = {
+    "JPEG": ("jpg", "image/jpeg"),
+    "WEBP": ("webp", "image/webp"),
+    "PNG": ("png", "image/png"),
+}
+
 class ScreenCapturer:
-    def __init__(self, save_dir="screenshots"):
+    def __init__(self, save_dir="screenshots", image_format="PNG", quality=85, max_dimension=None, save_to_disk=True,
+                 change_threshold=8, hash_size=16):
         self.save_dir = save_dir
+        self.image_format = image_format.upper()
+        if self.image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unsupported image format: {image_format}")
+        self.quality = quality
+        self.max_dimension = max_dimension
+        self.save_to_disk = save_to_disk
+        # Max differing hash bits for two grabs to count as the same frame; negative disables the check
+        self.change_threshold = change_threshold
+        self.hash_size = hash_size
+        self.reference_hash = None
         os.makedirs(self.save_dir, exist_ok=True)
 
     def screenshot_full(self, filename=None):
@@ -18,6 +38,79 @@ class ScreenCapturer:
         img.save(path)
         return path
 
+    def capture_full(self, bbox=None):
+        """
+        Grab the screen and encode it in memory.
+        Returns (buffer, filename, content_type); the buffer is rewound and ready to upload.
+        The encoded file is also written to save_dir when save_to_disk is set.
+        """
+        img = ImageGrab.grab(bbox=bbox) if bbox else ImageGrab.grab()
+        self.reference_hash = self.frame_hash(img)
+        return self._encode_frame(img)
+
+    def capture_if_changed(self, bbox=None, force=False):
+        """
+        Like capture_full, but returns None without encoding when the screen still matches
+        the last returned frame within change_threshold.
+        """
+        img = ImageGrab.grab(bbox=bbox) if bbox else ImageGrab.grab()
+        frame_hash = self.frame_hash(img)
+        if not force and self.is_same_frame(frame_hash):
+            return None
+        # Compare against the last frame handed out, not the last grab, so slow drift still registers
+        self.reference_hash = frame_hash
+        return self._encode_frame(img)
+
+    def frame_hash(self, img):
+        """Difference hash: one bit per horizontally adjacent pixel pair of a tiny grayscale thumbnail."""
+        size = self.hash_size
+        small = img.convert("L").resize((size + 1, size), Image.BOX)
+        pixels = list(small.getdata())
+        value = 0
+        for row in range(size):
+            offset = row * (size + 1)
+            for col in range(size):
+                value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+        return value
+
+    def is_same_frame(self, frame_hash):
+        if self.change_threshold < 0 or self.reference_hash is None:
+            return False
+        return bin(frame_hash ^ self.reference_hash).count("1") <= self.change_threshold
+
+    def reset_reference(self):
+        """Forget the last frame, e.g. when its upload failed."""
+        self.reference_hash = None
+
+    def _encode_frame(self, img):
+        buffer = self.encode(img)
+        ext, content_type = IMAGE_FORMATS[self.image_format]
+        filename = self._generate_filename(ext)
+        if self.save_to_disk:
+            with open(os.path.join(self.save_dir, filename), "wb") as f:
+                f.write(buffer.getbuffer())
+        return buffer, filename, content_type
+
+    def encode(self, img):
+        """Downscale to max_dimension (long edge) and encode into a BytesIO."""
+        if self.max_dimension and max(img.size) > self.max_dimension:
+            img = img.copy()
+            img.thumbnail((self.max_dimension, self.max_dimension), Image.LANCZOS)
+        if self.image_format == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+
+        options = {}
+        if self.image_format in ("JPEG", "WEBP"):
+            options["quality"] = self.quality
+        if self.image_format == "PNG":
+            # Fastest zlib level: screenshots are uploaded immediately, size matters less than latency
+            options["compress_level"] = 1
+
+        buffer = io.BytesIO()
+        img.save(buffer, format=self.image_format, **options)
+        buffer.seek(0)
+        return buffer
+
     def screenshot_object(self, bbox, filename=None):
         """
         Take a screenshot of the object.
@@ -31,6 +124,6 @@ class ScreenCapturer:
         img.save(path)
         return path
 
-    def _generate_filename(self):
-        unique_filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.png"
+    def _generate_filename(self, ext="png"):
+        unique_filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.{ext}"
         return unique_filename
@@ -0,0 +1,104 @@
+import itertools
+import json
+import threading
+
+from websockets.exceptions import ConnectionClosed
+from websockets.sync.client import connect
+
+
+class SessionError(Exception):
+    def __init__(self, status, detail):
+        super().__init__(f"{status}: {detail}")
+        self.status = status
+        self.detail = detail
+
+
+class session_client:
+    """Keeps one WebSocket open to the backend's /ws/session channel.
+
+    A frame is registered once; touches on it are then resolved by the backend
+    from its cached labels. After a dropped connection the client reconnects
+    and resumes the session, re-registering the frame if it has expired.
+    """
+
+    def __init__(self, backend_url, timeout=30.0):
+        base = backend_url.rstrip("/")
+        if base.startswith("https://"):
+            base = "wss://" + base[len("https://"):]
+        elif base.startswith("http://"):
+            base = "ws://" + base[len("http://"):]
+        self.url = f"{base}/ws/session"
+        self.timeout = timeout
+        self.ws = None
+        self.session_id = None
+        # Frame the current session was registered with, used to re-register after expiry
+        self.image_url = None
+        self.screen_resolution = None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self.ws is None:
+            # legacy=True keeps a connection opened outside a with block; close_socket() closes it
+            self.ws = connect(self.url, open_timeout=self.timeout, legacy=True)
+            if self.session_id is not None:
+                reply = self._roundtrip({"type": "resume", "session_id": self.session_id})
+                if reply.get("type") == "error":
+                    self.session_id = None
+
+    def _roundtrip(self, message):
+        self.ws.send(json.dumps(message))
+        return json.loads(self.ws.recv(timeout=self.timeout))
+
+    def _request(self, message):
+        # One retry on a fresh connection if the socket dropped since the last call
+        for attempt in range(2):
+            try:
+                self._connect()
+                return self._roundtrip(message)
+            except (ConnectionClosed, OSError, TimeoutError):
+                self.close_socket()
+                if attempt:
+                    raise
+
+    def register(self, image_url, screen_resolution):
+        """Analyze a frame on the backend and keep its labels for later touches."""
+        with self._lock:
+            reply = self._request({
+                "type": "register",
+                "image_url": image_url,
+                "screen_resolution": screen_resolution,
+            })
+            if reply.get("type") == "error":
+                raise SessionError(reply.get("status"), reply.get("detail"))
+            self.session_id = reply["session_id"]
+            self.image_url = image_url
+            self.screen_resolution = screen_resolution
+            return reply
+
+    def touch(self, touch_point, screen_resolution=None):
+        """Resolve a touch on the registered frame; returns the result message."""
+        with self._lock:
+            message = {"type": "touch", "id": next(self._ids), "touch_point": touch_point}
+            if screen_resolution is not None:
+                message["screen_resolution"] = screen_resolution
+            reply = self._request(message)
+        if reply.get("status") in (409, 410) and self.image_url is not None:
+            # Session expired on the backend (or was lost with its worker); register the frame again
+            self.register(self.image_url, self.screen_resolution)
+            with self._lock:
+                reply = self._request(message)
+        return reply
+
+    def close_socket(self):
+        if self.ws is not None:
+            try:
+                self.ws.close()
+            except Exception:
+                pass
+            self.ws = None
+
+    def close(self):
+        with self._lock:
+            self.close_socket()
+            self.session_id = None
@@ -1,10 +1,53 @@
-from flask import Flask, render_template, jsonify
+import json
+import os
+import threading
+
+from dotenv import load_dotenv
+from flask import Flask, Response, render_template, jsonify, request, stream_with_context, url_for
 from FlyVisionAaaS.FlyVisionAaaS import FlyVisionAaaS
+from jobs import JobQueue, QueueFull
+
+load_dotenv()
 
 app = Flask(__name__)
 
-# Initialize the screen capturer
-FlyVisionAaaS_instance_1 = FlyVisionAaaS()
+# One FlyVisionAaaS shared by every job worker, so frame-change detection and the session
+# channel see each capture in order; the lock runs one recognition at a time
+_flyvision = None
+_flyvision_lock = threading.Lock()
+
+
+def recognize():
+    global _flyvision
+    # FlyVision integration logic here
+    with _flyvision_lock:
+        if _flyvision is None:
+            _flyvision = FlyVisionAaaS()
+        path = _flyvision.recognize_image()
+        timings = _flyvision.last_timings
+    print(f"Returned URL: {path}")
+    if path is None:
+        raise RuntimeError("No product found for the current screen")
+    return {"url": path.replace("static/", "/static/"), "timings": timings}
+
+
+jobs = JobQueue(
+    recognize,
+    max_workers=int(os.getenv("JOB_WORKERS", "1")),
+    max_queued=int(os.getenv("JOB_MAX_QUEUED", "8")),
+    result_ttl=float(os.getenv("JOB_RESULT_TTL_SECONDS", "300")),
+)
+
+
+def _job_payload(job):
+    return {
+        **job.to_dict(),
+        "position": jobs.position(job),
+        "queue": jobs.stats(),
+        "status_url": url_for("job_status", job_id=job.id),
+        "events_url": url_for("job_events", job_id=job.id),
+    }
+
 
 @app.route("/")
 def home():
@@ -12,12 +55,44 @@ def home():
 
 @app.route("/run-function", methods=["POST"])
 def FlyVision_Plugin():
-    # FlyVision integration logic here
-    path= FlyVisionAaaS_instance_1.recognize_image()
-    print(f"Returned URL: {path}")
-    url_path = path.replace("static/", "/static/")
+    """Queue a recognition and return its job id at once; clicks during an in-flight job join it."""
+    key = request.headers.get("X-Client-Id") or request.remote_addr
+    try:
+        job, merged = jobs.submit(key)
+    except QueueFull:
+        response = jsonify({"error": "Too many pending requests, try again shortly", "queue": jobs.stats()})
+        response.status_code = 503
+        response.headers["Retry-After"] = "1"
+        return response
+    return jsonify({**_job_payload(job), "job_id": job.id, "merged": merged}), 202
+
+@app.route("/jobs")
+def job_queue():
+    return jsonify(jobs.stats())
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(_job_payload(job))
+
+@app.route("/jobs/<job_id>/events")
+def job_events(job_id):
+    """Server-Sent Events: a status event while the job waits or runs, then one final done/failed event."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    interval = float(os.getenv("JOB_EVENT_INTERVAL_SECONDS", "0.5"))
+
+    def stream():
+        while not job.done.wait(interval):
+            yield f"event: status\ndata: {json.dumps(_job_payload(job))}\n\n"
+        yield f"event: {job.status}\ndata: {json.dumps(_job_payload(job))}\n\n"
 
-    return jsonify({"url": url_path})
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache"})
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    # threaded: SSE streams hold a request thread each while jobs run in the pool
+    app.run(debug=True, threaded=True)
@@ -0,0 +1,129 @@
+import itertools
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class Job:
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        # Submissions merged into this job while it was queued or running
+        self.merged = 0
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+        # Monotonic submission order, used to report queue position
+        self.seq = None
+
+    def to_dict(self):
+        data = {"id": self.id, "status": self.status, "merged": self.merged}
+        if self.status == "done":
+            data["result"] = self.result
+        elif self.status == "failed":
+            data["error"] = self.error
+        if self.started_at is not None:
+            data["wait_ms"] = round((self.started_at - self.created_at) * 1000.0, 1)
+        if self.finished_at is not None:
+            data["run_ms"] = round((self.finished_at - self.started_at) * 1000.0, 1)
+        return data
+
+
+class JobQueue:
+    """Bounded background job runner.
+
+    Work runs on a fixed pool of threads so the request thread returns at once.
+    A submission whose key matches a queued or running job joins that job
+    instead of starting another one, so repeated clicks cost a single run.
+    At most ``max_queued`` jobs wait for a worker; beyond that submit raises QueueFull.
+    Finished jobs stay readable for ``result_ttl`` seconds; expired ones are dropped
+    whenever the queue is read or written, so an idle queue does not keep them.
+    """
+
+    def __init__(self, fn, max_workers=2, max_queued=8, result_ttl=300.0):
+        self.fn = fn
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="flyvision-job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._active = {}  # key -> job still queued or running
+        self._seq = itertools.count()
+
+    def submit(self, key):
+        """Return (job, merged); merged is True when an in-flight job with the same key was reused."""
+        with self._lock:
+            self._prune()
+            job = self._active.get(key)
+            if job is not None:
+                job.merged += 1
+                return job, True
+            if self._count("queued") >= self.max_queued:
+                raise QueueFull()
+            job = Job(key)
+            job.seq = next(self._seq)
+            self._jobs[job.id] = job
+            self._active[key] = job
+        self._executor.submit(self._run, job)
+        return job, False
+
+    def get(self, job_id):
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id)
+
+    def position(self, job):
+        """Number of queued jobs ahead of this one (0 once it is running)."""
+        with self._lock:
+            if job.status != "queued":
+                return 0
+            return sum(1 for other in self._jobs.values() if other.status == "queued" and other.seq < job.seq)
+
+    def stats(self):
+        with self._lock:
+            self._prune()
+            return {
+                "queued": self._count("queued"),
+                "running": self._count("running"),
+                "workers": self.max_workers,
+                "max_queued": self.max_queued,
+            }
+
+    def _count(self, status):
+        return sum(1 for job in self._jobs.values() if job.status == status)
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _run(self, job):
+        with self._lock:
+            job.status = "running"
+            job.started_at = time.time()
+        try:
+            result = self.fn()
+        except Exception as e:
+            with self._lock:
+                job.status, job.error = "failed", str(e)
+        else:
+            with self._lock:
+                job.status, job.result = "done", result
+        finally:
+            with self._lock:
+                job.finished_at = time.time()
+                if self._active.get(job.key) is job:
+                    del self._active[job.key]
+            job.done.set()
@@ -2,38 +2,134 @@ import os
 from dotenv import load_dotenv
 import boto3
 import logging
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
 # Load .env file from the backend directory
 load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '.env'))
 
+MB = 1024 * 1024
+
+
+def default_transfer_config():
+    """Build a TransferConfig from S3_MULTIPART_THRESHOLD_MB, S3_MULTIPART_CHUNKSIZE_MB and S3_MAX_CONCURRENCY."""
+    return TransferConfig(
+        multipart_threshold=int(os.getenv('S3_MULTIPART_THRESHOLD_MB', '8')) * MB,
+        multipart_chunksize=int(os.getenv('S3_MULTIPART_CHUNKSIZE_MB', '8')) * MB,
+        max_concurrency=int(os.getenv('S3_MAX_CONCURRENCY', '10')),
+    )
+
+
 class S3Uploader:
-    def __init__(self):
-        """Initialize the S3Uploader with AWS credentials."""
+    def __init__(self, transfer_config=None, max_workers=None):
+        """Initialize the S3Uploader with AWS credentials.
+
+        :param transfer_config: boto3 TransferConfig for multipart threshold, chunk size and
+            per-object concurrency. Defaults to default_transfer_config()
+        :param max_workers: Objects uploaded in parallel by upload_many (S3_UPLOAD_WORKERS, default 8)
+        """
         self.aws_access_key_id = os.getenv('AWS_ACCESS_KEY_ID')
         self.aws_secret_access_key = os.getenv('AWS_SECRET_ACCESS_KEY')
+        self.transfer_config = transfer_config or default_transfer_config()
+        self.max_workers = max_workers or int(os.getenv('S3_UPLOAD_WORKERS', '8'))
+        # Every worker thread and every multipart part needs its own pooled connection
+        pool_size = self.max_workers * self.transfer_config.max_concurrency
         self.s3_client = boto3.client(
             's3',
+            config=Config(max_pool_connections=pool_size),
             # aws_access_key_id=self.aws_access_key_id,
             # aws_secret_access_key=self.aws_secret_access_key
         )
         # print ("self.aws_access_key_id:", self.aws_access_key_id)
         # print ("self.aws_secret_access_key:", self.aws_secret_access_key)
 
-    def upload_file(self, file_name, bucket, object_name=None):
+    def upload_file(self, file_name, bucket, object_name=None, callback=None):
         """Upload a file to an S3 bucket.
 
         :param file_name: File to upload
         :param bucket: Bucket to upload to
         :param object_name: S3 object name. If not specified then file_name is used
+        :param callback: Called with the number of bytes sent since the previous call
         :return: True if file was uploaded, else False
         """
         # If S3 object_name was not specified, use file_name
         if object_name is None:
             object_name = os.path.basename(file_name)
         try:
-            response = self.s3_client.upload_file(file_name, bucket, object_name)
+            response = self.s3_client.upload_file(
+                file_name, bucket, object_name, Config=self.transfer_config, Callback=callback
+            )
+        except ClientError as e:
+            logging.error(e)
+            return False
+        return True
+
+    def upload_fileobj(self, fileobj, bucket, object_name, callback=None, extra_args=None):
+        """Upload a file-like object (e.g. a BytesIO buffer) to an S3 bucket.
+
+        :return: True if the object was uploaded, else False
+        """
+        try:
+            self.s3_client.upload_fileobj(
+                fileobj, bucket, object_name, ExtraArgs=extra_args, Config=self.transfer_config, Callback=callback
+            )
         except ClientError as e:
             logging.error(e)
             return False
-        return True
\ No newline at end of file
+        return True
+
+    def upload_many(self, items, bucket, prefix='', progress=None):
+        """Upload many objects through a bounded thread pool.
+
+        :param items: A directory path (uploaded recursively), a file path, a list of file paths,
+            or a list of (object_name, file-like object) pairs
+        :param bucket: Bucket to upload to
+        :param prefix: Key prefix prepended to every object name
+        :param progress: Called as progress(object_name, bytes_sent) as chunks complete
+        :return: One dict per object, in input order, with object_name, success and error
+        """
+        jobs = [(prefix + name, source) for name, source in self._expand_items(items)]
+
+        def run(job):
+            object_name, source = job
+            callback = (lambda sent: progress(object_name, sent)) if progress else None
+            extra_args = {'ContentType': mimetypes.guess_type(object_name)[0] or 'application/octet-stream'}
+            try:
+                if isinstance(source, str):
+                    self.s3_client.upload_file(
+                        source, bucket, object_name, ExtraArgs=extra_args, Config=self.transfer_config,
+                        Callback=callback
+                    )
+                else:
+                    self.s3_client.upload_fileobj(
+                        source, bucket, object_name, ExtraArgs=extra_args, Config=self.transfer_config,
+                        Callback=callback
+                    )
+            except Exception as e:
+                logging.error("Failed to upload %s: %s", object_name, e)
+                return {'object_name': object_name, 'success': False, 'error': str(e)}
+            return {'object_name': object_name, 'success': True, 'error': None}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(run, jobs))
+
+    @staticmethod
+    def _expand_items(items):
+        if isinstance(items, str):
+            if not os.path.isdir(items):
+                # A single file path, not a sequence of one-character names
+                yield os.path.basename(items), items
+                return
+            for root, _, files in os.walk(items):
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    yield os.path.relpath(path, items).replace(os.sep, '/'), path
+            return
+        for item in items:
+            if isinstance(item, str):
+                yield os.path.basename(item), item
+            else:
+                yield item
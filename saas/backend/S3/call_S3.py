@@ -1,5 +1,6 @@
 import sys
 import os
+import threading
 import boto3
 from pathlib import Path
 from dotenv import load_dotenv
@@ -19,6 +20,22 @@ except Exception:
         print("Failed to import S3Uploader:", e)
         raise
 
+def seed_directory(uploader, directory, bucket_name, prefix):
+    sent = {"bytes": 0}
+    # Callbacks arrive from the transfer manager's worker threads
+    sent_lock = threading.Lock()
+
+    def progress(object_name, bytes_sent):
+        with sent_lock:
+            sent["bytes"] += bytes_sent
+
+    results = uploader.upload_many(directory, bucket_name, prefix=prefix, progress=progress)
+    failed = [r for r in results if not r["success"]]
+    print(f"Uploaded {len(results) - len(failed)}/{len(results)} objects ({sent['bytes']} bytes) to bucket '{bucket_name}'.")
+    for r in failed:
+        print(f"  {r['object_name']}: {r['error']}")
+
+
 def main():
     # Check for available AWS credentials (env, shared config, or IAM role)
     creds = boto3.Session().get_credentials()
@@ -32,6 +49,12 @@ def main():
     bucket_name = "ifer-s3-demo-bucket"
     object_name = None
 
+    # Seeding mode: python -m backend.S3.call_S3 <directory> [bucket] [prefix]
+    if len(sys.argv) > 1:
+        seed_directory(uploader, sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else bucket_name,
+                       sys.argv[3] if len(sys.argv) > 3 else "")
+        return
+
     success = uploader.upload_file(demo_file, bucket_name, object_name)
     if success:
         print(f"File '{demo_file}' uploaded successfully to bucket '{bucket_name}'.")
@@ -0,0 +1,20 @@
+from django.apps import AppConfig
+
+
+class ApiConfig(AppConfig):
+    name = 'backend.api'
+
+    def warm_up(self):
+        """
+        Load the product catalog and detector before the first request.
+
+        Called from the WSGI/ASGI entry points rather than ready(), so manage.py
+        commands such as migrate, check or shell start no catalog watcher and
+        make no S3 calls; outside a server both load lazily on first use.
+        """
+        from .catalog import get_catalog
+        get_catalog()
+
+        # Fail fast on a bad DETECTOR_BACKEND and load local models once per worker
+        from .detectors import get_detector
+        get_detector().warm_up()
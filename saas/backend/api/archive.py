@@ -0,0 +1,71 @@
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from .clients import get_s3_client
+
+logger = logging.getLogger(__name__)
+
+_EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/webp': 'webp',
+    'image/gif': 'gif',
+    'image/bmp': 'bmp',
+}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+# Each pending upload holds a whole image, so at most this many wait or run at once
+_pending = threading.BoundedSemaphore(int(os.getenv('ARCHIVE_MAX_PENDING', '32')))
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is not None:
+        return _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv('ARCHIVE_WORKERS', '4')),
+                thread_name_prefix='image-archive',
+            )
+    return _executor
+
+
+def _put_object(bucket: str, key: str, image_bytes: bytes, content_type: str) -> None:
+    try:
+        get_s3_client().put_object(Bucket=bucket, Key=key, Body=image_bytes, ContentType=content_type)
+    except Exception:
+        logger.exception('Failed to archive image to s3://%s/%s', bucket, key)
+    finally:
+        _pending.release()
+
+
+def archive_image(image_bytes: bytes, content_type: str) -> Optional[str]:
+    """
+    Queue a background upload of a directly submitted image.
+
+    Keys are content-addressed, so the S3 URL is known before the upload finishes
+    and resubmitting the same frame overwrites rather than duplicates it.
+    Returns None when ARCHIVE_BUCKET is not configured, or when ARCHIVE_MAX_PENDING
+    uploads are already pending and this image is dropped.
+    """
+    bucket = os.getenv('ARCHIVE_BUCKET')
+    if not bucket:
+        return None
+    prefix = os.getenv('ARCHIVE_PREFIX', 'direct-uploads').strip('/')
+    ext = _EXTENSIONS.get(content_type, 'bin')
+    key = f"{prefix}/{hashlib.sha256(image_bytes).hexdigest()}.{ext}"
+    if not _pending.acquire(blocking=False):
+        logger.warning('Archive queue is full; not archiving s3://%s/%s', bucket, key)
+        return None
+    try:
+        _get_executor().submit(_put_object, bucket, key, image_bytes, content_type)
+    except Exception:
+        _pending.release()
+        raise
+    return f"s3://{bucket}/{key}"
@@ -0,0 +1,356 @@
+"""
+Async variants of the API views, served when the project runs under ASGI.
+
+They share request validation and label selection with ``views`` but await the
+S3 fetch, the HTTP fetch and the detector call on non-blocking I/O, so an
+in-flight request no longer pins a worker thread.
+"""
+import asyncio
+import json
+import os
+from typing import Any, Dict, Optional, Tuple
+
+from django.http import JsonResponse, HttpRequest
+from django.views.decorators.csrf import csrf_exempt
+
+from .archive import archive_image
+from .cache import detect_labels_cache
+from .clients import get_async_http_client, get_async_s3_client
+from .detectors import Detector, get_detector
+from .disk_cache import disk_detect_cache
+from .limiter import detection_limiter
+from .prefetch import prefetch_pool
+from .metrics import mark, stage
+from .projection import fast_json_response, parse_detect_options, project_detect_response, wants_projection
+from .preprocess import run_preprocess_async
+from .singleflight import async_analysis_flight
+from .spatial import label_indexes
+from .streaming import open_image_stream_async, request_image_headers, streaming_image_response_async
+from .views import (
+    DetectionError,
+    ImageFetchError,
+    _analysis_error_response,
+    _batch_results,
+    _bucket_regions,
+    _cached_full_frame,
+    _content_type_for_url,
+    _detect_params,
+    _direct_image_request,
+    _fetch_image_url,
+    _has_instances,
+    _is_invalid_s3_object,
+    _map_to_frame,
+    _parse_batch_items,
+    _parse_s3_url,
+    _prefetch_key,
+    _recommend_for_labels,
+    _roi_window,
+    _s3_url_region,
+    _use_s3_object,
+)
+
+
+async def _fetch_image_bytes_async(image_url: str) -> bytes:
+    parsed = _parse_s3_url(image_url)
+    if parsed:
+        bucket, key = parsed
+        s3_client = await get_async_s3_client()
+        obj = await s3_client.get_object(Bucket=bucket, Key=key)
+        async with obj['Body'] as body:
+            return await body.read()
+    # Assume HTTP(S)
+    timeout = float(os.getenv('S3_TIMEOUT_SECONDS', '15'))
+    resp = await get_async_http_client().get(image_url, timeout=timeout)
+    resp.raise_for_status()
+    return resp.content
+
+
+async def _detect_labels_async(image_bytes: bytes) -> Dict[str, Any]:
+    detector = get_detector()
+    max_labels, min_conf = _detect_params()
+    key = detect_labels_cache.make_key(image_bytes, max_labels, min_conf, detector.name)
+    cached = detect_labels_cache.get(key)
+    if cached is not None:
+        mark('cache', 'hit')
+        return cached
+    mark('cache', 'miss')
+    with stage('preprocess'):
+        prepared = await run_preprocess_async(image_bytes)
+    with stage('detect'):
+        resp = await detection_limiter.call_async(
+            lambda: detector.detect_async(prepared.data if prepared else image_bytes, max_labels, min_conf))
+    if prepared:
+        resp = {**resp, 'Preprocessing': prepared.describe()}
+    detect_labels_cache.set(key, resp)
+    return resp
+
+
+async def _detect_labels_s3_object_async(bucket: str, key: str, detector: Detector) -> Dict[str, Any]:
+    max_labels, min_conf = _detect_params()
+    with stage('detect'):
+        return await detection_limiter.call_async(
+            lambda: detector.detect_s3_object_async(bucket, key, max_labels, min_conf))
+
+
+async def _detect_labels_region_async(image_bytes: bytes,
+                                      window: Tuple[float, float, float, float]) -> Optional[Dict[str, Any]]:
+    detector = get_detector()
+    max_labels, min_conf = _detect_params()
+    key = detect_labels_cache.make_key(image_bytes, max_labels, min_conf, detector.name, window)
+    resp = detect_labels_cache.get(key)
+    if resp is None:
+        mark('cache', 'miss')
+        with stage('preprocess'):
+            prepared = await run_preprocess_async(image_bytes, crop=window)
+        if prepared is None:
+            return None
+        with stage('detect'):
+            resp = await detection_limiter.call_async(
+                lambda: detector.detect_async(prepared.data, max_labels, min_conf))
+        resp = _map_to_frame({**resp, 'Preprocessing': prepared.describe()}, prepared.crop)
+        detect_labels_cache.set(key, resp)
+    else:
+        mark('cache', 'hit')
+    return resp if _has_instances(resp) else None
+
+
+async def _bucket_region_async(image_url: str, bucket: str) -> Optional[str]:
+    region = _s3_url_region(image_url) or _bucket_regions.get(bucket)
+    if region:
+        return region
+    try:
+        s3_client = await get_async_s3_client()
+        location = await s3_client.get_bucket_location(Bucket=bucket)
+        region = location.get('LocationConstraint') or 'us-east-1'
+    except Exception:
+        return None
+    _bucket_regions[bucket] = region
+    return region
+
+
+async def _image_etag_async(image_url: str) -> Optional[str]:
+    location = _parse_s3_url(image_url)
+    return await _head_etag_async(location[0], location[1]) if location else None
+
+
+async def _analyze_image_async(image_url: str) -> Dict[str, Any]:
+    etag = await _image_etag_async(image_url)
+    prefetched = await prefetch_pool.lookup_async(_prefetch_key(image_url, etag))
+    if prefetched is not None:
+        mark('prefetch', 'hit')
+        return prefetched
+    return await async_analysis_flight.do((image_url, etag), lambda: _fetch_and_detect_async(image_url, etag))
+
+
+async def _analyze_region_async(image_url: str, window: Tuple[float, float, float, float]) -> Dict[str, Any]:
+    prefetched = await prefetch_pool.lookup_async(_prefetch_key(image_url, await _image_etag_async(image_url)))
+    if prefetched is not None:
+        mark('prefetch', 'hit')
+        return prefetched
+    return await async_analysis_flight.do((image_url, window),
+                                          lambda: _fetch_and_detect_region_async(image_url, window))
+
+
+async def _fetch_and_detect_region_async(image_url: str,
+                                         window: Tuple[float, float, float, float]) -> Dict[str, Any]:
+    try:
+        with stage('fetch'):
+            image_bytes = await _fetch_image_bytes_async(image_url)
+    except Exception as e:
+        raise ImageFetchError(str(e)) from e
+    try:
+        resp = _cached_full_frame(image_bytes)
+        if resp is not None:
+            mark('roi', 'full-frame')
+            return resp
+        resp = await _detect_labels_region_async(image_bytes, window)
+        if resp is not None:
+            mark('roi', 'crop')
+            return resp
+        mark('roi', 'fallback')
+        return await _detect_labels_async(image_bytes)
+    except Exception as e:
+        raise DetectionError(str(e)) from e
+
+
+async def _fetch_and_detect_async(image_url: str, etag: Optional[str]) -> Dict[str, Any]:
+    location = _parse_s3_url(image_url)
+    if not (location and etag):
+        return await _detect_image_async(image_url, location)
+    bucket, key = location
+    max_labels, min_conf = _detect_params()
+    backend = get_detector().name
+    object_key = detect_labels_cache.make_object_key(bucket, key, etag, max_labels, min_conf, backend)
+    cached = detect_labels_cache.get(object_key)
+    if cached is not None:
+        mark('cache', 'hit')
+        return cached
+    disk_key = None
+    if disk_detect_cache.enabled:
+        disk_key = disk_detect_cache.make_key(bucket, key, etag, max_labels, min_conf, backend)
+        # SQLite calls block, so they run on a thread; each thread keeps its own connection
+        with stage('disk_cache'):
+            cached = await asyncio.to_thread(disk_detect_cache.get, disk_key)
+        if cached is not None:
+            mark('disk_cache', 'hit')
+            detect_labels_cache.set(object_key, cached)
+            return cached
+        mark('disk_cache', 'miss')
+    resp = await _detect_image_async(image_url, location)
+    if disk_key:
+        await asyncio.to_thread(disk_detect_cache.set, disk_key, resp)
+    detect_labels_cache.set(object_key, resp)
+    return resp
+
+
+async def _head_etag_async(bucket: str, key: str) -> Optional[str]:
+    try:
+        with stage('head'):
+            s3_client = await get_async_s3_client()
+            head = await s3_client.head_object(Bucket=bucket, Key=key)
+            return head.get('ETag')
+    except Exception:
+        return None
+
+
+async def _detect_image_async(image_url: str, location: Optional[Tuple[str, str]]) -> Dict[str, Any]:
+    if location:
+        bucket, key = location
+        detector = get_detector()
+        if detector.supports_s3_object and _use_s3_object(
+                await _bucket_region_async(image_url, bucket), detector.region()):
+            try:
+                return await _detect_labels_s3_object_async(bucket, key, detector)
+            except Exception as e:
+                if not _is_invalid_s3_object(e):
+                    raise DetectionError(str(e)) from e
+    try:
+        with stage('fetch'):
+            image_bytes = await _fetch_image_bytes_async(image_url)
+    except Exception as e:
+        raise ImageFetchError(str(e)) from e
+    try:
+        return await _detect_labels_async(image_bytes)
+    except Exception as e:
+        raise DetectionError(str(e)) from e
+
+
+@csrf_exempt
+async def recommend_product(request: HttpRequest):
+    if request.method != 'POST':
+        return JsonResponse({'detail': 'Method not allowed'}, status=405)
+
+    try:
+        payload = json.loads(request.body.decode('utf-8'))
+    except Exception:
+        return JsonResponse({'detail': 'Invalid JSON body'}, status=400)
+
+    image_url = payload.get('image_s3_url')
+    point = payload.get('touch_point') or {}
+    resolution = payload.get('screen_resolution') or {}
+
+    if not isinstance(image_url, str) or not image_url:
+        return JsonResponse({'detail': 'image_s3_url is required'}, status=400)
+    if not (isinstance(point, dict) and 'x' in point and 'y' in point):
+        return JsonResponse({'detail': 'touch_point with x,y required'}, status=400)
+    if not (isinstance(resolution, dict) and 'width' in resolution and 'height' in resolution):
+        return JsonResponse({'detail': 'screen_resolution with width,height required'}, status=400)
+
+    window = _roi_window(point, resolution)
+    try:
+        resp = await (_analyze_region_async(image_url, window) if window else _analyze_image_async(image_url))
+    except (ImageFetchError, DetectionError) as e:
+        return _analysis_error_response(e)
+
+    with stage('match'):
+        index = label_indexes.get(resp)
+    body, status = _recommend_for_labels(index, point, resolution)
+    return JsonResponse(body, status=status)
+
+
+@csrf_exempt
+async def recommend_batch(request: HttpRequest):
+    if request.method != 'POST':
+        return JsonResponse({'detail': 'Method not allowed'}, status=405)
+
+    try:
+        payload = json.loads(request.body.decode('utf-8'))
+    except Exception:
+        return JsonResponse({'detail': 'Invalid JSON body'}, status=400)
+
+    try:
+        parsed = _parse_batch_items(payload)
+    except ValueError as e:
+        return JsonResponse({'detail': str(e)}, status=400)
+
+    urls = list(dict.fromkeys(item['image_s3_url'] for item in parsed if 'image_s3_url' in item))
+    outcomes = await asyncio.gather(*(_analyze_image_async(url) for url in urls), return_exceptions=True)
+    analyses: Dict[str, Any] = {}
+    for url, outcome in zip(urls, outcomes):
+        if isinstance(outcome, Exception) and not isinstance(outcome, (ImageFetchError, DetectionError)):
+            raise outcome
+        analyses[url] = outcome
+
+    return JsonResponse({'items': _batch_results(parsed, analyses)})
+
+
+@csrf_exempt
+async def recommend_image(request: HttpRequest):
+    submission, error = _direct_image_request(request)
+    if error is not None:
+        return error
+
+    try:
+        resp = await _detect_labels_async(submission['image_bytes'])
+    except Exception as e:
+        return _analysis_error_response(e)
+
+    with stage('match'):
+        index = label_indexes.get(resp)
+    body, status = _recommend_for_labels(index, submission['touch_point'], submission['screen_resolution'])
+    archived_url = archive_image(submission['image_bytes'], submission['content_type'])
+    if archived_url:
+        body['image_s3_url'] = archived_url
+    return JsonResponse(body, status=status)
+
+
+@csrf_exempt
+async def fetch_image(request: HttpRequest):
+    image_url, error = _fetch_image_url(request)
+    if error is not None:
+        return error
+
+    try:
+        with stage('fetch'):
+            stream = await open_image_stream_async(image_url, _parse_s3_url(image_url), request_image_headers(request))
+        return await streaming_image_response_async(stream, _content_type_for_url(image_url))
+    except Exception as e:
+        return JsonResponse({'detail': f'Failed to fetch image: {str(e)}'}, status=400)
+
+
+@csrf_exempt
+async def detect_labels(request: HttpRequest):
+    if request.method != 'POST':
+        return JsonResponse({'detail': 'Method not allowed'}, status=405)
+
+    try:
+        payload = json.loads(request.body.decode('utf-8'))
+    except Exception:
+        return JsonResponse({'detail': 'Invalid JSON body'}, status=400)
+
+    image_url = payload.get('image_url')
+    if not isinstance(image_url, str) or not image_url:
+        return JsonResponse({'detail': 'image_url is required'}, status=400)
+    try:
+        options = parse_detect_options(payload) if wants_projection(payload) else None
+    except ValueError as e:
+        return JsonResponse({'detail': str(e)}, status=400)
+
+    try:
+        resp = await _analyze_image_async(image_url)
+    except (ImageFetchError, DetectionError) as e:
+        return _analysis_error_response(e)
+
+    if options is not None:
+        resp = project_detect_response(resp, options)
+    return fast_json_response(resp)
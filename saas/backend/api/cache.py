@@ -0,0 +1,95 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class DetectLabelsCache:
+    """
+    Thread-safe LRU cache for DetectLabels responses.
+
+    Entries are keyed by a hash of the image bytes plus the detection
+    parameters, so repeat taps on the same frame skip the detector call.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: 'OrderedDict[str, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(image_bytes: bytes, max_labels: int, min_confidence: float,
+                 backend: str = 'rekognition', crop: Optional[Tuple[float, ...]] = None) -> str:
+        # The backend is part of the key so switching detectors never serves another model's labels
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        key = f"{backend}:{digest}:{max_labels}:{min_confidence:g}"
+        if crop is not None:
+            key += ':crop=' + ','.join(f'{c:g}' for c in crop)
+        return key
+
+    @staticmethod
+    def make_object_key(bucket: str, key: str, etag: str, max_labels: int, min_confidence: float,
+                        backend: str = 'rekognition') -> str:
+        # For S3 images looked up before their bytes are read; the ETag changes whenever the object is overwritten
+        return f"{backend}:s3://{bucket}/{key}:{etag}:{max_labels}:{min_confidence:g}"
+
+    @staticmethod
+    def make_url_key(image_url: str, max_labels: int, min_confidence: float, backend: str = 'rekognition',
+                     etag: Optional[str] = None) -> str:
+        # For analyses started from a URL before the image bytes are known (see prefetch.py); S3 images
+        # add their ETag, so a frame uploaded again under the same key is not served the old analysis
+        key = f"{backend}:{image_url}:{max_labels}:{min_confidence:g}"
+        return f"{key}:{etag}" if etag else key
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        if self.max_entries <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+detect_labels_cache = DetectLabelsCache(
+    max_entries=int(os.getenv('DETECT_CACHE_MAX_ENTRIES', '256')),
+    ttl_seconds=float(os.getenv('DETECT_CACHE_TTL_SECONDS', '300')),
+)
@@ -0,0 +1,178 @@
+import csv
+import io
+import json
+import logging
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Tuple
+
+from .clients import get_s3_client
+from .s3util import _parse_s3_url
+
+logger = logging.getLogger(__name__)
+
+# Used when PRODUCT_CATALOG_SOURCE is not set.
+# Keys should match Rekognition label names (case-insensitive match is attempted).
+DEFAULT_PRODUCT_URLS = {
+    "t-shirt": "https://example.com/products/t-shirt",
+    "shirt": "https://example.com/products/shirt",
+    "jeans": "https://example.com/products/jeans",
+    "shoe": "https://example.com/products/shoe",
+    "sneaker": "https://example.com/products/sneaker",
+    "bottle": "https://example.com/products/bottle",
+    "phone": "https://example.com/products/phone",
+    "tie": "https://www.hermes.com/hk/en/category/men/ties-stoles-and-scarves/#|",
+}
+
+
+@lru_cache(maxsize=4096)
+def normalize_label(label: str) -> str:
+    # "Mobile Phone", "mobile phone" and "mobile-phone" all normalize to the same key
+    return re.sub(r"[^a-z0-9]+", "-", label.strip().lower()).strip("-")
+
+
+def _parse_mapping(data: bytes, source: str) -> Dict[str, str]:
+    """
+    Parse a catalog file into a raw label -> url mapping.
+
+    JSON may be an object ({"label": "url"}) or a list of {"label", "url"} records;
+    CSV needs a header row with ``label`` and ``url`` columns.
+    """
+    if source.lower().endswith('.csv'):
+        reader = csv.DictReader(io.StringIO(data.decode('utf-8-sig')))
+        return {row['label']: row['url'] for row in reader if row.get('label') and row.get('url')}
+
+    parsed = json.loads(data.decode('utf-8'))
+    if isinstance(parsed, dict):
+        return {str(k): str(v) for k, v in parsed.items() if v}
+    if isinstance(parsed, list):
+        return {str(r['label']): str(r['url']) for r in parsed if isinstance(r, dict) and r.get('label') and r.get('url')}
+    raise ValueError(f'Unsupported catalog format in {source}')
+
+
+class ProductCatalog:
+    """
+    Label -> product URL index loaded from a JSON/CSV file or S3 object.
+
+    The mapping is normalized once at load time so lookups are a single dict
+    access, and a background watcher swaps in a new index when the source's
+    mtime (local files) or ETag (S3 objects) changes.
+    """
+
+    def __init__(self, source: Optional[str] = None, reload_seconds: float = 30.0):
+        self.source = source
+        self.reload_seconds = reload_seconds
+        self.version: Optional[str] = None
+        self._index: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _s3_location(self) -> Optional[Tuple[str, str]]:
+        return _parse_s3_url(self.source) if self.source else None
+
+    def _current_version(self) -> Optional[str]:
+        if not self.source:
+            return None
+        location = self._s3_location()
+        if location:
+            bucket, key = location
+            return get_s3_client().head_object(Bucket=bucket, Key=key)['ETag']
+        return str(os.stat(self.source).st_mtime_ns)
+
+    def _read_source(self) -> Tuple[bytes, Optional[str]]:
+        location = self._s3_location()
+        if location:
+            bucket, key = location
+            obj = get_s3_client().get_object(Bucket=bucket, Key=key)
+            return obj['Body'].read(), obj['ETag']
+        with open(self.source, 'rb') as f:
+            version = str(os.fstat(f.fileno()).st_mtime_ns)
+            return f.read(), version
+
+    def load(self) -> None:
+        if not self.source:
+            self._install(DEFAULT_PRODUCT_URLS, None)
+            return
+        data, version = self._read_source()
+        self._install(_parse_mapping(data, self.source), version)
+
+    def _install(self, mapping: Dict[str, str], version: Optional[str]) -> None:
+        index = {}
+        for label, url in mapping.items():
+            key = normalize_label(label)
+            if key:
+                index[key] = url
+        # Swapping the reference is atomic, so readers never see a half-built index
+        with self._lock:
+            self._index = index
+            self.version = version
+        logger.info('Loaded %d product mappings (version %s)', len(index), version)
+
+    def refresh(self) -> bool:
+        """Reload the catalog if its source changed; returns True when a new index was loaded."""
+        if not self.source or self._current_version() == self.version:
+            return False
+        self.load()
+        return True
+
+    def start_watcher(self) -> None:
+        if not self.source or self.reload_seconds <= 0 or self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, name='product-catalog-watcher', daemon=True)
+        self._watcher.start()
+
+    def _watch(self) -> None:
+        while True:
+            time.sleep(self.reload_seconds)
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception('Failed to reload product catalog from %s', self.source)
+
+    def lookup(self, label: str, related: Iterable[str] = ()) -> Optional[str]:
+        """
+        Return the product URL for ``label``.
+
+        When the label itself has no entry, ``related`` names (Rekognition
+        Aliases, then Parents) are tried in order.
+        """
+        index = self._index
+        for name in (label, *related):
+            if not name or not isinstance(name, str):
+                continue
+            url = index.get(normalize_label(name))
+            if url:
+                return url
+        return None
+
+
+_catalog: Optional[ProductCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> ProductCatalog:
+    global _catalog
+    if _catalog is not None:
+        return _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            catalog = ProductCatalog(
+                source=os.getenv('PRODUCT_CATALOG_SOURCE') or None,
+                reload_seconds=float(os.getenv('PRODUCT_CATALOG_RELOAD_SECONDS', '30')),
+            )
+            try:
+                catalog.load()
+            except Exception:
+                # Keep serving the built-in mapping rather than failing every request
+                # The watcher keeps retrying since the installed version never matches the source
+                logger.exception('Failed to load product catalog from %s; using defaults', catalog.source)
+                catalog._install(DEFAULT_PRODUCT_URLS, None)
+            catalog.start_watcher()
+            _catalog = catalog
+    return _catalog
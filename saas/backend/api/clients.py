@@ -0,0 +1,121 @@
+import asyncio
+import os
+import threading
+import weakref
+from typing import Any, Dict, Optional, Tuple
+
+import boto3
+import httpx
+import requests
+from aiobotocore.config import AioConfig
+from aiobotocore.session import get_session
+from botocore.config import Config
+from requests.adapters import HTTPAdapter
+
+# Process-wide client registry. boto3 clients and requests sessions are safe to share
+# between threads once built, so each one is created lazily and reused by every view.
+_lock = threading.Lock()
+_boto_clients: Dict[Tuple[str, Optional[str]], Any] = {}
+_http_session: Optional[requests.Session] = None
+
+# Async clients hold connections bound to the event loop that created them,
+# so they are registered per running loop rather than per process.
+_async_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Any, Any]]' = weakref.WeakKeyDictionary()
+_async_locks: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]' = weakref.WeakKeyDictionary()
+
+
+def _max_pool_connections() -> int:
+    return int(os.getenv('AWS_MAX_POOL_CONNECTIONS', '50'))
+
+
+def _config_options(service: str) -> Dict[str, Any]:
+    options: Dict[str, Any] = {'max_pool_connections': _max_pool_connections()}
+    if service == 'rekognition':
+        # Detection calls are retried by the detection limiter (limiter.py) under a deadline;
+        # botocore's own retries would hide throttling from it and hold the caller meanwhile
+        options['retries'] = {'total_max_attempts': 1, 'mode': 'standard'}
+    return options
+
+
+def get_boto_client(service: str, region: Optional[str] = None):
+    region = region or os.getenv('AWS_REGION')
+    key = (service, region)
+    client = _boto_clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _boto_clients.get(key)
+        if client is None:
+            config = Config(**_config_options(service))
+            # Creating clients from the default session is not thread-safe, so this stays under the lock
+            client = boto3.session.Session().client(service, region_name=region, config=config)
+            _boto_clients[key] = client
+    return client
+
+
+def get_s3_client(region: Optional[str] = None):
+    return get_boto_client('s3', region)
+
+
+def get_rekognition_client(region: Optional[str] = None):
+    return get_boto_client('rekognition', region)
+
+
+def get_http_session() -> requests.Session:
+    global _http_session
+    if _http_session is not None:
+        return _http_session
+    with _lock:
+        if _http_session is None:
+            pool_size = int(os.getenv('HTTP_POOL_MAXSIZE', '50'))
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _http_session = session
+    return _http_session
+
+
+def _loop_state() -> Tuple[Dict[Any, Any], asyncio.Lock]:
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        lock = _async_locks.setdefault(loop, asyncio.Lock())
+    return clients, lock
+
+
+async def get_async_boto_client(service: str, region: Optional[str] = None):
+    region = region or os.getenv('AWS_REGION')
+    key = (service, region)
+    clients, lock = _loop_state()
+    client = clients.get(key)
+    if client is not None:
+        return client
+    async with lock:
+        client = clients.get(key)
+        if client is None:
+            config = AioConfig(**_config_options(service))
+            creator = get_session().create_client(service, region_name=region, config=config)
+            # The client lives for the lifetime of the loop, so its context is entered once and never exited
+            client = await creator.__aenter__()
+            clients[key] = client
+    return client
+
+
+async def get_async_s3_client(region: Optional[str] = None):
+    return await get_async_boto_client('s3', region)
+
+
+async def get_async_rekognition_client(region: Optional[str] = None):
+    return await get_async_boto_client('rekognition', region)
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    clients, _ = _loop_state()
+    client = clients.get('http')
+    if client is None:
+        pool_size = int(os.getenv('HTTP_POOL_MAXSIZE', '50'))
+        limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        client = httpx.AsyncClient(limits=limits, follow_redirects=True)
+        clients['http'] = client
+    return client
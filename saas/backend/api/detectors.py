@@ -0,0 +1,309 @@
+"""
+Pluggable label detectors.
+
+Every backend returns a DetectLabels-shaped response::
+
+    {'Labels': [{'Name', 'Confidence', 'Instances': [{'BoundingBox', 'Confidence'}],
+                 'Parents', 'Aliases'}]}
+
+with BoundingBox values as ratios of the image size, so caching, label
+selection and the views stay backend-agnostic. DETECTOR_BACKEND selects
+``rekognition`` (default), ``local`` (an OpenCV DNN model on the CPU) or
+``fixture`` (a canned response for tests and offline load runs).
+"""
+import asyncio
+import copy
+import json
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+from .clients import get_async_rekognition_client, get_async_s3_client, get_rekognition_client, get_s3_client
+
+logger = logging.getLogger(__name__)
+
+
+class Detector(ABC):
+    name = 'detector'
+    # Whether detect_s3_object can read an S3 image without the backend downloading it;
+    # when False the views download the image instead and these methods go unused
+    supports_s3_object = False
+
+    def region(self) -> Optional[str]:
+        return None
+
+    def warm_up(self) -> None:
+        """Load anything expensive before the first request."""
+
+    @abstractmethod
+    def detect(self, image_bytes: bytes, max_labels: int, min_confidence: float) -> Dict[str, Any]:
+        """Label an encoded image."""
+
+    async def detect_async(self, image_bytes: bytes, max_labels: int, min_confidence: float) -> Dict[str, Any]:
+        # CPU-bound backends run in a thread so they never block the event loop
+        return await asyncio.to_thread(self.detect, image_bytes, max_labels, min_confidence)
+
+    def detect_s3_object(self, bucket: str, key: str, max_labels: int, min_confidence: float) -> Dict[str, Any]:
+        # Backends without supports_s3_object download the object and label its bytes
+        obj = get_s3_client().get_object(Bucket=bucket, Key=key)
+        return self.detect(obj['Body'].read(), max_labels, min_confidence)
+
+    async def detect_s3_object_async(self, bucket: str, key: str, max_labels: int,
+                                     min_confidence: float) -> Dict[str, Any]:
+        s3_client = await get_async_s3_client()
+        obj = await s3_client.get_object(Bucket=bucket, Key=key)
+        async with obj['Body'] as body:
+            image_bytes = await body.read()
+        return await self.detect_async(image_bytes, max_labels, min_confidence)
+
+
+class RekognitionDetector(Detector):
+    name = 'rekognition'
+    supports_s3_object = True
+
+    def region(self) -> Optional[str]:
+        return get_rekognition_client().meta.region_name
+
+    def detect(self, image_bytes: bytes, max_labels: int, min_confidence: float) -> Dict[str, Any]:
+        return get_rekognition_client().detect_labels(
+            Image={'Bytes': image_bytes},
+            MaxLabels=max_labels,
+            MinConfidence=min_confidence,
+        )
+
+    async def detect_async(self, image_bytes: bytes, max_labels: int, min_confidence: float) -> Dict[str, Any]:
+        rekognition = await get_async_rekognition_client()
+        return await rekognition.detect_labels(
+            Image={'Bytes': image_bytes},
+            MaxLabels=max_labels,
+            MinConfidence=min_confidence,
+        )
+
+    def detect_s3_object(self, bucket: str, key: str, max_labels: int, min_confidence: float) -> Dict[str, Any]:
+        return get_rekognition_client().detect_labels(
+            Image={'S3Object': {'Bucket': bucket, 'Name': key}},
+            MaxLabels=max_labels,
+            MinConfidence=min_confidence,
+        )
+
+    async def detect_s3_object_async(self, bucket: str, key: str, max_labels: int,
+                                     min_confidence: float) -> Dict[str, Any]:
+        rekognition = await get_async_rekognition_client()
+        return await rekognition.detect_labels(
+            Image={'S3Object': {'Bucket': bucket, 'Name': key}},
+            MaxLabels=max_labels,
+            MinConfidence=min_confidence,
+        )
+
+
+def _labels_from_detections(detections: List[Dict[str, Any]], max_labels: int) -> Dict[str, Any]:
+    # Group per-box detections by class name, Rekognition style: one label, many instances
+    labels: Dict[str, Dict[str, Any]] = {}
+    for det in detections:
+        label = labels.setdefault(det['Name'], {
+            'Name': det['Name'],
+            'Confidence': 0.0,
+            'Instances': [],
+            'Parents': [],
+            'Aliases': [],
+        })
+        label['Confidence'] = max(label['Confidence'], det['Confidence'])
+        label['Instances'].append({'BoundingBox': det['BoundingBox'], 'Confidence': det['Confidence']})
+    ordered = sorted(labels.values(), key=lambda lbl: lbl['Confidence'], reverse=True)
+    return {'Labels': ordered[:max_labels]}
+
+
+class LocalDetector(Detector):
+    """
+    Object detector running an OpenCV DNN model on the CPU.
+
+    Any model cv2.dnn_DetectionModel understands works (SSD, YOLO Darknet,
+    ONNX exports with a detection head); class names come from a text file
+    with one name per line, indexed by class id. The model is loaded once per
+    worker process and inference is serialized, since OpenCV already spreads
+    one forward pass across cores.
+    """
+
+    name = 'local'
+
+    def __init__(self, model_path: str, config_path: Optional[str] = None,
+                 labels_path: Optional[str] = None, input_size: int = 320,
+                 scale: float = 1.0 / 127.5, mean: float = 127.5, swap_rb: bool = True,
+                 nms_threshold: float = 0.4):
+        self.model_path = model_path
+        self.config_path = config_path
+        self.labels_path = labels_path
+        self.input_size = input_size
+        self.scale = scale
+        self.mean = mean
+        self.swap_rb = swap_rb
+        self.nms_threshold = nms_threshold
+        self._model = None
+        self._class_names: List[str] = []
+        self._lock = threading.Lock()
+
+    def warm_up(self) -> None:
+        with self._lock:
+            self._load()
+
+    def _load(self):
+        if self._model is not None:
+            return self._model
+        try:
+            import cv2
+        except ImportError as e:
+            raise RuntimeError(
+                "DETECTOR_BACKEND=local requires OpenCV; install the 'local' extra (opencv-python-headless)"
+            ) from e
+        net = cv2.dnn.readNet(self.model_path, self.config_path or '')
+        model = cv2.dnn_DetectionModel(net)
+        model.setInputParams(
+            scale=self.scale,
+            size=(self.input_size, self.input_size),
+            mean=(self.mean, self.mean, self.mean),
+            swapRB=self.swap_rb,
+        )
+        if self.labels_path:
+            with open(self.labels_path, encoding='utf-8') as f:
+                self._class_names = [line.strip() for line in f]
+        self._model = model
+        logger.info('Loaded local detector model %s', self.model_path)
+        return model
+
+    def _class_name(self, class_id: int) -> str:
+        if 0 <= class_id < len(self._class_names) and self._class_names[class_id]:
+            return self._class_names[class_id]
+        return f'class_{class_id}'
+
+    def detect(self, image_bytes: bytes, max_labels: int, min_confidence: float) -> Dict[str, Any]:
+        import cv2
+        import numpy as np
+
+        image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError('Unable to decode image')
+        height, width = image.shape[:2]
+        with self._lock:
+            model = self._load()
+            class_ids, confidences, boxes = model.detect(
+                image, confThreshold=min_confidence / 100.0, nmsThreshold=self.nms_threshold
+            )
+
+        detections = []
+        for class_id, conf, (x, y, w, h) in zip(np.ravel(class_ids), np.ravel(confidences), boxes):
+            # Clip both edges to the frame, so a box starting left of or above it also loses that part
+            left = min(max(x / width, 0.0), 1.0)
+            top = min(max(y / height, 0.0), 1.0)
+            right = min(max((x + w) / width, 0.0), 1.0)
+            bottom = min(max((y + h) / height, 0.0), 1.0)
+            detections.append({
+                'Name': self._class_name(int(class_id)),
+                'Confidence': float(conf) * 100.0,
+                'BoundingBox': {
+                    'Left': left,
+                    'Top': top,
+                    'Width': right - left,
+                    'Height': bottom - top,
+                },
+            })
+        return _labels_from_detections(detections, max_labels)
+
+
+DEFAULT_FIXTURE: Dict[str, Any] = {
+    'Labels': [
+        {
+            'Name': 'Tie',
+            'Confidence': 97.5,
+            'Instances': [{
+                'BoundingBox': {'Left': 0.45, 'Top': 0.35, 'Width': 0.1, 'Height': 0.3},
+                'Confidence': 97.5,
+            }],
+            'Parents': [{'Name': 'Accessories'}],
+            'Aliases': [],
+        },
+        {
+            'Name': 'Shirt',
+            'Confidence': 92.0,
+            'Instances': [{
+                'BoundingBox': {'Left': 0.2, 'Top': 0.25, 'Width': 0.6, 'Height': 0.5},
+                'Confidence': 92.0,
+            }],
+            'Parents': [{'Name': 'Clothing'}],
+            'Aliases': [],
+        },
+        {
+            'Name': 'Person',
+            'Confidence': 99.0,
+            'Instances': [],
+            'Parents': [],
+            'Aliases': [{'Name': 'Human'}],
+        },
+    ],
+}
+
+
+class FixtureDetector(Detector):
+    """
+    Deterministic detector that returns a canned response regardless of the image.
+
+    The response is read from a JSON file in DetectLabels form, or falls back to
+    DEFAULT_FIXTURE. max_labels and min_confidence are applied as Rekognition would.
+    """
+
+    name = 'fixture'
+
+    def __init__(self, fixture_path: Optional[str] = None):
+        self.fixture_path = fixture_path
+        if fixture_path:
+            with open(fixture_path, encoding='utf-8') as f:
+                self.response = json.load(f)
+        else:
+            self.response = DEFAULT_FIXTURE
+
+    def detect(self, image_bytes: bytes, max_labels: int, min_confidence: float) -> Dict[str, Any]:
+        labels = [
+            copy.deepcopy(label) for label in self.response.get('Labels') or []
+            if label.get('Confidence', 0.0) >= min_confidence
+        ]
+        return {'Labels': labels[:max_labels]}
+
+    async def detect_async(self, image_bytes: bytes, max_labels: int, min_confidence: float) -> Dict[str, Any]:
+        return self.detect(image_bytes, max_labels, min_confidence)
+
+
+def _build_detector(backend: str) -> Detector:
+    if backend == 'rekognition':
+        return RekognitionDetector()
+    if backend == 'local':
+        model_path = os.getenv('LOCAL_DETECTOR_MODEL')
+        if not model_path:
+            raise ValueError('DETECTOR_BACKEND=local requires LOCAL_DETECTOR_MODEL')
+        return LocalDetector(
+            model_path=model_path,
+            config_path=os.getenv('LOCAL_DETECTOR_CONFIG') or None,
+            labels_path=os.getenv('LOCAL_DETECTOR_LABELS') or None,
+            input_size=int(os.getenv('LOCAL_DETECTOR_INPUT_SIZE', '320')),
+            scale=float(os.getenv('LOCAL_DETECTOR_SCALE', str(1.0 / 127.5))),
+            mean=float(os.getenv('LOCAL_DETECTOR_MEAN', '127.5')),
+            swap_rb=os.getenv('LOCAL_DETECTOR_SWAP_RB', '1') == '1',
+            nms_threshold=float(os.getenv('LOCAL_DETECTOR_NMS_THRESHOLD', '0.4')),
+        )
+    if backend == 'fixture':
+        return FixtureDetector(os.getenv('DETECTOR_FIXTURE') or None)
+    raise ValueError(f'Unknown DETECTOR_BACKEND: {backend}')
+
+
+_detector: Optional[Detector] = None
+_detector_lock = threading.Lock()
+
+
+def get_detector() -> Detector:
+    global _detector
+    if _detector is not None:
+        return _detector
+    with _detector_lock:
+        if _detector is None:
+            _detector = _build_detector(os.getenv('DETECTOR_BACKEND', 'rekognition').strip().lower())
+    return _detector
@@ -0,0 +1,184 @@
+"""
+On-disk DetectLabels cache for S3 images, keyed by (bucket, key, ETag).
+
+A restarted or newly scaled worker can answer for an image it has never seen
+with one HEAD request and a local SQLite lookup instead of downloading the
+object and calling the detector again. The database runs in WAL mode, so every
+worker process on the host shares the same file; connections are opened per
+process and thread.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS detect_labels ('
+    ' key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS detect_labels_last_used ON detect_labels (last_used)',
+    # Running total of the size column, kept by triggers so writes never scan the table to check it
+    'CREATE TABLE IF NOT EXISTS detect_labels_total (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)',
+    'INSERT OR IGNORE INTO detect_labels_total (id, bytes) SELECT 0, COALESCE(SUM(size), 0) FROM detect_labels',
+    'CREATE TRIGGER IF NOT EXISTS detect_labels_total_insert AFTER INSERT ON detect_labels'
+    ' BEGIN UPDATE detect_labels_total SET bytes = bytes + NEW.size WHERE id = 0; END',
+    'CREATE TRIGGER IF NOT EXISTS detect_labels_total_update AFTER UPDATE OF size ON detect_labels'
+    ' BEGIN UPDATE detect_labels_total SET bytes = bytes + NEW.size - OLD.size WHERE id = 0; END',
+    'CREATE TRIGGER IF NOT EXISTS detect_labels_total_delete AFTER DELETE ON detect_labels'
+    ' BEGIN UPDATE detect_labels_total SET bytes = bytes - OLD.size WHERE id = 0; END',
+)
+# Reads only refresh last_used when it is older than this, so hot entries don't turn every hit into a write
+_TOUCH_INTERVAL_SECONDS = 60.0
+# Eviction trims to this fraction of max_bytes, so it runs once per batch of inserts rather than on each
+_LOW_WATER = 0.9
+
+
+class DiskDetectCache:
+    """
+    SQLite-backed LRU of DetectLabels responses bounded by total size.
+
+    Failures are logged and treated as misses: the cache never fails a request.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024, busy_timeout: float = 5.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path) and self.max_bytes > 0
+
+    @staticmethod
+    def make_key(bucket: str, key: str, etag: str, max_labels: int, min_confidence: float,
+                 backend: str = 'rekognition') -> str:
+        # An S3 ETag changes whenever the object does, so entries never need a TTL
+        return f"{backend}:s3://{bucket}/{key}:{etag}:{max_labels}:{min_confidence:g}"
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so they are tracked per process as well as per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        # One transaction, so the total is seeded and its triggers created before any other writer runs
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, counter: str) -> None:
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            conn = self._connection()
+            row = conn.execute('SELECT value, last_used FROM detect_labels WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self._count('misses')
+                return None
+            now = time.time()
+            if now - row[1] > _TOUCH_INTERVAL_SECONDS:
+                conn.execute('UPDATE detect_labels SET last_used = ? WHERE key = ?', (now, key))
+            value = orjson.loads(row[0])
+        except (sqlite3.Error, OSError, orjson.JSONDecodeError):
+            logger.exception('Disk detect cache lookup failed')
+            self._count('errors')
+            return None
+        self._count('hits')
+        return value
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        try:
+            data = orjson.dumps(value)
+            conn = self._connection()
+            # IMMEDIATE takes the write lock up front, so the insert and the size check
+            # see the same total even with other processes writing
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # An upsert rather than INSERT OR REPLACE, whose implicit delete would skip the total's trigger
+                conn.execute('INSERT INTO detect_labels (key, value, size, last_used) VALUES (?, ?, ?, ?)'
+                             ' ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size,'
+                             ' last_used = excluded.last_used',
+                             (key, data, len(data), time.time()))
+                self._evict(conn)
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        except (sqlite3.Error, OSError, TypeError):
+            logger.exception('Disk detect cache write failed')
+            self._count('errors')
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute('SELECT bytes FROM detect_labels_total WHERE id = 0').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * _LOW_WATER
+        evicted = 0
+        # Least recently used first, in small batches until the total is under the low-water mark
+        while total > target:
+            rows = conn.execute('SELECT key, size FROM detect_labels ORDER BY last_used LIMIT 64').fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                conn.execute('DELETE FROM detect_labels WHERE key = ?', (key,))
+                total -= size
+                evicted += 1
+                if total <= target:
+                    break
+        with self._stats_lock:
+            self.evictions += evicted
+
+    def stats(self) -> Dict[str, int]:
+        # Counters are per process; entries and bytes describe the shared file
+        size = entries = 0
+        if self.enabled:
+            try:
+                entries, size = self._connection().execute(
+                    'SELECT (SELECT COUNT(*) FROM detect_labels), bytes FROM detect_labels_total WHERE id = 0'
+                ).fetchone()
+            except (sqlite3.Error, OSError):
+                pass
+        with self._stats_lock:
+            return {
+                'entries': entries,
+                'bytes': size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'errors': self.errors,
+            }
+
+
+disk_detect_cache = DiskDetectCache(
+    path=os.getenv('DETECT_DISK_CACHE_PATH', ''),
+    max_bytes=int(float(os.getenv('DETECT_DISK_CACHE_MAX_MB', '256')) * 1024 * 1024),
+)
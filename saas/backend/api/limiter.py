@@ -0,0 +1,258 @@
+"""
+Adaptive concurrency limit, retries and load shedding around detector calls.
+
+Every DetectLabels call in the process goes through one AIMD limiter: the
+allowed concurrency grows by about one per round of successful calls and is
+cut multiplicatively when the detector throttles or times out. Callers wait in
+a FIFO queue for a slot; once the wait exceeds DETECT_QUEUE_TIMEOUT_MS the
+call is shed with ``Overloaded``, which the views answer with 503 and
+Retry-After instead of holding a worker. Failed calls are retried with
+jittered exponential backoff while the request's deadline allows.
+
+Image fetches never pass through the limiter, so /api/fetch-image and the S3
+download path keep their throughput while detection is saturated.
+"""
+import asyncio
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, ReadTimeoutError
+
+_THROTTLE_CODES = {
+    'ThrottlingException',
+    'ProvisionedThroughputExceededException',
+    'LimitExceededException',
+    'TooManyRequestsException',
+    'RequestLimitExceeded',
+}
+_SERVER_CODES = {'InternalServerError', 'ServiceUnavailable', 'ServiceUnavailableException'}
+
+
+class Overloaded(Exception):
+    """Detection capacity is exhausted; the caller should retry after ``retry_after`` seconds."""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _error_code(exc: Exception) -> str:
+    if isinstance(exc, ClientError):
+        return exc.response.get('Error', {}).get('Code', '')
+    return ''
+
+
+def _is_congestion(exc: Exception) -> bool:
+    # Signals that the detector is saturated: these shrink the concurrency limit
+    return _error_code(exc) in _THROTTLE_CODES or isinstance(exc, (ReadTimeoutError, TimeoutError))
+
+
+def _is_retryable(exc: Exception) -> bool:
+    return (_is_congestion(exc) or _error_code(exc) in _SERVER_CODES
+            or isinstance(exc, (BotoConnectionError, ConnectionError)))
+
+
+class _Waiter:
+    __slots__ = ('wake', 'granted')
+
+    def __init__(self, wake: Callable[[], None]):
+        self.wake = wake
+        self.granted = False
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit shared by threads and event loops of one process.
+
+    Slots are handed directly to queued waiters on release, so a burst of new
+    arrivals cannot overtake callers that are already waiting.
+    """
+
+    def __init__(self, initial: int = 16, min_limit: int = 1, max_limit: int = 64, backoff: float = 0.7,
+                 queue_timeout: float = 0.5):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.backoff = backoff
+        self.queue_timeout = queue_timeout
+        self._in_flight = 0
+        self._waiters: Deque[_Waiter] = deque()
+        self._lock = threading.Lock()
+        # Smoothed call latency: paces limit decreases and sizes Retry-After
+        self._latency = 0.2
+        self._last_decrease = 0.0
+        self.rejected = 0
+        self.congested = 0
+        self.retries = 0
+
+    # Slot accounting
+
+    def _take_or_enqueue(self, waiter: _Waiter) -> bool:
+        with self._lock:
+            if not self._waiters and self._in_flight < int(self.limit):
+                self._in_flight += 1
+                return True
+            self._waiters.append(waiter)
+            return False
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """Leave the queue after a timeout or cancellation; False if a slot was granted meanwhile."""
+        with self._lock:
+            if waiter.granted:
+                return False
+            self._waiters.remove(waiter)
+            return True
+
+    def _release(self, elapsed: Optional[float], congested: bool) -> None:
+        to_wake = []
+        with self._lock:
+            now = time.monotonic()
+            if elapsed is not None:
+                self._latency += 0.2 * (elapsed - self._latency)
+            if congested:
+                self.congested += 1
+                # One decrease per latency window, so a burst of throttles from calls that were
+                # already in flight counts as a single congestion signal
+                if now - self._last_decrease > self._latency:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._last_decrease = now
+            elif elapsed is not None and self._in_flight * 2 >= self.limit:
+                # Only grow while the limit is actually in use
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._in_flight -= 1
+            while self._waiters and self._in_flight < int(self.limit):
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                self._in_flight += 1
+                to_wake.append(waiter)
+        for waiter in to_wake:
+            waiter.wake()
+
+    def _overloaded(self) -> Overloaded:
+        with self._lock:
+            self.rejected += 1
+            queued = len(self._waiters)
+            seconds = self._latency * (queued + 1) / max(self.limit, 1.0)
+        return Overloaded('Detection is overloaded; retry shortly', retry_after=min(30, max(1, math.ceil(seconds))))
+
+    def acquire(self, timeout: float) -> None:
+        event = threading.Event()
+        waiter = _Waiter(event.set)
+        if self._take_or_enqueue(waiter):
+            return
+        if not event.wait(max(0.0, timeout)) and self._abandon(waiter):
+            raise self._overloaded()
+
+    async def acquire_async(self, timeout: float) -> None:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            # Slots may be released from another thread or loop
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = _Waiter(wake)
+        if self._take_or_enqueue(waiter):
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(future), max(0.0, timeout))
+        except asyncio.TimeoutError:
+            if self._abandon(waiter):
+                raise self._overloaded()
+        except BaseException:
+            # Cancelled while queued: give back a slot that was granted in the meantime
+            if not self._abandon(waiter):
+                self._release(None, False)
+            raise
+
+    # Guarded calls
+
+    def _budget(self, deadline: float) -> float:
+        return min(self.queue_timeout, deadline - time.monotonic())
+
+    def _backoff_delay(self, attempt: int, deadline: float) -> Optional[float]:
+        # Full jitter; None when no attempts or time remain
+        if attempt + 1 >= int(os.getenv('DETECT_MAX_ATTEMPTS', '3')):
+            return None
+        base = float(os.getenv('DETECT_RETRY_BASE_MS', '100')) / 1000.0
+        delay = random.uniform(0.0, min(2.0, base * (2 ** attempt)))
+        if time.monotonic() + delay >= deadline:
+            return None
+        with self._lock:
+            self.retries += 1
+        return delay
+
+    def _give_up(self, exc: Exception) -> Exception:
+        # A detector that is still throttling after the retries is shed like a full queue
+        return self._overloaded() if _is_congestion(exc) else exc
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        deadline = time.monotonic() + float(os.getenv('DETECT_DEADLINE_SECONDS', '10'))
+        attempt = 0
+        while True:
+            self.acquire(self._budget(deadline))
+            start = time.monotonic()
+            try:
+                result = fn()
+            except Exception as e:
+                self._release(time.monotonic() - start, _is_congestion(e))
+                delay = self._backoff_delay(attempt, deadline) if _is_retryable(e) else None
+                if delay is None:
+                    error = self._give_up(e)
+                    if error is e:
+                        raise
+                    raise error from e
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self._release(time.monotonic() - start, False)
+            return result
+
+    async def call_async(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        deadline = time.monotonic() + float(os.getenv('DETECT_DEADLINE_SECONDS', '10'))
+        attempt = 0
+        while True:
+            await self.acquire_async(self._budget(deadline))
+            start = time.monotonic()
+            try:
+                result = await fn()
+            except asyncio.CancelledError:
+                self._release(None, False)
+                raise
+            except Exception as e:
+                self._release(time.monotonic() - start, _is_congestion(e))
+                delay = self._backoff_delay(attempt, deadline) if _is_retryable(e) else None
+                if delay is None:
+                    error = self._give_up(e)
+                    if error is e:
+                        raise
+                    raise error from e
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self._release(time.monotonic() - start, False)
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'limit': round(self.limit, 2),
+                'in_flight': self._in_flight,
+                'queued': len(self._waiters),
+                'rejected': self.rejected,
+                'congested': self.congested,
+                'retries': self.retries,
+            }
+
+
+detection_limiter = AdaptiveLimiter(
+    initial=int(os.getenv('DETECT_CONCURRENCY_INITIAL', '16')),
+    min_limit=int(os.getenv('DETECT_CONCURRENCY_MIN', '1')),
+    max_limit=int(os.getenv('DETECT_CONCURRENCY_MAX', '64')),
+    queue_timeout=float(os.getenv('DETECT_QUEUE_TIMEOUT_MS', '500')) / 1000.0,
+)
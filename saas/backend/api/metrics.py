@@ -0,0 +1,274 @@
+"""
+Per-stage latency metrics in Prometheus text format.
+
+``stage(name)`` times a block of the request pipeline (fetch, preprocess,
+detect, match, catalog). Each measurement goes into a process-wide histogram
+and into the current request's timings, which the middleware sends back as
+a ``Server-Timing`` header. ``render()`` produces the /api/metrics payload.
+"""
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .cache import detect_labels_cache
+from .disk_cache import disk_detect_cache
+from .limiter import detection_limiter
+from .prefetch import prefetch_pool
+from .singleflight import analysis_flight, async_analysis_flight
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{%s}' % ','.join(pairs) if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(labels, 0.0)
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for labels, value in values:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # labels -> (per-bucket counts, sum)
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = ([0] * len(self.buckets), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def count(self, *labels: str) -> int:
+        with self._lock:
+            series = self._series.get(labels)
+            return sum(series[0]) if series else 0
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            series = sorted((labels, (list(counts), total[0])) for labels, (counts, total) in self._series.items())
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = 'le="%s"' % _format_value(bound)
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}')
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_str} {_format_value(total)}')
+            lines.append(f'{self.name}_count{label_str} {cumulative}')
+        return lines
+
+
+STAGE_SECONDS = Histogram('api_stage_duration_seconds', 'Time spent in each request pipeline stage.', ('stage',))
+REQUEST_SECONDS = Histogram('api_request_duration_seconds', 'Time to produce an API response.', ('view',))
+RESPONSES = Counter('api_responses_total', 'API responses by view and HTTP status.', ('view', 'status'))
+STAGE_ERRORS = Counter('api_stage_errors_total', 'Pipeline stages that raised, by stage.', ('stage',))
+
+_metrics: List[object] = [STAGE_SECONDS, REQUEST_SECONDS, RESPONSES, STAGE_ERRORS]
+
+
+def _pipeline_lines() -> List[str]:
+    # The cache and the coalescers keep their own counters; read them at scrape time
+    stats = detect_labels_cache.stats()
+    coalesced = analysis_flight.coalesced + async_analysis_flight.coalesced
+    return [
+        '# HELP detect_cache_requests_total DetectLabels cache lookups by result.',
+        '# TYPE detect_cache_requests_total counter',
+        f'detect_cache_requests_total{{result="hit"}} {stats["hits"]}',
+        f'detect_cache_requests_total{{result="miss"}} {stats["misses"]}',
+        '# HELP detect_cache_evictions_total DetectLabels cache entries evicted to stay under the size limit.',
+        '# TYPE detect_cache_evictions_total counter',
+        f'detect_cache_evictions_total {stats["evictions"]}',
+        '# HELP detect_cache_entries DetectLabels responses currently cached.',
+        '# TYPE detect_cache_entries gauge',
+        f'detect_cache_entries {stats["size"]}',
+        *_disk_cache_lines(),
+        *_limiter_lines(),
+        *_prefetch_lines(),
+        '# HELP analysis_coalesced_total Requests that waited on an identical in-flight analysis.',
+        '# TYPE analysis_coalesced_total counter',
+        f'analysis_coalesced_total {coalesced}',
+    ]
+
+
+def _disk_cache_lines() -> List[str]:
+    if not disk_detect_cache.enabled:
+        return []
+    stats = disk_detect_cache.stats()
+    return [
+        '# HELP detect_disk_cache_requests_total On-disk DetectLabels cache lookups by result.',
+        '# TYPE detect_disk_cache_requests_total counter',
+        f'detect_disk_cache_requests_total{{result="hit"}} {stats["hits"]}',
+        f'detect_disk_cache_requests_total{{result="miss"}} {stats["misses"]}',
+        f'detect_disk_cache_requests_total{{result="error"}} {stats["errors"]}',
+        '# HELP detect_disk_cache_evictions_total On-disk cache entries evicted by this process.',
+        '# TYPE detect_disk_cache_evictions_total counter',
+        f'detect_disk_cache_evictions_total {stats["evictions"]}',
+        '# HELP detect_disk_cache_bytes Size of the responses in the shared on-disk cache.',
+        '# TYPE detect_disk_cache_bytes gauge',
+        f'detect_disk_cache_bytes {stats["bytes"]}',
+    ]
+
+
+def _limiter_lines() -> List[str]:
+    stats = detection_limiter.stats()
+    return [
+        '# HELP detect_concurrency_limit Current adaptive limit on concurrent detector calls.',
+        '# TYPE detect_concurrency_limit gauge',
+        f'detect_concurrency_limit {stats["limit"]}',
+        '# HELP detect_in_flight Detector calls running now.',
+        '# TYPE detect_in_flight gauge',
+        f'detect_in_flight {stats["in_flight"]}',
+        '# HELP detect_queued Detector calls waiting for a slot.',
+        '# TYPE detect_queued gauge',
+        f'detect_queued {stats["queued"]}',
+        '# HELP detect_shed_total Detector calls rejected with 503 because the queue wait exceeded its budget.',
+        '# TYPE detect_shed_total counter',
+        f'detect_shed_total {stats["rejected"]}',
+        '# HELP detect_congestion_total Detector calls that were throttled or timed out.',
+        '# TYPE detect_congestion_total counter',
+        f'detect_congestion_total {stats["congested"]}',
+        '# HELP detect_retries_total Detector calls retried after a transient failure.',
+        '# TYPE detect_retries_total counter',
+        f'detect_retries_total {stats["retries"]}',
+    ]
+
+
+def _prefetch_lines() -> List[str]:
+    stats = prefetch_pool.stats()
+    return [
+        '# HELP prefetch_requests_total /api/prefetch submissions by outcome.',
+        '# TYPE prefetch_requests_total counter',
+        f'prefetch_requests_total{{result="queued"}} {stats["queued"]}',
+        f'prefetch_requests_total{{result="deduplicated"}} {stats["deduplicated"]}',
+        f'prefetch_requests_total{{result="rejected"}} {stats["rejected"]}',
+        '# HELP prefetch_failures_total Prefetched analyses that raised.',
+        '# TYPE prefetch_failures_total counter',
+        f'prefetch_failures_total {stats["failed"]}',
+        '# HELP prefetch_served_total Requests answered from a prefetched analysis.',
+        '# TYPE prefetch_served_total counter',
+        f'prefetch_served_total {stats["served"]}',
+        '# HELP prefetch_pending Images queued or being analyzed by the prefetch pool.',
+        '# TYPE prefetch_pending gauge',
+        f'prefetch_pending {stats["pending"]}',
+    ]
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _metrics:
+        lines.extend(metric.collect())
+    lines.extend(_pipeline_lines())
+    return '\n'.join(lines) + '\n'
+
+
+# Timings of the request being served: stage -> (seconds, description)
+_request_timings: contextvars.ContextVar[Optional[Dict[str, List]]] = contextvars.ContextVar(
+    'request_timings', default=None)
+# Batch analyses run in executor threads that share their request's timings
+_record_lock = threading.Lock()
+
+
+def begin_request() -> contextvars.Token:
+    return _request_timings.set({})
+
+
+def end_request(token: contextvars.Token) -> Dict[str, List]:
+    timings = _request_timings.get() or {}
+    _request_timings.reset(token)
+    return timings
+
+
+def _record(name: str, seconds: Optional[float], desc: Optional[str] = None) -> None:
+    timings = _request_timings.get()
+    if timings is None:
+        return
+    with _record_lock:
+        entry = timings.setdefault(name, [None, None])
+        if seconds is not None:
+            # A stage can run more than once per request (e.g. index build and query); report the total
+            entry[0] = (entry[0] or 0.0) + seconds
+        if desc is not None:
+            entry[1] = desc
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a pipeline stage; works around sync code and ``await`` alike."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, name)
+        _record(name, elapsed)
+
+
+def mark(name: str, desc: str) -> None:
+    """Attach a duration-less note (e.g. cache=hit) to the current request's Server-Timing."""
+    _record(name, None, desc)
+
+
+def server_timing_header(timings: Dict[str, List], total: float) -> str:
+    parts = []
+    for name, (seconds, desc) in list(timings.items()) + [('total', [total, None])]:
+        part = name
+        if seconds is not None:
+            part += f';dur={seconds * 1000.0:.1f}'
+        if desc:
+            part += f';desc="{desc}"'
+        parts.append(part)
+    return ', '.join(parts)
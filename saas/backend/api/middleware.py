@@ -0,0 +1,54 @@
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.utils.decorators import sync_and_async_middleware
+
+from .metrics import REQUEST_SECONDS, RESPONSES, begin_request, end_request, server_timing_header
+
+
+def _view_name(request) -> str:
+    match = getattr(request, 'resolver_match', None)
+    return (match.url_name if match else None) or 'unmatched'
+
+
+def _finish(request, response, timings, elapsed: float):
+    view = _view_name(request)
+    REQUEST_SECONDS.observe(elapsed, view)
+    RESPONSES.inc(view, str(response.status_code))
+    if os.getenv('SERVER_TIMING_HEADER', '1') == '1':
+        response['Server-Timing'] = server_timing_header(timings, elapsed)
+    return response
+
+
+@sync_and_async_middleware
+def api_metrics_middleware(get_response):
+    """
+    Time /api/ requests, count responses by view and status, and attach Server-Timing.
+
+    Works natively under both WSGI and ASGI so the async views keep running on the event loop.
+    For streamed responses the total covers the time to the first byte.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            if not request.path.startswith('/api/'):
+                return await get_response(request)
+            token = begin_request()
+            start = time.perf_counter()
+            try:
+                response = await get_response(request)
+            finally:
+                timings = end_request(token)
+            return _finish(request, response, timings, time.perf_counter() - start)
+    else:
+        def middleware(request):
+            if not request.path.startswith('/api/'):
+                return get_response(request)
+            token = begin_request()
+            start = time.perf_counter()
+            try:
+                response = get_response(request)
+            finally:
+                timings = end_request(token)
+            return _finish(request, response, timings, time.perf_counter() - start)
+    return middleware
@@ -0,0 +1,149 @@
+"""
+Background analysis of images before the user taps.
+
+``/api/prefetch`` hands an image URL to a small thread pool that runs the
+normal fetch + DetectLabels pipeline and keeps the result by URL, S3 ETag and
+detection parameters (``DetectLabelsCache.make_url_key``), so a result is
+never served after the object is overwritten or the detector or its
+thresholds change. A later request for
+the same image reuses the finished result, joins the running
+analysis, or cancels a still-queued one and does the work itself, so it never
+waits behind the prefetch queue.
+"""
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from .cache import DetectLabelsCache
+
+logger = logging.getLogger(__name__)
+
+
+class PrefetchQueueFull(Exception):
+    """The prefetch pool already holds max_queued images."""
+
+
+class PrefetchPool:
+    """
+    Bounded, deduplicating thread pool of image analyses keyed by URL and detection parameters.
+
+    At most ``max_queued`` images are waiting or running at once; a key that
+    is already pending or has a fresh result is not queued again.
+    """
+
+    def __init__(self, max_workers: int = 4, max_queued: int = 32, max_results: int = 256,
+                 ttl_seconds: float = 300.0):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.results = DetectLabelsCache(max_entries=max_results, ttl_seconds=ttl_seconds)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.failed = 0
+        self.served = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='image-prefetch')
+        return self._executor
+
+    def submit(self, key: str, image_url: str, analyze: Callable[[str], Dict[str, Any]]) -> str:
+        """Queue analyze(image_url) under key; returns 'queued', 'pending' or 'cached', or raises PrefetchQueueFull."""
+        with self._lock:
+            if key in self._pending:
+                self.deduplicated += 1
+                return 'pending'
+            if self.results.get(key) is not None:
+                self.deduplicated += 1
+                return 'cached'
+            if len(self._pending) >= self.max_queued:
+                self.rejected += 1
+                raise PrefetchQueueFull(f'Prefetch queue is full ({self.max_queued} images)')
+            future = self._get_executor().submit(self._run, key, image_url, analyze)
+            self._pending[key] = future
+            self.queued += 1
+        # Also fires for cancelled futures, which never reach _run
+        future.add_done_callback(lambda f: self._forget(key, f))
+        return 'queued'
+
+    def _run(self, key: str, image_url: str, analyze: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        try:
+            resp = analyze(image_url)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            logger.info('Prefetch of %s failed', image_url, exc_info=True)
+            raise
+        self.results.set(key, resp)
+        return resp
+
+    def _forget(self, key: str, future: Future) -> None:
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+    def _claim(self, key: str) -> Optional[Future]:
+        # A queued analysis is cancelled so the caller runs it now instead of waiting for a worker
+        with self._lock:
+            future = self._pending.get(key)
+        if future is None or future.cancel():
+            return None
+        return future
+
+    def _served(self, resp: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if resp is not None:
+            with self._lock:
+                self.served += 1
+        return resp
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Finished or running prefetch result for a key; None when the caller should analyze it."""
+        resp = self.results.get(key)
+        if resp is not None:
+            return self._served(resp)
+        future = self._claim(key)
+        if future is None:
+            return None
+        try:
+            return self._served(future.result())
+        except Exception:
+            return None
+
+    async def lookup_async(self, key: str) -> Optional[Dict[str, Any]]:
+        resp = self.results.get(key)
+        if resp is not None:
+            return self._served(resp)
+        future = self._claim(key)
+        if future is None:
+            return None
+        try:
+            # shield: a cancelled request must not cancel the shared prefetch
+            return self._served(await asyncio.shield(asyncio.wrap_future(future)))
+        except Exception:
+            return None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'max_queued': self.max_queued,
+                'queued': self.queued,
+                'deduplicated': self.deduplicated,
+                'rejected': self.rejected,
+                'failed': self.failed,
+                'served': self.served,
+            }
+
+
+prefetch_pool = PrefetchPool(
+    max_workers=int(os.getenv('PREFETCH_WORKERS', '4')),
+    max_queued=int(os.getenv('PREFETCH_MAX_QUEUED', '32')),
+    max_results=int(os.getenv('PREFETCH_MAX_RESULTS', '256')),
+    ttl_seconds=float(os.getenv('PREFETCH_RESULT_TTL_SECONDS', '300')),
+)
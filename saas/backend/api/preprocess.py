@@ -0,0 +1,152 @@
+"""
+Image preprocessing applied before byte uploads to DetectLabels.
+
+Frames are optionally cropped to a region of interest, downscaled to a target
+long edge and re-encoded as metadata-free JPEG. Decoding is CPU-bound, so the
+work runs in a process pool; this module avoids Django imports so spawned
+workers can import it cheaply.
+"""
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from PIL import ExifTags, Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+
+class PreprocessedImage(NamedTuple):
+    data: bytes
+    original_size: Tuple[int, int]
+    size: Tuple[int, int]
+    # processed / original (or / crop); Rekognition boxes are ratios, so a uniform scale keeps them valid as-is
+    scale: float
+    # (left, top, width, height) ratios of the original frame that were kept; None when not cropped
+    crop: Optional[Tuple[float, float, float, float]] = None
+
+    def describe(self) -> Dict[str, Any]:
+        described = {
+            'OriginalWidth': self.original_size[0],
+            'OriginalHeight': self.original_size[1],
+            'Width': self.size[0],
+            'Height': self.size[1],
+            'Scale': self.scale,
+        }
+        if self.crop is not None:
+            described['Crop'] = dict(zip(('Left', 'Top', 'Width', 'Height'), self.crop))
+        return described
+
+
+def preprocess_image(data: bytes, max_edge: int, quality: int,
+                     crop: Optional[Tuple[float, float, float, float]] = None) -> PreprocessedImage:
+    with Image.open(io.BytesIO(data)) as img:
+        # Apply EXIF rotation before metadata is dropped, so boxes match the displayed image
+        rotated = img.getexif().get(ExifTags.Base.Orientation, 1) != 1
+        img = ImageOps.exif_transpose(img)
+        original_size = img.size
+        if crop is not None:
+            # Snap the requested ratios to pixels and report the ratios actually kept
+            width, height = original_size
+            left, top = round(crop[0] * width), round(crop[1] * height)
+            right = max(left + 1, min(width, round((crop[0] + crop[2]) * width)))
+            bottom = max(top + 1, min(height, round((crop[1] + crop[3]) * height)))
+            img = img.crop((left, top, right, bottom))
+            crop = (left / width, top / height, (right - left) / width, (bottom - top) / height)
+        source_size = img.size
+        scale = 1.0
+        if max_edge and max(source_size) > max_edge:
+            scale = max_edge / float(max(source_size))
+            img = img.resize((max(1, round(source_size[0] * scale)), max(1, round(source_size[1] * scale))),
+                             Image.LANCZOS)
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        out = io.BytesIO()
+        # Saving without exif/icc_profile strips the metadata
+        img.save(out, format='JPEG', quality=quality, optimize=True)
+        processed = out.getvalue()
+        size = img.size
+
+    if crop is None and scale == 1.0 and not rotated and len(processed) >= len(data):
+        # Re-encoding a small, upright image bought nothing; keep the original bytes
+        return PreprocessedImage(data, original_size, original_size, 1.0)
+    return PreprocessedImage(processed, original_size, size, scale, crop)
+
+
+def preprocess_enabled() -> bool:
+    return os.getenv('IMAGE_PREPROCESS', '1') == '1'
+
+
+def _settings() -> Tuple[int, int]:
+    # A crop is always applied; with preprocessing off it is just not downscaled
+    max_edge = int(os.getenv('PREPROCESS_MAX_EDGE', '1280')) if preprocess_enabled() else 0
+    return max_edge, int(os.getenv('PREPROCESS_JPEG_QUALITY', '85'))
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_preprocess_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is not None:
+        return _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the server process is multi-threaded
+            _pool = ProcessPoolExecutor(
+                max_workers=int(os.getenv('PREPROCESS_WORKERS', '2')),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+    return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    # A worker crash breaks the whole executor; drop it so the next call starts a fresh one
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def run_preprocess(data: bytes, crop: Optional[Tuple[float, float, float, float]] = None
+                   ) -> Optional[PreprocessedImage]:
+    """Preprocess (and crop) in the worker pool; None means the original bytes should be sent."""
+    if not preprocess_enabled() and crop is None:
+        return None
+    max_edge, quality = _settings()
+    pool = get_preprocess_pool()
+    try:
+        return pool.submit(preprocess_image, data, max_edge, quality, crop).result()
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        logger.warning('Preprocessing pool broke; sending original bytes', exc_info=True)
+        return None
+    except Exception:
+        # Undecodable input goes to Rekognition untouched and fails (or succeeds) there
+        logger.warning('Image preprocessing failed; sending original bytes', exc_info=True)
+        return None
+
+
+async def run_preprocess_async(data: bytes, crop: Optional[Tuple[float, float, float, float]] = None
+                               ) -> Optional[PreprocessedImage]:
+    if not preprocess_enabled() and crop is None:
+        return None
+    max_edge, quality = _settings()
+    loop = asyncio.get_running_loop()
+    pool = get_preprocess_pool()
+    try:
+        return await loop.run_in_executor(pool, preprocess_image, data, max_edge, quality, crop)
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        logger.warning('Preprocessing pool broke; sending original bytes', exc_info=True)
+        return None
+    except Exception:
+        logger.warning('Image preprocessing failed; sending original bytes', exc_info=True)
+        return None
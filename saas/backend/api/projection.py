@@ -0,0 +1,154 @@
+"""
+Response shaping for /api/detect-labels.
+
+Clients that poll per frame rarely need the full DetectLabels response; these
+helpers filter labels by confidence or rank, keep only requested per-label
+fields, optionally pack instance boxes into parallel arrays, and serialize
+with orjson.
+"""
+from typing import Any, Dict, List, Optional
+
+import orjson
+from django.http import HttpResponse
+
+LABEL_FIELDS = ('Name', 'Confidence', 'Instances', 'Parents', 'Aliases', 'Categories')
+FORMATS = ('full', 'columnar')
+_OPTION_KEYS = ('fields', 'min_confidence', 'top_k', 'format', 'precision')
+
+
+def parse_detect_options(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate projection options from a detect-labels request body; raises ValueError."""
+    options: Dict[str, Any] = {}
+    fields = payload.get('fields')
+    if fields is not None:
+        if not isinstance(fields, list) or not all(isinstance(f, str) for f in fields):
+            raise ValueError('fields must be a list of label field names')
+        unknown = sorted(set(fields) - set(LABEL_FIELDS))
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(unknown)}; allowed: {', '.join(LABEL_FIELDS)}")
+        # Name identifies the label, so it is always kept
+        options['fields'] = {'Name', *fields}
+    min_confidence = payload.get('min_confidence')
+    if min_confidence is not None:
+        if isinstance(min_confidence, bool) or not isinstance(min_confidence, (int, float)):
+            raise ValueError('min_confidence must be a number')
+        options['min_confidence'] = float(min_confidence)
+    top_k = payload.get('top_k')
+    if top_k is not None:
+        if isinstance(top_k, bool) or not isinstance(top_k, int) or top_k < 1:
+            raise ValueError('top_k must be a positive integer')
+        options['top_k'] = top_k
+    fmt = payload.get('format', 'full')
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(FORMATS)}")
+    options['format'] = fmt
+    precision = payload.get('precision')
+    if precision is not None:
+        if isinstance(precision, bool) or not isinstance(precision, int) or not 0 <= precision <= 10:
+            raise ValueError('precision must be an integer between 0 and 10')
+        options['precision'] = precision
+    return options
+
+
+def wants_projection(payload: Dict[str, Any]) -> bool:
+    return any(key in payload for key in _OPTION_KEYS)
+
+
+def _round(value: Any, precision: Optional[int]) -> Any:
+    if precision is None or not isinstance(value, float):
+        return value
+    return round(value, precision)
+
+
+def _filter_labels(labels: List[Dict[str, Any]], options: Dict[str, Any]) -> List[Dict[str, Any]]:
+    min_conf = options.get('min_confidence')
+    if min_conf is not None:
+        labels = [l for l in labels if float(l.get('Confidence', 0.0)) >= min_conf]
+    top_k = options.get('top_k')
+    if top_k is not None:
+        # sorted() is stable, so equally confident labels keep Rekognition's order
+        labels = sorted(labels, key=lambda l: float(l.get('Confidence', 0.0)), reverse=True)[:top_k]
+    return labels
+
+
+def _instances(label: Dict[str, Any], options: Dict[str, Any]) -> List[Dict[str, Any]]:
+    min_conf = options.get('min_confidence')
+    instances = label.get('Instances') or []
+    if min_conf is None:
+        return instances
+    return [i for i in instances if float(i.get('Confidence', label.get('Confidence', 0.0))) >= min_conf]
+
+
+def _project_full(labels: List[Dict[str, Any]], options: Dict[str, Any]) -> List[Dict[str, Any]]:
+    fields = options.get('fields') or set(LABEL_FIELDS)
+    precision = options.get('precision')
+    projected = []
+    for label in labels:
+        out: Dict[str, Any] = {}
+        for field in LABEL_FIELDS:
+            if field not in fields or field not in label:
+                continue
+            if field == 'Instances':
+                out[field] = [
+                    {
+                        'BoundingBox': {k: _round(v, precision) for k, v in (inst.get('BoundingBox') or {}).items()},
+                        'Confidence': _round(inst.get('Confidence'), precision),
+                    }
+                    for inst in _instances(label, options)
+                ]
+            elif field == 'Confidence':
+                out[field] = _round(label[field], precision)
+            else:
+                out[field] = label[field]
+        projected.append(out)
+    return projected
+
+
+def _project_columnar(labels: List[Dict[str, Any]], options: Dict[str, Any]) -> Dict[str, Any]:
+    fields = options.get('fields') or set(LABEL_FIELDS)
+    precision = options.get('precision', 4)
+    columns: Dict[str, Any] = {'name': [l.get('Name') for l in labels]}
+    if 'Confidence' in fields:
+        columns['confidence'] = [_round(float(l.get('Confidence', 0.0)), precision) for l in labels]
+    for field in ('Parents', 'Aliases', 'Categories'):
+        if field in fields:
+            columns[field.lower()] = [[r.get('Name') for r in l.get(field) or [] if isinstance(r, dict)]
+                                      for l in labels]
+    result: Dict[str, Any] = {'labels': columns}
+    if 'Instances' in fields:
+        boxes: Dict[str, List[Any]] = {'label': [], 'left': [], 'top': [], 'width': [], 'height': [], 'confidence': []}
+        for index, label in enumerate(labels):
+            for inst in _instances(label, options):
+                box = inst.get('BoundingBox') or {}
+                boxes['label'].append(index)
+                boxes['left'].append(_round(float(box.get('Left', 0.0)), precision))
+                boxes['top'].append(_round(float(box.get('Top', 0.0)), precision))
+                boxes['width'].append(_round(float(box.get('Width', 0.0)), precision))
+                boxes['height'].append(_round(float(box.get('Height', 0.0)), precision))
+                boxes['confidence'].append(
+                    _round(float(inst.get('Confidence', label.get('Confidence', 0.0))), precision))
+        result['instances'] = boxes
+    return result
+
+
+def project_detect_response(resp: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Apply projection options to a DetectLabels response.
+
+    ResponseMetadata is dropped; LabelModelVersion and Preprocessing are kept.
+    Columnar responses hold labels and instance boxes as parallel arrays, with
+    instances pointing at their label by position.
+    """
+    labels = _filter_labels(resp.get('Labels') or [], options)
+    out: Dict[str, Any] = {k: resp[k] for k in ('LabelModelVersion', 'Preprocessing') if k in resp}
+    if options.get('format') == 'columnar':
+        out['Format'] = 'columnar'
+        out.update(_project_columnar(labels, options))
+    else:
+        out['Labels'] = _project_full(labels, options)
+    return out
+
+
+def fast_json_response(data: Any, status: int = 200) -> HttpResponse:
+    # orjson serializes several times faster than json.dumps and emits compact output
+    return HttpResponse(orjson.dumps(data), status=status, content_type='application/json')
@@ -0,0 +1,24 @@
+"""
+S3 URL helpers shared by the views and the product catalog.
+"""
+import re
+from typing import Optional, Tuple
+
+
+def _parse_s3_url(url: str) -> Optional[Tuple[str, str]]:
+    # Supports s3://bucket/key or https://s3.amazonaws.com/bucket/key or virtual-hosted-style
+    if url.startswith("s3://"):
+        without_scheme = url[len("s3://"):]
+        parts = without_scheme.split("/", 1)
+        if len(parts) == 2:
+            return parts[0], parts[1]
+        return None
+    # virtual-hosted-style: https://<bucket>.s3.<region>.amazonaws.com/<key>
+    vh = re.match(r"https?://([a-z0-9-_.]+)\.s3[.-][a-z0-9-]+\.amazonaws\.com/(.+)", url)
+    if vh:
+        return vh.group(1), vh.group(2)
+    # path-style: https://s3.<region>.amazonaws.com/<bucket>/<key>
+    ps = re.match(r"https?://s3[.-][a-z0-9-]+\.amazonaws\.com/([^/]+)/(.+)", url)
+    if ps:
+        return ps.group(1), ps.group(2)
+    return None
@@ -0,0 +1,228 @@
+"""
+WebSocket session channel for successive touches on one frame.
+
+A client registers a frame once; the backend analyzes it and keeps the
+LabelIndex in this worker's memory, so every later touch is resolved without
+fetching or detecting again. Served at ``/ws/session`` by ``backend.asgi``.
+
+Messages are JSON text frames::
+
+    -> {"type": "register", "image_url": "...", "screen_resolution": {"width": .., "height": ..}}
+    <- {"type": "registered", "session_id": "...", "labels": 12, "elapsed_ms": 230.4}
+    -> {"type": "touch", "id": 1, "touch_point": {"x": .., "y": ..}}
+    <- {"type": "result", "id": 1, "status": 200, "product_url": "...", "elapsed_ms": 0.2}
+    -> {"type": "resume", "session_id": "..."}      (after a reconnect)
+    -> {"type": "ping"}                              <- {"type": "pong"}
+
+Failures come back as {"type": "error", "status": ..., "detail": ...}; status 410
+means the session expired (idle or evicted) and the frame must be registered again,
+and 503 (with "retry_after" seconds) means detection is overloaded.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.http.request import split_domain_port, validate_host
+
+from .async_views import _analyze_image_async
+from .metrics import REQUEST_SECONDS, RESPONSES
+from .spatial import LabelIndex, label_indexes
+from .views import DetectionError, ImageFetchError, _analysis_error, _recommend_for_labels
+
+# Rough per-instance cost of the name list and related-label lists on top of the NumPy columns
+_PER_INSTANCE_OVERHEAD = 96
+
+
+class Session:
+    __slots__ = ('id', 'image_url', 'resolution', 'index', 'size', 'last_used')
+
+    def __init__(self, image_url: str, resolution: Dict[str, Any], index: LabelIndex):
+        self.id = uuid.uuid4().hex
+        self.image_url = image_url
+        self.resolution = resolution
+        self.index = index
+        self.size = _index_size(index)
+        self.last_used = time.monotonic()
+
+
+def _index_size(index: LabelIndex) -> int:
+    arrays = (index.left, index.top, index.width, index.height, index.right, index.bottom,
+              index.cx, index.cy, index.area, index.confidence)
+    related = sum(len(names) for names in index.related.values())
+    return sum(a.nbytes for a in arrays) + (len(index.names) + related) * _PER_INSTANCE_OVERHEAD
+
+
+class SessionStore:
+    """
+    Per-worker LRU of sessions bounded by idle time, count and approximate memory.
+
+    Sessions outlive their connection until they go idle, so a client that
+    reconnects can resume without re-registering the frame.
+    """
+
+    def __init__(self, idle_seconds: float = 300.0, max_sessions: int = 1000,
+                 max_bytes: int = 64 * 1024 * 1024):
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._sessions: 'OrderedDict[str, Session]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def add(self, session: Session) -> None:
+        with self._lock:
+            self._sessions[session.id] = session
+            self._bytes += session.size
+            self._evict(time.monotonic())
+
+    def get(self, session_id: str) -> Optional[Session]:
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            session.last_used = now
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def _evict(self, now: float) -> None:
+        # Least recently used first: expired sessions, then whatever exceeds the caps
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            over_cap = len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes
+            if not over_cap and now - oldest.last_used < self.idle_seconds:
+                break
+            del self._sessions[oldest.id]
+            self._bytes -= oldest.size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'sessions': len(self._sessions), 'bytes': self._bytes, 'evictions': self.evictions}
+
+
+session_store = SessionStore(
+    idle_seconds=float(os.getenv('SESSION_IDLE_SECONDS', '300')),
+    max_sessions=int(os.getenv('SESSION_MAX_COUNT', '1000')),
+    max_bytes=int(os.getenv('SESSION_MAX_BYTES', str(64 * 1024 * 1024))),
+)
+
+
+def _error(status: int, detail: str, message_id: Any = None) -> Dict[str, Any]:
+    reply = {'type': 'error', 'status': status, 'detail': detail}
+    if message_id is not None:
+        reply['id'] = message_id
+    return reply
+
+
+def _registered(session: Session, **extra) -> Dict[str, Any]:
+    return {'type': 'registered', 'session_id': session.id, 'labels': len(session.index.related), **extra}
+
+
+async def _register(message: Dict[str, Any]) -> Tuple[Optional[Session], Dict[str, Any]]:
+    image_url = message.get('image_url')
+    resolution = message.get('screen_resolution') or {}
+    if not isinstance(image_url, str) or not image_url:
+        return None, _error(400, 'image_url is required')
+    if not (isinstance(resolution, dict) and 'width' in resolution and 'height' in resolution):
+        return None, _error(400, 'screen_resolution with width,height required')
+
+    start = time.perf_counter()
+    try:
+        resp = await _analyze_image_async(image_url)
+    except (ImageFetchError, DetectionError) as e:
+        body, status = _analysis_error(e)
+        reply = _error(status, body['detail'])
+        if 'retry_after' in body:
+            reply['retry_after'] = body['retry_after']
+        return None, reply
+    session = Session(image_url, resolution, label_indexes.get(resp))
+    session_store.add(session)
+    return session, _registered(session, elapsed_ms=round((time.perf_counter() - start) * 1000.0, 2))
+
+
+def _touch(session: Optional[Session], message: Dict[str, Any]) -> Dict[str, Any]:
+    message_id = message.get('id')
+    if session is None:
+        return _error(409, 'Register a frame before sending touches', message_id)
+    point = message.get('touch_point') or {}
+    if not (isinstance(point, dict) and 'x' in point and 'y' in point):
+        return _error(400, 'touch_point with x,y required', message_id)
+    resolution = message.get('screen_resolution') or session.resolution
+
+    start = time.perf_counter()
+    body, status = _recommend_for_labels(session.index, point, resolution)
+    reply = {'type': 'result', 'status': status, **body,
+             'elapsed_ms': round((time.perf_counter() - start) * 1000.0, 3)}
+    if message_id is not None:
+        reply['id'] = message_id
+    return reply
+
+
+def _allowed(scope: Dict[str, Any]) -> bool:
+    # Raw ASGI bypasses Django's request handling, so apply ALLOWED_HOSTS here
+    headers = dict(scope.get('headers') or [])
+    host = headers.get(b'host', b'').decode('latin-1')
+    domain, _ = split_domain_port(host)
+    allowed = settings.ALLOWED_HOSTS or (['.localhost', '127.0.0.1', '[::1]'] if settings.DEBUG else [])
+    return bool(domain) and validate_host(domain, allowed)
+
+
+async def session_application(scope, receive, send) -> None:
+    """ASGI application for one WebSocket connection."""
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    if not _allowed(scope):
+        await send({'type': 'websocket.close', 'code': 4403})
+        return
+    await send({'type': 'websocket.accept'})
+
+    session: Optional[Session] = None
+    while True:
+        message = await receive()
+        if message['type'] == 'websocket.disconnect':
+            return
+        try:
+            data = json.loads(message.get('text') or (message.get('bytes') or b'').decode('utf-8'))
+            if not isinstance(data, dict):
+                raise ValueError('expected a JSON object')
+        except ValueError:
+            await send({'type': 'websocket.send', 'text': json.dumps(_error(400, 'Invalid JSON message'))})
+            continue
+
+        kind = data.get('type')
+        start = time.perf_counter()
+        if kind == 'register':
+            registered, reply = await _register(data)
+            session = registered or session
+        elif kind == 'touch':
+            # Re-check the store so an expired or evicted session is reported rather than served
+            if session is not None and session_store.get(session.id) is None:
+                session = None
+                reply = _error(410, 'Session expired; register the frame again', data.get('id'))
+            else:
+                reply = _touch(session, data)
+        elif kind == 'resume':
+            resumed = session_store.get(str(data.get('session_id') or ''))
+            if resumed is None:
+                reply = _error(404, 'Unknown or expired session')
+            else:
+                session = resumed
+                reply = _registered(resumed)
+        elif kind == 'ping':
+            reply = {'type': 'pong'}
+        else:
+            reply = _error(400, f'Unknown message type: {kind}')
+
+        view = f'ws-session-{kind}' if kind in ('register', 'touch', 'resume') else 'ws-session'
+        REQUEST_SECONDS.observe(time.perf_counter() - start, view)
+        RESPONSES.inc(view, str(reply.get('status', 200)))
+        await send({'type': 'websocket.send', 'text': json.dumps(reply)})
@@ -0,0 +1,160 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Below this many boxes a Python loop over precomputed rows beats NumPy's per-call overhead
+_SCAN_MAX = 32
+
+
+class LabelIndex:
+    """
+    Column-oriented view of the Rekognition instances detected in one image.
+
+    Bounding boxes and confidences are flattened into NumPy arrays once, so each
+    touch point is resolved with a handful of vectorized operations instead of a
+    Python loop over every label and instance. Small images keep the same values
+    as plain tuples and scan them instead, which is faster at that size.
+    """
+
+    def __init__(self, names: List[Optional[str]], left: np.ndarray, top: np.ndarray,
+                 width: np.ndarray, height: np.ndarray, confidence: np.ndarray,
+                 fallback: Optional[str], related: Optional[Dict[str, List[str]]] = None):
+        self.names = names
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+        self.right = left + width
+        self.bottom = top + height
+        self.cx = left + width / 2.0
+        self.cy = top + height / 2.0
+        self.area = width * height
+        self.confidence = confidence
+        # Returned when the image has labels but none of them carries an instance box
+        self.fallback = fallback
+        # Label name -> Aliases then Parents, for catalog lookups that miss on the name itself
+        self.related = related or {}
+        self._rows: Optional[List[Tuple]] = None
+        if len(names) <= _SCAN_MAX:
+            self._rows = list(zip(self.left.tolist(), self.top.tolist(), self.right.tolist(),
+                                  self.bottom.tolist(), self.cx.tolist(), self.cy.tolist(),
+                                  self.area.tolist(), confidence.tolist(), names))
+
+    @classmethod
+    def from_labels(cls, labels: List[Dict[str, Any]]) -> 'LabelIndex':
+        names: List[Optional[str]] = []
+        rows: List[List[float]] = []
+        related: Dict[str, List[str]] = {}
+        for label in labels:
+            name = label.get('Name')
+            if name:
+                related[name] = [
+                    r['Name'] for r in (label.get('Aliases') or []) + (label.get('Parents') or [])
+                    if isinstance(r, dict) and r.get('Name')
+                ]
+            for inst in label.get('Instances') or []:
+                box = inst.get('BoundingBox') or {}
+                width = float(box.get('Width', 0))
+                height = float(box.get('Height', 0))
+                if width <= 0 or height <= 0:
+                    continue
+                conf = float(inst.get('Confidence', label.get('Confidence', 0.0)))
+                rows.append([float(box.get('Left', 0)), float(box.get('Top', 0)), width, height, conf])
+                names.append(name)
+
+        fallback = None
+        if labels:
+            # max() keeps the first of equally confident labels, matching a stable descending sort
+            fallback = max(labels, key=lambda l: float(l.get('Confidence', 0.0))).get('Name')
+
+        data = np.array(rows, dtype=np.float64).reshape(-1, 5)
+        return cls(names, data[:, 0], data[:, 1], data[:, 2], data[:, 3], data[:, 4], fallback, related)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def query(self, u: float, v: float) -> Optional[str]:
+        """
+        Pick the label under normalized point (u, v).
+
+        Boxes containing the point win, tie-broken by smallest area, then highest
+        confidence, then distance to the box centre. Otherwise the closest box
+        (lightly weighted by confidence) wins, and with no boxes at all the most
+        confident label is returned.
+        """
+        if not self.names:
+            return self.fallback
+        if self._rows is not None:
+            return self._scan(u, v)
+
+        dist2 = (u - self.cx) ** 2 + (v - self.cy) ** 2
+        inside = (self.left <= u) & (u <= self.right) & (self.top <= v) & (v <= self.bottom)
+        candidates = np.flatnonzero(inside)
+        if candidates.size:
+            # lexsort orders by the last key first and is stable, like sorting (area, -conf, dist2) tuples
+            order = np.lexsort((dist2[candidates], -self.confidence[candidates], self.area[candidates]))
+            return self.names[int(candidates[order[0]])]
+
+        score = -dist2 + self.confidence / 1000.0
+        return self.names[int(np.argmax(score))]
+
+    def _scan(self, u: float, v: float) -> Optional[str]:
+        # Same rules as the vectorized path; strict comparisons keep the first of equal boxes
+        best_inside: Optional[Tuple[float, float, float]] = None
+        inside_name: Optional[str] = None
+        best_score: Optional[float] = None
+        score_name: Optional[str] = None
+        for left, top, right, bottom, cx, cy, area, conf, name in self._rows:
+            dist2 = (u - cx) ** 2 + (v - cy) ** 2
+            if left <= u <= right and top <= v <= bottom:
+                key = (area, -conf, dist2)
+                if best_inside is None or key < best_inside:
+                    best_inside, inside_name = key, name
+            elif best_inside is None:
+                score = -dist2 + conf / 1000.0
+                if best_score is None or score > best_score:
+                    best_score, score_name = score, name
+        return inside_name if best_inside is not None else score_name
+
+
+class LabelIndexCache:
+    """
+    LabelIndex per analysed DetectLabels response, built on its first query.
+
+    Cached analyses come back as the same dict on every hit (DetectLabelsCache,
+    prefetch results, coalesced calls), so entries are keyed by object identity
+    and each image's index is built once rather than on every tap. An entry holds
+    its response, so the id cannot be reused while the entry lives.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[int, Tuple[Dict[str, Any], LabelIndex]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, resp: Dict[str, Any]) -> LabelIndex:
+        rid = id(resp)
+        with self._lock:
+            entry = self._entries.get(rid)
+            if entry is not None and entry[0] is resp:
+                self._entries.move_to_end(rid)
+                return entry[1]
+        index = LabelIndex.from_labels(resp.get('Labels') or [])
+        if self.max_entries > 0:
+            with self._lock:
+                self._entries[rid] = (resp, index)
+                self._entries.move_to_end(rid)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return index
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# Sized like the DetectLabels cache whose responses it indexes
+label_indexes = LabelIndexCache(max_entries=int(os.getenv('DETECT_CACHE_MAX_ENTRIES', '256')))
@@ -0,0 +1,232 @@
+"""
+Streaming pass-through for /api/fetch-image.
+
+The upstream S3 ``StreamingBody`` or chunked HTTP response is piped to the
+client instead of being buffered, with Range and conditional GET headers
+forwarded upstream and ETag/Last-Modified/Content-Range passed back.
+"""
+import inspect
+import os
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+from botocore.exceptions import ClientError
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date
+
+from .clients import get_async_http_client, get_async_s3_client, get_http_session, get_s3_client
+
+# Client request headers forwarded upstream, with the matching S3 GetObject parameter
+_FORWARDED_HEADERS = (
+    ('HTTP_RANGE', 'Range', 'Range'),
+    ('HTTP_IF_NONE_MATCH', 'If-None-Match', 'IfNoneMatch'),
+    ('HTTP_IF_MODIFIED_SINCE', 'If-Modified-Since', 'IfModifiedSince'),
+)
+# Upstream response headers passed back to the client
+_PASSTHROUGH_HEADERS = ('ETag', 'Last-Modified', 'Content-Length', 'Content-Range', 'Accept-Ranges', 'Cache-Control')
+# Upstream statuses answered without a body
+_BODYLESS_STATUSES = (304, 412, 416)
+
+_MAGIC_NUMBERS = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+)
+
+
+class ImageStream(NamedTuple):
+    status: int
+    headers: Dict[str, str]
+    content_type: Optional[str]
+    chunks: Any
+    close: Callable[[], Any]
+
+
+def _chunk_size() -> int:
+    return int(os.getenv('FETCH_IMAGE_CHUNK_SIZE', '65536'))
+
+
+def _timeout() -> float:
+    return float(os.getenv('S3_TIMEOUT_SECONDS', '15'))
+
+
+def request_image_headers(request: HttpRequest) -> Dict[str, str]:
+    return {name: request.META[meta] for meta, name, _ in _FORWARDED_HEADERS if request.META.get(meta)}
+
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    for magic, content_type in _MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return content_type
+    return None
+
+
+def _s3_params(bucket: str, key: str, headers: Dict[str, str]) -> Dict[str, str]:
+    params = {'Bucket': bucket, 'Key': key}
+    for _, name, param in _FORWARDED_HEADERS:
+        if name in headers:
+            params[param] = headers[name]
+    return params
+
+
+def _s3_headers(obj: Dict[str, Any]) -> Dict[str, str]:
+    headers = {}
+    if obj.get('ETag'):
+        headers['ETag'] = obj['ETag']
+    if obj.get('LastModified'):
+        headers['Last-Modified'] = http_date(obj['LastModified'].timestamp())
+    if obj.get('ContentLength') is not None:
+        headers['Content-Length'] = str(obj['ContentLength'])
+    if obj.get('ContentRange'):
+        headers['Content-Range'] = obj['ContentRange']
+    if obj.get('CacheControl'):
+        headers['Cache-Control'] = obj['CacheControl']
+    headers['Accept-Ranges'] = obj.get('AcceptRanges') or 'bytes'
+    return headers
+
+
+def _s3_error_stream(e: ClientError) -> ImageStream:
+    # GetObject reports 304/412/416 as errors; they are valid answers to conditional or range requests
+    meta = e.response.get('ResponseMetadata', {})
+    status = meta.get('HTTPStatusCode')
+    if status not in _BODYLESS_STATUSES:
+        raise e
+    upstream = meta.get('HTTPHeaders', {})
+    headers = {name: upstream[name.lower()] for name in ('ETag', 'Last-Modified', 'Content-Range') if name.lower() in upstream}
+    return ImageStream(status, headers, None, (), lambda: None)
+
+
+def _http_headers(upstream) -> Dict[str, str]:
+    headers = {name: upstream[name] for name in _PASSTHROUGH_HEADERS if name in upstream}
+    if 'Content-Encoding' in upstream:
+        # Chunks are decoded before they are sent, so the upstream length no longer applies
+        headers.pop('Content-Length', None)
+    return headers
+
+
+def open_image_stream(image_url: str, location: Optional[Tuple[str, str]], headers: Dict[str, str]) -> ImageStream:
+    if location:
+        bucket, key = location
+        try:
+            obj = get_s3_client().get_object(**_s3_params(bucket, key, headers))
+        except ClientError as e:
+            return _s3_error_stream(e)
+        body = obj['Body']
+        return ImageStream(obj['ResponseMetadata']['HTTPStatusCode'], _s3_headers(obj), obj.get('ContentType'),
+                           body.iter_chunks(_chunk_size()), body.close)
+
+    resp = get_http_session().get(image_url, headers=headers, stream=True, timeout=_timeout())
+    if resp.status_code in _BODYLESS_STATUSES:
+        resp.close()
+        return ImageStream(resp.status_code, _http_headers(resp.headers), None, (), lambda: None)
+    try:
+        resp.raise_for_status()
+    except Exception:
+        resp.close()
+        raise
+    return ImageStream(resp.status_code, _http_headers(resp.headers), resp.headers.get('Content-Type'),
+                       resp.iter_content(_chunk_size()), resp.close)
+
+
+async def open_image_stream_async(image_url: str, location: Optional[Tuple[str, str]],
+                                  headers: Dict[str, str]) -> ImageStream:
+    if location:
+        bucket, key = location
+        s3_client = await get_async_s3_client()
+        try:
+            obj = await s3_client.get_object(**_s3_params(bucket, key, headers))
+        except ClientError as e:
+            return _s3_error_stream(e)
+        body = obj['Body']
+        return ImageStream(obj['ResponseMetadata']['HTTPStatusCode'], _s3_headers(obj), obj.get('ContentType'),
+                           body.iter_chunks(_chunk_size()), body.close)
+
+    client = get_async_http_client()
+    request = client.build_request('GET', image_url, headers=headers, timeout=_timeout())
+    resp = await client.send(request, stream=True)
+    if resp.status_code in _BODYLESS_STATUSES:
+        await resp.aclose()
+        return ImageStream(resp.status_code, _http_headers(resp.headers), None, (), lambda: None)
+    try:
+        resp.raise_for_status()
+    except Exception:
+        await resp.aclose()
+        raise
+    return ImageStream(resp.status_code, _http_headers(resp.headers), resp.headers.get('Content-Type'),
+                       resp.aiter_bytes(_chunk_size()), resp.aclose)
+
+
+def _pick_content_type(stream: ImageStream, head: bytes, fallback: str) -> str:
+    # Trust an explicit image/* type from upstream, else sniff the first bytes of a full response
+    declared = (stream.content_type or '').split(';')[0].strip().lower()
+    if declared.startswith('image/'):
+        return declared
+    if stream.status == 200:
+        return sniff_content_type(head) or fallback
+    return fallback
+
+
+def _apply_headers(response: HttpResponse, headers: Dict[str, str]) -> HttpResponse:
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+def streaming_image_response(stream: ImageStream, fallback_content_type: str) -> HttpResponse:
+    if stream.status in _BODYLESS_STATUSES:
+        stream.close()
+        return _apply_headers(HttpResponse(status=stream.status), stream.headers)
+
+    chunks = iter(stream.chunks)
+    try:
+        head = next(chunks, b'')
+    except Exception:
+        stream.close()
+        raise
+
+    def body():
+        try:
+            if head:
+                yield head
+            yield from chunks
+        finally:
+            stream.close()
+
+    response = StreamingHttpResponse(body(), status=stream.status,
+                                     content_type=_pick_content_type(stream, head, fallback_content_type))
+    return _apply_headers(response, stream.headers)
+
+
+async def _close_async(stream: ImageStream) -> None:
+    result = stream.close()
+    if inspect.isawaitable(result):
+        await result
+
+
+async def streaming_image_response_async(stream: ImageStream, fallback_content_type: str) -> HttpResponse:
+    if stream.status in _BODYLESS_STATUSES:
+        await _close_async(stream)
+        return _apply_headers(HttpResponse(status=stream.status), stream.headers)
+
+    chunks = stream.chunks.__aiter__()
+    try:
+        head = await anext(chunks, b'')
+    except Exception:
+        await _close_async(stream)
+        raise
+
+    async def body():
+        try:
+            if head:
+                yield head
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await _close_async(stream)
+
+    response = StreamingHttpResponse(body(), status=stream.status,
+                                     content_type=_pick_content_type(stream, head, fallback_content_type))
+    return _apply_headers(response, stream.headers)
@@ -0,0 +1,55 @@
+import os
+import tempfile
+
+from django.test import SimpleTestCase
+
+from backend.api.disk_cache import DiskDetectCache
+
+
+class DiskDetectCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'detect.sqlite3')
+
+    def test_get_and_set(self):
+        cache = DiskDetectCache(self.path)
+        key = cache.make_key('frames', 'a.png', '"etag-1"', 50, 50.0, 'fixture')
+        self.assertIsNone(cache.get(key))
+        cache.set(key, {'Labels': [{'Name': 'Tie'}]})
+        self.assertEqual(cache.get(key), {'Labels': [{'Name': 'Tie'}]})
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_new_etag_is_a_different_entry(self):
+        cache = DiskDetectCache(self.path)
+        cache.set(cache.make_key('frames', 'a.png', '"etag-1"', 50, 50.0), {'Labels': []})
+        self.assertIsNone(cache.get(cache.make_key('frames', 'a.png', '"etag-2"', 50, 50.0)))
+
+    def test_entries_are_shared_through_the_file(self):
+        DiskDetectCache(self.path).set('key', {'Labels': []})
+        self.assertEqual(DiskDetectCache(self.path).get('key'), {'Labels': []})
+
+    def test_least_recently_used_entries_are_evicted_past_max_bytes(self):
+        cache = DiskDetectCache(self.path, max_bytes=1000)
+        value = {'Labels': [{'Name': 'x' * 80}]}
+        for i in range(30):
+            cache.set(f'key-{i}', value)
+        stats = cache.stats()
+        self.assertLessEqual(stats['bytes'], 1000)
+        self.assertGreater(stats['evictions'], 0)
+        self.assertIsNone(cache.get('key-0'))
+        self.assertEqual(cache.get('key-29'), value)
+
+    def test_replacing_an_entry_keeps_the_size_total(self):
+        cache = DiskDetectCache(self.path)
+        cache.set('key', {'Labels': [{'Name': 'x' * 100}]})
+        cache.set('key', {'Labels': []})
+        stats = cache.stats()
+        self.assertEqual(stats['entries'], 1)
+        self.assertEqual(stats['bytes'], len(b'{"Labels":[]}'))
+
+    def test_disabled_without_a_path(self):
+        cache = DiskDetectCache('')
+        self.assertFalse(cache.enabled)
+        cache.set('key', {'Labels': []})
+        self.assertEqual(cache.stats()['entries'], 0)
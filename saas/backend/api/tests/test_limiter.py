@@ -0,0 +1,59 @@
+import os
+import threading
+from unittest import mock
+
+from botocore.exceptions import ClientError
+from django.test import SimpleTestCase
+
+from backend.api.limiter import AdaptiveLimiter, Overloaded
+from backend.api.views import _analysis_error_response
+
+
+def throttled():
+    raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, 'DetectLabels')
+
+
+class AdaptiveLimiterTests(SimpleTestCase):
+    def test_queue_timeout_sheds_with_retry_after(self):
+        limiter = AdaptiveLimiter(initial=1, max_limit=1, queue_timeout=0.02)
+        started, release = threading.Event(), threading.Event()
+
+        def hold():
+            started.set()
+            release.wait(5)
+            return 'done'
+
+        holder = threading.Thread(target=limiter.call, args=(hold,))
+        holder.start()
+        try:
+            self.assertTrue(started.wait(5))
+            with self.assertRaises(Overloaded) as raised:
+                limiter.call(lambda: 'never runs')
+        finally:
+            release.set()
+            holder.join(5)
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+        self.assertEqual(limiter.stats()['rejected'], 1)
+        self.assertEqual(limiter.stats()['in_flight'], 0)
+
+    def test_persistent_throttling_is_shed_and_shrinks_the_limit(self):
+        limiter = AdaptiveLimiter(initial=8, max_limit=8)
+        with mock.patch.dict(os.environ, {'DETECT_MAX_ATTEMPTS': '2', 'DETECT_RETRY_BASE_MS': '1'}):
+            with self.assertRaises(Overloaded):
+                limiter.call(throttled)
+        stats = limiter.stats()
+        self.assertEqual(stats['retries'], 1)
+        self.assertLess(stats['limit'], 8)
+
+    def test_non_retryable_errors_pass_through(self):
+        limiter = AdaptiveLimiter()
+        with self.assertRaises(KeyError):
+            limiter.call(lambda: {}['missing'])
+        self.assertEqual(limiter.stats()['retries'], 0)
+
+    def test_overloaded_maps_to_503_with_retry_after(self):
+        error = RuntimeError('Detection is overloaded')
+        error.__cause__ = Overloaded('Detection is overloaded; retry shortly', retry_after=3)
+        response = _analysis_error_response(error)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '3')
@@ -0,0 +1,60 @@
+import os
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from backend.api.views import _map_to_frame, _roi_window
+
+
+class MapToFrameTests(SimpleTestCase):
+    def test_boxes_become_full_frame_ratios(self):
+        resp = {
+            'Labels': [{
+                'Name': 'Tie',
+                'Confidence': 90.0,
+                'Instances': [{
+                    'BoundingBox': {'Left': 0.5, 'Top': 0.25, 'Width': 0.5, 'Height': 0.5},
+                    'Confidence': 90.0,
+                }],
+            }, {'Name': 'Person', 'Confidence': 99.0, 'Instances': []}],
+            'LabelModelVersion': '3.0',
+        }
+        mapped = _map_to_frame(resp, (0.2, 0.4, 0.5, 0.4))
+        box = mapped['Labels'][0]['Instances'][0]['BoundingBox']
+        self.assertAlmostEqual(box['Left'], 0.45)
+        self.assertAlmostEqual(box['Top'], 0.5)
+        self.assertAlmostEqual(box['Width'], 0.25)
+        self.assertAlmostEqual(box['Height'], 0.2)
+        self.assertEqual(mapped['Labels'][0]['Instances'][0]['Confidence'], 90.0)
+        self.assertEqual(mapped['Labels'][1], resp['Labels'][1])
+        self.assertEqual(mapped['LabelModelVersion'], '3.0')
+        # The crop's own response is left untouched
+        self.assertEqual(resp['Labels'][0]['Instances'][0]['BoundingBox']['Left'], 0.5)
+
+    def test_whole_frame_crop_is_identity(self):
+        resp = {'Labels': [{'Name': 'Tie', 'Instances': [
+            {'BoundingBox': {'Left': 0.1, 'Top': 0.2, 'Width': 0.3, 'Height': 0.4}}]}]}
+        self.assertEqual(_map_to_frame(resp, (0.0, 0.0, 1.0, 1.0)), resp)
+
+
+class RoiWindowTests(SimpleTestCase):
+    resolution = {'width': 1000, 'height': 1000}
+
+    def window(self, x, y):
+        with mock.patch.dict(os.environ, {'ROI_MODE': '1', 'ROI_WINDOW': '0.5'}):
+            return _roi_window({'x': x, 'y': y}, self.resolution)
+
+    def test_off_unless_enabled(self):
+        with mock.patch.dict(os.environ, {'ROI_MODE': '0'}):
+            self.assertIsNone(_roi_window({'x': 500, 'y': 500}, self.resolution))
+
+    def test_nearby_touches_share_a_window(self):
+        self.assertEqual(self.window(500, 500), (0.25, 0.25, 0.5, 0.5))
+        self.assertEqual(self.window(520, 480), self.window(500, 500))
+
+    def test_window_stays_inside_the_frame_and_holds_the_touch(self):
+        for x, y in ((0, 0), (999, 999), (130, 870), (610, 390)):
+            left, top, width, height = self.window(x, y)
+            with self.subTest(x=x, y=y):
+                self.assertTrue(0.0 <= left <= 1.0 - width and 0.0 <= top <= 1.0 - height)
+                self.assertTrue(left <= x / 1000 <= left + width and top <= y / 1000 <= top + height)
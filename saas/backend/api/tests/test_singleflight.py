@@ -0,0 +1,58 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.test import SimpleTestCase
+
+from backend.api.singleflight import SingleFlight
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_calls_share_one_run(self):
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def work():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {'Labels': []}
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            leader = pool.submit(flight.do, 'frame', work)
+            self.assertTrue(started.wait(5))
+            followers = [pool.submit(flight.do, 'frame', work) for _ in range(3)]
+            # Followers are waiting on the leader once they have been counted
+            while flight.coalesced < 3:
+                threading.Event().wait(0.001)
+            release.set()
+            results = [leader.result(5)] + [f.result(5) for f in followers]
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+
+    def test_exception_reaches_every_waiter(self):
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+
+        def fail():
+            started.set()
+            release.wait(5)
+            raise ValueError('detector failed')
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            leader = pool.submit(flight.do, 'frame', fail)
+            self.assertTrue(started.wait(5))
+            follower = pool.submit(flight.do, 'frame', fail)
+            while flight.coalesced < 1:
+                threading.Event().wait(0.001)
+            release.set()
+            for future in (leader, follower):
+                with self.assertRaisesMessage(ValueError, 'detector failed'):
+                    future.result(5)
+
+    def test_key_is_released_after_completion(self):
+        flight = SingleFlight()
+        self.assertEqual(flight.do('frame', lambda: 1), 1)
+        self.assertEqual(flight.do('frame', lambda: 2), 2)
+        self.assertEqual(flight.coalesced, 0)
@@ -0,0 +1,79 @@
+import random
+
+from django.test import SimpleTestCase
+
+from backend.api.spatial import LabelIndex, LabelIndexCache
+from backend.api.views import _best_label_near_point
+
+
+def random_labels(rng, count):
+    labels = []
+    for i in range(count):
+        instances = []
+        for _ in range(rng.randint(0, 3)):
+            width, height = rng.choice([0.0, rng.uniform(0.01, 0.5)]), rng.uniform(0.01, 0.5)
+            instances.append({
+                'BoundingBox': {
+                    'Left': rng.uniform(0, 1 - width),
+                    'Top': rng.uniform(0, 1 - height),
+                    'Width': width,
+                    'Height': height,
+                },
+                # Some instances fall back to the label's confidence
+                **({'Confidence': rng.uniform(50, 100)} if rng.random() < 0.8 else {}),
+            })
+        labels.append({
+            'Name': f'Label {i}',
+            'Confidence': rng.choice([rng.uniform(50, 100), 75.0]),
+            'Instances': instances,
+            'Parents': [{'Name': f'Parent {i % 3}'}],
+            'Aliases': [],
+        })
+    return labels
+
+
+class LabelIndexTests(SimpleTestCase):
+    def test_query_matches_linear_scan(self):
+        rng = random.Random(5)
+        for case in range(500):
+            # Up to ~120 boxes, so both the scan and the vectorized path are covered
+            labels = random_labels(rng, rng.randint(0, 40))
+            index = LabelIndex.from_labels(labels)
+            for _ in range(4):
+                u, v = rng.uniform(-0.1, 1.1), rng.uniform(-0.1, 1.1)
+                with self.subTest(case=case, u=u, v=v):
+                    self.assertEqual(index.query(u, v), _best_label_near_point(labels, u, v))
+
+    def test_smallest_containing_box_wins(self):
+        labels = [
+            {'Name': 'Shirt', 'Confidence': 99.0,
+             'Instances': [{'BoundingBox': {'Left': 0.1, 'Top': 0.1, 'Width': 0.8, 'Height': 0.8}}]},
+            {'Name': 'Tie', 'Confidence': 60.0,
+             'Instances': [{'BoundingBox': {'Left': 0.45, 'Top': 0.3, 'Width': 0.1, 'Height': 0.4}}]},
+        ]
+        self.assertEqual(LabelIndex.from_labels(labels).query(0.5, 0.5), 'Tie')
+
+    def test_most_confident_label_without_boxes(self):
+        labels = [{'Name': 'Indoors', 'Confidence': 80.0}, {'Name': 'Person', 'Confidence': 95.0}]
+        self.assertEqual(LabelIndex.from_labels(labels).query(0.5, 0.5), 'Person')
+        self.assertIsNone(LabelIndex.from_labels([]).query(0.5, 0.5))
+
+    def test_related_names(self):
+        labels = [{'Name': 'Tie', 'Aliases': [{'Name': 'Necktie'}], 'Parents': [{'Name': 'Accessories'}]}]
+        self.assertEqual(LabelIndex.from_labels(labels).related['Tie'], ['Necktie', 'Accessories'])
+
+
+class LabelIndexCacheTests(SimpleTestCase):
+    def test_index_is_built_once_per_response(self):
+        cache = LabelIndexCache(max_entries=2)
+        resp = {'Labels': [{'Name': 'Tie', 'Confidence': 90.0}]}
+        self.assertIs(cache.get(resp), cache.get(resp))
+        # An equal but distinct response is a different analysis
+        self.assertIsNot(cache.get(dict(resp)), cache.get(resp))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = LabelIndexCache(max_entries=1)
+        first, second = {'Labels': []}, {'Labels': []}
+        index = cache.get(first)
+        cache.get(second)
+        self.assertIsNot(cache.get(first), index)
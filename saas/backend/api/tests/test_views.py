@@ -0,0 +1,198 @@
+import json
+import os
+from unittest import mock
+
+from django.test import TestCase
+
+from backend.api import catalog, detectors
+from backend.api.cache import detect_labels_cache
+from backend.api.limiter import AdaptiveLimiter
+from backend.api.spatial import label_indexes
+
+TIE_URL = catalog.DEFAULT_PRODUCT_URLS['tie']
+SHIRT_URL = catalog.DEFAULT_PRODUCT_URLS['shirt']
+RESOLUTION = {'width': 1080, 'height': 1920}
+# Inside both the Tie and the Shirt box of DEFAULT_FIXTURE; the smaller Tie box wins
+ON_TIE = {'x': 540, 'y': 960}
+# Inside the Shirt box only
+ON_SHIRT = {'x': 300, 'y': 600}
+
+
+class FixtureDetectorTestCase(TestCase):
+    """Runs the API against DETECTOR_BACKEND=fixture and the built-in catalog, with image downloads stubbed."""
+
+    def setUp(self):
+        env = mock.patch.dict(os.environ, {
+            'DETECTOR_BACKEND': 'fixture',
+            'DETECTOR_FIXTURE': '',
+            'IMAGE_PREPROCESS': '0',
+            'ROI_MODE': '0',
+            'ARCHIVE_BUCKET': '',
+        })
+        env.start()
+        self.addCleanup(env.stop)
+
+        # Rebuilt from DETECTOR_BACKEND on first use
+        detector = mock.patch.object(detectors, '_detector', None)
+        detector.start()
+        self.addCleanup(detector.stop)
+
+        product_catalog = catalog.ProductCatalog(source=None)
+        product_catalog.load()
+        catalog_patch = mock.patch.object(catalog, '_catalog', product_catalog)
+        catalog_patch.start()
+        self.addCleanup(catalog_patch.stop)
+
+        fetch = mock.patch('backend.api.views._fetch_image_bytes', side_effect=lambda url, client: url.encode())
+        self.fetch = fetch.start()
+        self.addCleanup(fetch.stop)
+
+        detect_labels_cache.clear()
+        label_indexes.clear()
+        self.addCleanup(detect_labels_cache.clear)
+        self.addCleanup(label_indexes.clear)
+
+    def post_json(self, path, body):
+        return self.client.post(path, data=json.dumps(body), content_type='application/json')
+
+
+class RecommendTests(FixtureDetectorTestCase):
+    def test_recommends_product_under_touch(self):
+        response = self.post_json('/api/recommend', {
+            'image_s3_url': 'https://images.example.com/frame-1.png',
+            'touch_point': ON_TIE,
+            'screen_resolution': RESOLUTION,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'product_url': TIE_URL})
+
+    def test_repeat_touch_reuses_cached_analysis(self):
+        body = {
+            'image_s3_url': 'https://images.example.com/frame-1.png',
+            'touch_point': ON_TIE,
+            'screen_resolution': RESOLUTION,
+        }
+        with mock.patch.object(detectors.FixtureDetector, 'detect',
+                               autospec=True, side_effect=detectors.FixtureDetector.detect) as detect:
+            self.post_json('/api/recommend', body)
+            response = self.post_json('/api/recommend', {**body, 'touch_point': ON_SHIRT})
+        self.assertEqual(response.json(), {'product_url': SHIRT_URL})
+        self.assertEqual(detect.call_count, 1)
+
+    def test_missing_touch_point_is_rejected(self):
+        response = self.post_json('/api/recommend', {
+            'image_s3_url': 'https://images.example.com/frame-1.png',
+            'screen_resolution': RESOLUTION,
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_saturated_detector_is_shed_with_retry_after(self):
+        limiter = AdaptiveLimiter(initial=1, max_limit=1, queue_timeout=0.01)
+        # Hold the only slot, as a long-running call would
+        limiter.acquire(0)
+        with mock.patch('backend.api.views.detection_limiter', limiter):
+            response = self.post_json('/api/recommend', {
+                'image_s3_url': 'https://images.example.com/frame-1.png',
+                'touch_point': ON_TIE,
+                'screen_resolution': RESOLUTION,
+            })
+        self.assertEqual(response.status_code, 503)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertEqual(response.json()['retry_after'], int(response['Retry-After']))
+
+
+class RecommendBatchTests(FixtureDetectorTestCase):
+    def test_results_follow_input_order(self):
+        response = self.post_json('/api/recommend-batch', {'items': [
+            {
+                'image_s3_url': 'https://images.example.com/frame-1.png',
+                'touch_points': [ON_TIE, ON_SHIRT, {'x': 1}],
+                'screen_resolution': RESOLUTION,
+            },
+            {'image_s3_url': 'https://images.example.com/frame-2.png'},
+            {
+                'image_s3_url': 'https://images.example.com/frame-1.png',
+                'touch_points': [ON_SHIRT],
+                'screen_resolution': RESOLUTION,
+            },
+        ]})
+        self.assertEqual(response.status_code, 200)
+        first, invalid, repeat = response.json()['items']
+        self.assertEqual(first['status'], 200)
+        self.assertEqual([r['status'] for r in first['results']], [200, 200, 400])
+        self.assertEqual(first['results'][0]['product_url'], TIE_URL)
+        self.assertEqual(first['results'][1]['product_url'], SHIRT_URL)
+        self.assertEqual(invalid['status'], 400)
+        self.assertEqual(repeat['results'], [{'product_url': SHIRT_URL, 'status': 200}])
+        # frame-1 is listed twice but fetched once
+        self.assertEqual(self.fetch.call_count, 1)
+
+    def test_non_object_payload_is_rejected(self):
+        response = self.post_json('/api/recommend-batch', [])
+        self.assertEqual(response.status_code, 400)
+
+
+class DetectLabelsTests(FixtureDetectorTestCase):
+    url = 'https://images.example.com/frame-1.png'
+
+    def test_full_response_without_options(self):
+        response = self.post_json('/api/detect-labels', {'image_url': self.url})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([l['Name'] for l in response.json()['Labels']], ['Tie', 'Shirt', 'Person'])
+
+    def test_projection_filters_and_keeps_requested_fields(self):
+        response = self.post_json('/api/detect-labels', {
+            'image_url': self.url, 'fields': ['Confidence'], 'min_confidence': 95, 'top_k': 1,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['Labels'], [{'Name': 'Person', 'Confidence': 99.0}])
+
+    def test_columnar_format(self):
+        response = self.post_json('/api/detect-labels', {
+            'image_url': self.url, 'fields': ['Instances'], 'format': 'columnar', 'precision': 2,
+        })
+        body = response.json()
+        self.assertEqual(body['labels'], {'name': ['Tie', 'Shirt', 'Person']})
+        self.assertEqual(body['instances'], {
+            'label': [0, 1],
+            'left': [0.45, 0.2],
+            'top': [0.35, 0.25],
+            'width': [0.1, 0.6],
+            'height': [0.3, 0.5],
+            'confidence': [97.5, 92.0],
+        })
+
+    def test_invalid_option_is_rejected(self):
+        response = self.post_json('/api/detect-labels', {'image_url': self.url, 'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+
+class RecommendImageTests(FixtureDetectorTestCase):
+    def test_raw_body(self):
+        response = self.client.post('/api/recommend-image?x=540&y=960&width=1080&height=1920',
+                                    data=b'raw-frame', content_type='image/png')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'product_url': TIE_URL})
+
+    def test_multipart_upload(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        upload = SimpleUploadedFile('frame.png', b'multipart-frame', content_type='image/png')
+        response = self.client.post('/api/recommend-image', {
+            'image': upload, 'x': '300', 'y': '600', 'width': '1080', 'height': '1920',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'product_url': SHIRT_URL})
+
+    def test_oversized_image_is_rejected(self):
+        with mock.patch.dict(os.environ, {'MAX_UPLOAD_BYTES': '4'}):
+            response = self.client.post('/api/recommend-image?x=540&y=960&width=1080&height=1920',
+                                        data=b'raw-frame', content_type='image/png')
+        self.assertEqual(response.status_code, 413)
+
+    def test_invalid_resolution_is_rejected_before_detection(self):
+        with mock.patch.object(detectors.FixtureDetector, 'detect') as detect:
+            response = self.client.post('/api/recommend-image?x=540&y=960&width=0&height=1920',
+                                        data=b'raw-frame', content_type='image/png')
+        self.assertEqual(response.status_code, 400)
+        detect.assert_not_called()
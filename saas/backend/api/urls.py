@@ -1,8 +1,22 @@
+import os
+
 from django.urls import path
-from .views import recommend_product, fetch_image, detect_labels
+
+# backend.asgi turns this on so ASGI servers get the non-blocking view variants
+if os.getenv('API_ASYNC_VIEWS', '0') == '1':
+    from .async_views import recommend_product, recommend_batch, recommend_image, fetch_image, detect_labels
+else:
+    from .views import recommend_product, recommend_batch, recommend_image, fetch_image, detect_labels
+# No upstream I/O, so both modes share the sync implementations
+from .views import metrics, prefetch, product_urls
 
 urlpatterns = [
     path('recommend', recommend_product, name='recommend-product'),
+    path('recommend-batch', recommend_batch, name='recommend-batch'),
+    path('recommend-image', recommend_image, name='recommend-image'),
     path('fetch-image', fetch_image, name='fetch-image'),
     path('detect-labels', detect_labels, name='detect-labels'),
+    path('prefetch', prefetch, name='prefetch'),
+    path('product-urls', product_urls, name='product-urls'),
+    path('metrics', metrics, name='metrics'),
 ]
@@ -1,31 +1,64 @@
+import contextvars
+import functools
 import json
 import os
 import re
-from typing import Any, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-import boto3
-import requests
-from django.http import JsonResponse, HttpRequest, HttpResponse
+from botocore.exceptions import ClientError
+from django.http import HttpResponse, JsonResponse, HttpRequest
 from django.views.decorators.csrf import csrf_exempt
 
-
-def _parse_s3_url(url: str) -> Optional[Tuple[str, str]]:
-    # Supports s3://bucket/key or https://s3.amazonaws.com/bucket/key or virtual-hosted-style
-    if url.startswith("s3://"):
-        without_scheme = url[len("s3://"):]
-        parts = without_scheme.split("/", 1)
-        if len(parts) == 2:
-            return parts[0], parts[1]
+from .archive import archive_image
+from .cache import detect_labels_cache
+from .catalog import get_catalog
+from .metrics import mark, render as render_metrics, stage
+from .projection import fast_json_response, parse_detect_options, project_detect_response, wants_projection
+from .preprocess import run_preprocess
+from .singleflight import analysis_flight
+from .clients import get_http_session, get_s3_client
+from .detectors import Detector, get_detector
+from .disk_cache import disk_detect_cache
+from .limiter import Overloaded, detection_limiter
+from .prefetch import PrefetchQueueFull, prefetch_pool
+from .s3util import _parse_s3_url
+from .spatial import LabelIndex, label_indexes
+from .streaming import open_image_stream, request_image_headers, sniff_content_type, streaming_image_response
+
+
+def _s3_url_region(url: str) -> Optional[str]:
+    # Region embedded in virtual-hosted or path-style URLs, e.g. <bucket>.s3.<region>.amazonaws.com
+    m = re.match(r"https?://(?:[a-z0-9-_.]+\.)?s3[.-]([a-z0-9-]+)\.amazonaws\.com/", url)
+    return m.group(1) if m else None
+
+
+# bucket -> region; only successful lookups are kept, so a transient error is retried on the next request
+_bucket_regions: Dict[str, str] = {}
+
+
+def _bucket_region(image_url: str, bucket: str, s3_client) -> Optional[str]:
+    region = _s3_url_region(image_url) or _bucket_regions.get(bucket)
+    if region:
+        return region
+    try:
+        region = s3_client.get_bucket_location(Bucket=bucket).get('LocationConstraint') or 'us-east-1'
+    except Exception:
         return None
-    # virtual-hosted-style: https://<bucket>.s3.<region>.amazonaws.com/<key>
-    vh = re.match(r"https?://([a-z0-9-_.]+)\.s3[.-][a-z0-9-]+\.amazonaws\.com/(.+)", url)
-    if vh:
-        return vh.group(1), vh.group(2)
-    # path-style: https://s3.<region>.amazonaws.com/<bucket>/<key>
-    ps = re.match(r"https?://s3[.-][a-z0-9-]+\.amazonaws\.com/([^/]+)/(.+)", url)
-    if ps:
-        return ps.group(1), ps.group(2)
-    return None
+    _bucket_regions[bucket] = region
+    return region
+
+
+def _use_s3_object(bucket_region: Optional[str], rekognition_region: Optional[str]) -> bool:
+    # Rekognition can only read buckets in its own region; unknown regions are attempted and
+    # fall back to byte upload if Rekognition rejects the object
+    if os.getenv('REKOGNITION_S3_OBJECT_MODE', '1') != '1':
+        return False
+    return bucket_region is None or rekognition_region is None or bucket_region == rekognition_region
+
+
+def _is_invalid_s3_object(exc: Exception) -> bool:
+    return isinstance(exc, ClientError) and exc.response.get('Error', {}).get('Code') == 'InvalidS3ObjectException'
 
 
 def _fetch_image_bytes(image_url: str, s3_client) -> bytes:
@@ -36,11 +69,133 @@ def _fetch_image_bytes(image_url: str, s3_client) -> bytes:
         return obj['Body'].read()
     # Assume HTTP(S)
     timeout = float(os.getenv('S3_TIMEOUT_SECONDS', '15'))
-    resp = requests.get(image_url, timeout=timeout)
+    resp = get_http_session().get(image_url, timeout=timeout)
     resp.raise_for_status()
     return resp.content
 
 
+def _detect_params() -> Tuple[int, float]:
+    max_labels = int(os.getenv('REKOGNITION_MAX_LABELS', '50'))
+    min_conf = float(os.getenv('DETECT_MIN_CONFIDENCE', '50'))
+    return max_labels, min_conf
+
+
+def _detect_labels(image_bytes: bytes) -> Dict[str, Any]:
+    # Results are cached by original image content, so repeat taps on one frame skip
+    # both preprocessing and the detector call
+    detector = get_detector()
+    max_labels, min_conf = _detect_params()
+    key = detect_labels_cache.make_key(image_bytes, max_labels, min_conf, detector.name)
+    cached = detect_labels_cache.get(key)
+    if cached is not None:
+        mark('cache', 'hit')
+        return cached
+    mark('cache', 'miss')
+    with stage('preprocess'):
+        prepared = run_preprocess(image_bytes)
+    with stage('detect'):
+        resp = detection_limiter.call(
+            lambda: detector.detect(prepared.data if prepared else image_bytes, max_labels, min_conf))
+    if prepared:
+        resp = {**resp, 'Preprocessing': prepared.describe()}
+    detect_labels_cache.set(key, resp)
+    return resp
+
+
+def _detect_labels_s3_object(bucket: str, key: str, detector: Detector) -> Dict[str, Any]:
+    # The detector reads the object itself, so the backend never downloads it. Results are
+    # cached by _fetch_and_detect under the object's ETag, never by bucket/key alone.
+    max_labels, min_conf = _detect_params()
+    with stage('detect'):
+        return detection_limiter.call(lambda: detector.detect_s3_object(bucket, key, max_labels, min_conf))
+
+
+def _roi_window(point: Dict[str, Any], resolution: Dict[str, Any]) -> Optional[Tuple[float, float, float, float]]:
+    # (left, top, width, height) ratios of ROI_WINDOW x the frame, centred on the touch and kept inside
+    # the frame; None when ROI mode is off or the touch cannot be normalized
+    if os.getenv('ROI_MODE', '0') != '1':
+        return None
+    size = float(os.getenv('ROI_WINDOW', '0.5'))
+    if not 0.0 < size < 1.0:
+        return None
+    try:
+        u, v = _normalize_point(point, resolution)
+    except (TypeError, ValueError):
+        return None
+    # Corners snap to a grid of a quarter window, so nearby touches share a window and its cache
+    # entry; the touch stays within the middle quarter of the window (before clamping)
+    step = size / 4.0
+    left = min(max(round((u - size / 2.0) / step) * step, 0.0), 1.0 - size)
+    top = min(max(round((v - size / 2.0) / step) * step, 0.0), 1.0 - size)
+    return round(left, 4), round(top, 4), size, size
+
+
+def _map_to_frame(resp: Dict[str, Any], crop: Tuple[float, float, float, float]) -> Dict[str, Any]:
+    # Boxes detected on the crop become ratios of the full frame, as _best_label_near_point expects
+    left, top, width, height = crop
+    labels = []
+    for label in resp.get('Labels') or []:
+        instances = []
+        for inst in label.get('Instances') or []:
+            box = inst.get('BoundingBox') or {}
+            instances.append({**inst, 'BoundingBox': {
+                'Left': left + float(box.get('Left', 0.0)) * width,
+                'Top': top + float(box.get('Top', 0.0)) * height,
+                'Width': float(box.get('Width', 0.0)) * width,
+                'Height': float(box.get('Height', 0.0)) * height,
+            }})
+        labels.append({**label, 'Instances': instances})
+    return {**resp, 'Labels': labels}
+
+
+def _has_instances(resp: Dict[str, Any]) -> bool:
+    return any(label.get('Instances') for label in resp.get('Labels') or [])
+
+
+def _cached_full_frame(image_bytes: bytes) -> Optional[Dict[str, Any]]:
+    # A full-frame result already cached for these bytes answers any touch without another detector call
+    max_labels, min_conf = _detect_params()
+    return detect_labels_cache.get(
+        detect_labels_cache.make_key(image_bytes, max_labels, min_conf, get_detector().name))
+
+
+def _detect_labels_region(image_bytes: bytes,
+                          window: Tuple[float, float, float, float]) -> Optional[Dict[str, Any]]:
+    # DetectLabels on the crop around the touch; None when the crop could not be made or held no
+    # instance, and the full frame should be analyzed instead. Empty crops are cached too.
+    detector = get_detector()
+    max_labels, min_conf = _detect_params()
+    key = detect_labels_cache.make_key(image_bytes, max_labels, min_conf, detector.name, window)
+    resp = detect_labels_cache.get(key)
+    if resp is None:
+        mark('cache', 'miss')
+        with stage('preprocess'):
+            prepared = run_preprocess(image_bytes, crop=window)
+        if prepared is None:
+            return None
+        with stage('detect'):
+            resp = detection_limiter.call(lambda: detector.detect(prepared.data, max_labels, min_conf))
+        resp = _map_to_frame({**resp, 'Preprocessing': prepared.describe()}, prepared.crop)
+        detect_labels_cache.set(key, resp)
+    else:
+        mark('cache', 'hit')
+    return resp if _has_instances(resp) else None
+
+
+def _content_type_for_url(image_url: str) -> str:
+    # Determine content type from URL extension; used when upstream metadata and magic bytes don't say
+    lower_url = image_url.lower()
+    if lower_url.endswith('.png'):
+        return 'image/png'
+    if lower_url.endswith('.gif'):
+        return 'image/gif'
+    if lower_url.endswith('.webp'):
+        return 'image/webp'
+    if lower_url.endswith('.bmp'):
+        return 'image/bmp'
+    return 'image/jpeg'
+
+
 def _normalize_point(point: Dict[str, Any], resolution: Dict[str, Any]) -> Tuple[float, float]:
     sx = float(resolution.get('width'))
     sy = float(resolution.get('height'))
@@ -52,6 +207,8 @@ def _normalize_point(point: Dict[str, Any], resolution: Dict[str, Any]) -> Tuple
 
 
 def _best_label_near_point(labels: List[Dict[str, Any]], u: float, v: float) -> Optional[str]:
+    # One-off query on raw labels; building a LabelIndex costs more than this scan, so the
+    # recommend paths query the cached index of the analysed response instead (label_indexes).
     best: Optional[Tuple[float, str]] = None  # (score, label)
 
     # Prefer boxes containing the point; tie-break by smallest area and highest confidence
@@ -97,39 +254,251 @@ def _best_label_near_point(labels: List[Dict[str, Any]], u: float, v: float) ->
     return None
 
 
-def _lookup_product_url_for_label(label: str, s3_client) -> Optional[str]:
-    # Hard-coded product mapping. Update this dict to add or change mappings.
-    # Keys should match Rekognition label names (case-insensitive match is attempted).
-    PRODUCT_URL_MAP = {
-        "t-shirt": "https://example.com/products/t-shirt",
-        "shirt": "https://example.com/products/shirt",
-        "jeans": "https://example.com/products/jeans",
-        "shoe": "https://example.com/products/shoe",
-        "sneaker": "https://example.com/products/sneaker",
-        "bottle": "https://example.com/products/bottle",
-        "phone": "https://example.com/products/phone",
-        "tie": "https://www.hermes.com/hk/en/category/men/ties-stoles-and-scarves/#|"
-        # Add more label -> url mappings here as needed.
-    }
-
+def _lookup_product_url_for_label(label: str, related: Iterable[str] = ()) -> Optional[str]:
+    # Mappings live in the product catalog (PRODUCT_CATALOG_SOURCE); related names are
+    # Rekognition Aliases/Parents tried when the label itself has no entry.
     if not label or not isinstance(label, str):
         return None
+    return get_catalog().lookup(label, related)
 
-    raw = label.strip()
-    lower = raw.lower()
-    slug = re.sub(r"[^a-z0-9]+", "-", lower).strip("-")
 
-    # Try exact variants in order of likeliness
-    for key in (raw, lower, slug):
-        if not isinstance(key, str):
-            continue
-        # normalize key for lookup (map keys are stored lowercase/slugs)
-        normalized = key.lower()
-        if normalized in PRODUCT_URL_MAP:
-            return PRODUCT_URL_MAP[normalized]
+class ImageFetchError(Exception):
+    """The image could not be downloaded from S3 or HTTP(S)."""
 
-    # No mapping found
-    return None
+
+class DetectionError(Exception):
+    """The detector failed to label an image."""
+
+
+def _image_etag(image_url: str) -> Optional[str]:
+    # ETag of an S3 image from one HEAD request; None for HTTP(S) URLs or when the HEAD fails
+    location = _parse_s3_url(image_url)
+    return _head_etag(location[0], location[1], get_s3_client()) if location else None
+
+
+def _prefetch_key(image_url: str, etag: Optional[str]) -> str:
+    max_labels, min_conf = _detect_params()
+    return detect_labels_cache.make_url_key(image_url, max_labels, min_conf, get_detector().name, etag)
+
+
+def _analyze_image(image_url: str) -> Dict[str, Any]:
+    # An image prefetched through /api/prefetch is reused before anything is downloaded,
+    # as long as the object still has the ETag it was prefetched with
+    etag = _image_etag(image_url)
+    prefetched = prefetch_pool.lookup(_prefetch_key(image_url, etag))
+    if prefetched is not None:
+        mark('prefetch', 'hit')
+        return prefetched
+    return _coalesced_analysis(image_url, etag)
+
+
+def _analyze_region(image_url: str, window: Tuple[float, float, float, float]) -> Dict[str, Any]:
+    # A full prefetched analysis is already paid for, so it beats cropping
+    prefetched = prefetch_pool.lookup(_prefetch_key(image_url, _image_etag(image_url)))
+    if prefetched is not None:
+        mark('prefetch', 'hit')
+        return prefetched
+    return analysis_flight.do((image_url, window), lambda: _fetch_and_detect_region(image_url, window))
+
+
+def _fetch_and_detect_region(image_url: str, window: Tuple[float, float, float, float]) -> Dict[str, Any]:
+    # Cropping needs the pixels, so ROI mode always downloads the image (no S3Object or disk cache path)
+    try:
+        with stage('fetch'):
+            image_bytes = _fetch_image_bytes(image_url, get_s3_client())
+    except Exception as e:
+        raise ImageFetchError(str(e)) from e
+    try:
+        resp = _cached_full_frame(image_bytes)
+        if resp is not None:
+            mark('roi', 'full-frame')
+            return resp
+        resp = _detect_labels_region(image_bytes, window)
+        if resp is not None:
+            mark('roi', 'crop')
+            return resp
+        mark('roi', 'fallback')
+        return _detect_labels(image_bytes)
+    except Exception as e:
+        raise DetectionError(str(e)) from e
+
+
+def _coalesced_analysis(image_url: str, etag: Optional[str] = None) -> Dict[str, Any]:
+    # Concurrent requests for the same image version share one fetch + DetectLabels
+    return analysis_flight.do((image_url, etag), lambda: _fetch_and_detect(image_url, etag))
+
+
+def _fetch_and_detect(image_url: str, etag: Optional[str]) -> Dict[str, Any]:
+    # S3 images whose ETag is known (_image_etag) are looked up by it in memory and,
+    # with DETECT_DISK_CACHE_PATH set, on disk
+    location = _parse_s3_url(image_url)
+    if not (location and etag):
+        return _detect_image(image_url, location)
+    bucket, key = location
+    max_labels, min_conf = _detect_params()
+    backend = get_detector().name
+    object_key = detect_labels_cache.make_object_key(bucket, key, etag, max_labels, min_conf, backend)
+    cached = detect_labels_cache.get(object_key)
+    if cached is not None:
+        mark('cache', 'hit')
+        return cached
+    disk_key = None
+    if disk_detect_cache.enabled:
+        disk_key = disk_detect_cache.make_key(bucket, key, etag, max_labels, min_conf, backend)
+        with stage('disk_cache'):
+            cached = disk_detect_cache.get(disk_key)
+        if cached is not None:
+            mark('disk_cache', 'hit')
+            detect_labels_cache.set(object_key, cached)
+            return cached
+        mark('disk_cache', 'miss')
+    resp = _detect_image(image_url, location)
+    if disk_key:
+        disk_detect_cache.set(disk_key, resp)
+    detect_labels_cache.set(object_key, resp)
+    return resp
+
+
+def _head_etag(bucket: str, key: str, s3_client) -> Optional[str]:
+    # Failures skip the ETag-keyed caches; the fetch that follows reports the real error
+    try:
+        with stage('head'):
+            return s3_client.head_object(Bucket=bucket, Key=key).get('ETag')
+    except Exception:
+        return None
+
+
+def _detect_image(image_url: str, location: Optional[Tuple[str, str]]) -> Dict[str, Any]:
+    # Fetch + DetectLabels for one image URL; errors are tagged with the stage that failed
+    if location:
+        bucket, key = location
+        detector = get_detector()
+        if detector.supports_s3_object and _use_s3_object(
+                _bucket_region(image_url, bucket, get_s3_client()), detector.region()):
+            try:
+                return _detect_labels_s3_object(bucket, key, detector)
+            except Exception as e:
+                if not _is_invalid_s3_object(e):
+                    raise DetectionError(str(e)) from e
+    try:
+        with stage('fetch'):
+            image_bytes = _fetch_image_bytes(image_url, get_s3_client())
+    except Exception as e:
+        raise ImageFetchError(str(e)) from e
+    try:
+        return _detect_labels(image_bytes)
+    except Exception as e:
+        raise DetectionError(str(e)) from e
+
+
+def _analysis_error(exc: Exception) -> Tuple[Dict[str, Any], int]:
+    if isinstance(exc, ImageFetchError):
+        return {'detail': f'Failed to fetch image: {str(exc)}'}, 400
+    overloaded = exc if isinstance(exc, Overloaded) else exc.__cause__
+    if isinstance(overloaded, Overloaded):
+        return {'detail': str(overloaded), 'retry_after': overloaded.retry_after}, 503
+    return {'detail': f'Rekognition error: {str(exc)}'}, 502
+
+
+def _analysis_error_response(exc: Exception) -> JsonResponse:
+    body, status = _analysis_error(exc)
+    response = JsonResponse(body, status=status)
+    if 'retry_after' in body:
+        response['Retry-After'] = str(body['retry_after'])
+    return response
+
+
+def _recommend_for_labels(index: LabelIndex, point: Dict[str, Any],
+                          resolution: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    try:
+        u, v = _normalize_point(point, resolution)
+    except Exception as e:
+        return {'detail': f'Invalid touch point or resolution: {str(e)}'}, 400
+
+    with stage('match'):
+        label_name = index.query(u, v)
+    if not label_name:
+        return {'detail': 'No suitable label found near point'}, 404
+
+    try:
+        with stage('catalog'):
+            url = _lookup_product_url_for_label(label_name, index.related.get(label_name, ()))
+    except Exception as e:
+        return {'detail': f'Catalog lookup error: {str(e)}'}, 502
+
+    if not url:
+        return {'detail': f'No product mapping for label: {label_name}'}, 404
+
+    return {'product_url': url}, 200
+
+
+def _parse_batch_items(payload: Any) -> List[Dict[str, Any]]:
+    """
+    Validate a batch recommend payload.
+
+    Returns one entry per input item; invalid items carry an error body and
+    status instead of an image URL so they can be reported in place.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError('Request body must be a JSON object')
+    items = payload.get('items')
+    if not isinstance(items, list) or not items:
+        raise ValueError('items must be a non-empty list')
+    max_items = int(os.getenv('RECOMMEND_BATCH_MAX_ITEMS', '16'))
+    max_points = int(os.getenv('RECOMMEND_BATCH_MAX_POINTS', '64'))
+    if len(items) > max_items:
+        raise ValueError(f'at most {max_items} items per batch')
+
+    parsed: List[Dict[str, Any]] = []
+    total_points = 0
+    for item in items:
+        if not isinstance(item, dict):
+            parsed.append({'error': ({'detail': 'item must be an object'}, 400)})
+            continue
+        image_url = item.get('image_s3_url')
+        points = item.get('touch_points')
+        resolution = item.get('screen_resolution') or {}
+        if not isinstance(image_url, str) or not image_url:
+            parsed.append({'error': ({'detail': 'image_s3_url is required'}, 400)})
+            continue
+        if not isinstance(points, list) or not points:
+            parsed.append({'error': ({'detail': 'touch_points must be a non-empty list'}, 400)})
+            continue
+        if not (isinstance(resolution, dict) and 'width' in resolution and 'height' in resolution):
+            parsed.append({'error': ({'detail': 'screen_resolution with width,height required'}, 400)})
+            continue
+        total_points += len(points)
+        parsed.append({'image_s3_url': image_url, 'touch_points': points, 'screen_resolution': resolution})
+    if total_points > max_points:
+        raise ValueError(f'at most {max_points} touch points per batch')
+    return parsed
+
+
+def _batch_results(parsed: List[Dict[str, Any]], analyses: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # analyses maps each distinct image URL to its DetectLabels response or the exception it raised
+    results: List[Dict[str, Any]] = []
+    for item in parsed:
+        if 'error' in item:
+            body, status = item['error']
+            results.append({**body, 'status': status})
+            continue
+        image_url = item['image_s3_url']
+        analysis = analyses[image_url]
+        if isinstance(analysis, Exception):
+            body, status = _analysis_error(analysis)
+            results.append({'image_s3_url': image_url, **body, 'status': status})
+            continue
+        with stage('match'):
+            index = label_indexes.get(analysis)
+        point_results = []
+        for point in item['touch_points']:
+            if not (isinstance(point, dict) and 'x' in point and 'y' in point):
+                point_results.append({'detail': 'touch_point with x,y required', 'status': 400})
+                continue
+            body, status = _recommend_for_labels(index, point, item['screen_resolution'])
+            point_results.append({**body, 'status': status})
+        results.append({'image_s3_url': image_url, 'status': 200, 'results': point_results})
+    return results
 
 
 @csrf_exempt
@@ -153,57 +522,205 @@ def recommend_product(request: HttpRequest):
     if not (isinstance(resolution, dict) and 'width' in resolution and 'height' in resolution):
         return JsonResponse({'detail': 'screen_resolution with width,height required'}, status=400)
 
+    # ROI_MODE: only the window around the touch goes to the detector
+    window = _roi_window(point, resolution)
     try:
-        s3_client = boto3.client('s3', region_name=os.getenv('AWS_REGION'))
-        image_bytes = _fetch_image_bytes(image_url, s3_client)
-    except Exception as e:
-        return JsonResponse({'detail': f'Failed to fetch image: {str(e)}'}, status=400)
+        resp = _analyze_region(image_url, window) if window else _analyze_image(image_url)
+    except (ImageFetchError, DetectionError) as e:
+        return _analysis_error_response(e)
+
+    with stage('match'):
+        index = label_indexes.get(resp)
+    body, status = _recommend_for_labels(index, point, resolution)
+    return JsonResponse(body, status=status)
+
+
+@csrf_exempt
+def recommend_batch(request: HttpRequest):
+    """
+    Resolve many touch points on many images in one request.
+
+    POST /api/recommend-batch
+    Body: {"items": [{"image_s3_url": "...", "touch_points": [{"x": .., "y": ..}, ...],
+                      "screen_resolution": {"width": .., "height": ..}}, ...]}
+    Returns: {"items": [...]} in input order, each with a status and per-point results
+    """
+    if request.method != 'POST':
+        return JsonResponse({'detail': 'Method not allowed'}, status=405)
 
     try:
-        rekognition = boto3.client('rekognition', region_name=os.getenv('AWS_REGION'))
-        max_labels = int(os.getenv('REKOGNITION_MAX_LABELS', '50'))
-        min_conf = float(os.getenv('DETECT_MIN_CONFIDENCE', '50'))
-        resp = rekognition.detect_labels(
-            Image={'Bytes': image_bytes},
-            MaxLabels=max_labels,
-            MinConfidence=min_conf,
-        )
-    except Exception as e:
-        return JsonResponse({'detail': f'Rekognition error: {str(e)}'}, status=502)
+        payload = json.loads(request.body.decode('utf-8'))
+    except Exception:
+        return JsonResponse({'detail': 'Invalid JSON body'}, status=400)
 
-    labels = resp.get('Labels') or []
-    # return JsonResponse({'labels': labels})
+    try:
+        parsed = _parse_batch_items(payload)
+    except ValueError as e:
+        return JsonResponse({'detail': str(e)}, status=400)
+
+    # Each distinct image is fetched and analyzed once, concurrently with the others
+    urls = list(dict.fromkeys(item['image_s3_url'] for item in parsed if 'image_s3_url' in item))
+    analyses: Dict[str, Any] = {}
+    if urls:
+        workers = min(len(urls), int(os.getenv('RECOMMEND_BATCH_WORKERS', '8')))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Each task runs in a copy of the request context, so its stage timings reach Server-Timing
+            futures = {url: pool.submit(contextvars.copy_context().run, _analyze_image, url) for url in urls}
+            for url, future in futures.items():
+                try:
+                    analyses[url] = future.result()
+                except (ImageFetchError, DetectionError) as e:
+                    analyses[url] = e
+
+    return JsonResponse({'items': _batch_results(parsed, analyses)})
+
+
+def _max_upload_bytes() -> int:
+    return int(os.getenv('MAX_UPLOAD_BYTES', str(10 * 1024 * 1024)))
+
+
+def _upload_too_large(max_bytes: int) -> JsonResponse:
+    return JsonResponse({'detail': f'image exceeds MAX_UPLOAD_BYTES ({max_bytes} bytes)'}, status=413)
+
+
+def _direct_image_request(request: HttpRequest) -> Tuple[Optional[Dict[str, Any]], Optional[JsonResponse]]:
+    """
+    Read an image submitted with the request itself.
 
+    multipart/form-data: file field ``image`` plus x, y, width, height form fields.
+    Raw body (image/* or application/octet-stream): x, y, width, height as query parameters.
+    Images larger than MAX_UPLOAD_BYTES are rejected with 413; the touch point is
+    validated before the image is read or analyzed.
+    """
+    if request.method != 'POST':
+        return None, JsonResponse({'detail': 'Method not allowed'}, status=405)
+
+    multipart = request.content_type == 'multipart/form-data'
+    fields = request.POST if multipart else request.GET
+    if not all(fields.get(name) for name in ('x', 'y', 'width', 'height')):
+        return None, JsonResponse({'detail': 'x, y, width and height are required'}, status=400)
+    touch_point = {'x': fields['x'], 'y': fields['y']}
+    resolution = {'width': fields['width'], 'height': fields['height']}
     try:
-        u, v = _normalize_point(point, resolution)
+        _normalize_point(touch_point, resolution)
     except Exception as e:
-        return JsonResponse({'detail': f'Invalid touch point or resolution: {str(e)}'}, status=400)
-    
+        return None, JsonResponse({'detail': f'Invalid touch point or resolution: {str(e)}'}, status=400)
+
+    max_bytes = _max_upload_bytes()
+    if multipart:
+        upload = request.FILES.get('image')
+        if upload is None:
+            return None, JsonResponse({'detail': 'image file field is required'}, status=400)
+        if upload.size > max_bytes:
+            return None, _upload_too_large(max_bytes)
+        image_bytes = upload.read()
+        declared_type = upload.content_type
+    else:
+        # Read from the stream rather than request.body: DATA_UPLOAD_MAX_MEMORY_SIZE stays at
+        # Django's default for every other endpoint, and this one enforces MAX_UPLOAD_BYTES itself
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = 0
+        if content_length > max_bytes:
+            return None, _upload_too_large(max_bytes)
+        image_bytes = request.read(max_bytes + 1)
+        if len(image_bytes) > max_bytes:
+            return None, _upload_too_large(max_bytes)
+        declared_type = request.content_type
+
+    if not image_bytes:
+        return None, JsonResponse({'detail': 'image body is required'}, status=400)
+
+    content_type = declared_type if (declared_type or '').startswith('image/') else None
+    return {
+        'image_bytes': image_bytes,
+        'content_type': content_type or sniff_content_type(image_bytes[:16]) or 'application/octet-stream',
+        'touch_point': touch_point,
+        'screen_resolution': resolution,
+    }, None
 
-    label_name = _best_label_near_point(labels, u, v)
-    if not label_name:
-        return JsonResponse({'detail': 'No suitable label found near point'}, status=404)
 
-    # return JsonResponse({'label': label_name})
+@csrf_exempt
+def recommend_image(request: HttpRequest):
+    """
+    Recommend a product for an image uploaded directly, skipping the S3 round trip.
+
+    POST /api/recommend-image
+    Body: multipart form (image, x, y, width, height) or raw image bytes with
+    ?x=..&y=..&width=..&height=..
+    Returns: {"product_url": "..."} plus "image_s3_url" when ARCHIVE_BUCKET is set;
+    the archive upload runs in the background after the response.
+    """
+    submission, error = _direct_image_request(request)
+    if error is not None:
+        return error
+
     try:
-        url = _lookup_product_url_for_label(label_name, s3_client)
+        resp = _detect_labels(submission['image_bytes'])
     except Exception as e:
-        return JsonResponse({'detail': f'S3 lookup error: {str(e)}'}, status=502)
+        return _analysis_error_response(e)
+
+    with stage('match'):
+        index = label_indexes.get(resp)
+    body, status = _recommend_for_labels(index, submission['touch_point'], submission['screen_resolution'])
+    archived_url = archive_image(submission['image_bytes'], submission['content_type'])
+    if archived_url:
+        body['image_s3_url'] = archived_url
+    return JsonResponse(body, status=status)
+
+
+def _fetch_image_url(request: HttpRequest) -> Tuple[Optional[str], Optional[JsonResponse]]:
+    # GET ?image_url=... lets browsers and CDNs use conditional requests; POST keeps the JSON body form
+    if request.method == 'GET':
+        image_url = request.GET.get('image_url')
+    elif request.method == 'POST':
+        try:
+            payload = json.loads(request.body.decode('utf-8'))
+        except Exception:
+            return None, JsonResponse({'detail': 'Invalid JSON body'}, status=400)
+        image_url = payload.get('image_url')
+    else:
+        return None, JsonResponse({'detail': 'Method not allowed'}, status=405)
 
-    if not url:
-        return JsonResponse({'detail': f'No product mapping for label: {label_name}'}, status=404)
-
-    return JsonResponse({'product_url': url})
+    if not isinstance(image_url, str) or not image_url:
+        return None, JsonResponse({'detail': 'image_url is required'}, status=400)
+    return image_url, None
 
 
 @csrf_exempt
 def fetch_image(request: HttpRequest):
     """
-    Fetch and return image bytes from S3 or HTTP(S) URL.
-    
+    Stream image bytes from S3 or HTTP(S) URL.
+
+    GET  /api/fetch-image?image_url=...
     POST /api/fetch-image
     Body: {"image_url": "s3://bucket/key or https://..."}
-    Returns: Raw image bytes with appropriate Content-Type
+    Returns: Image bytes streamed from upstream. Range, If-None-Match and
+    If-Modified-Since are forwarded, so 206 and 304 responses pass through.
+    """
+    image_url, error = _fetch_image_url(request)
+    if error is not None:
+        return error
+
+    try:
+        with stage('fetch'):
+            stream = open_image_stream(image_url, _parse_s3_url(image_url), request_image_headers(request))
+        return streaming_image_response(stream, _content_type_for_url(image_url))
+    except Exception as e:
+        return JsonResponse({'detail': f'Failed to fetch image: {str(e)}'}, status=400)
+
+
+@csrf_exempt
+def detect_labels(request: HttpRequest):
+    """
+    Run DetectLabels on an image URL with the configured detector (DETECTOR_BACKEND).
+    
+    POST /api/detect-labels
+    Body: {"image_url": "s3://bucket/key or https://...",
+           "fields": [...], "min_confidence": 80, "top_k": 5, "format": "full|columnar", "precision": 3}
+    Returns: Full DetectLabels response (Rekognition format for every backend), or
+    the projected/columnar form when any of the optional fields is given
     """
     if request.method != 'POST':
         return JsonResponse({'detail': 'Method not allowed'}, status=405)
@@ -216,36 +733,30 @@ def fetch_image(request: HttpRequest):
     image_url = payload.get('image_url')
     if not isinstance(image_url, str) or not image_url:
         return JsonResponse({'detail': 'image_url is required'}, status=400)
-
     try:
-        s3_client = boto3.client('s3', region_name=os.getenv('AWS_REGION'))
-        image_bytes = _fetch_image_bytes(image_url, s3_client)
-    except Exception as e:
-        return JsonResponse({'detail': f'Failed to fetch image: {str(e)}'}, status=400)
+        options = parse_detect_options(payload) if wants_projection(payload) else None
+    except ValueError as e:
+        return JsonResponse({'detail': str(e)}, status=400)
 
-    # Determine content type from URL extension
-    content_type = 'image/jpeg'
-    lower_url = image_url.lower()
-    if lower_url.endswith('.png'):
-        content_type = 'image/png'
-    elif lower_url.endswith('.gif'):
-        content_type = 'image/gif'
-    elif lower_url.endswith('.webp'):
-        content_type = 'image/webp'
-    elif lower_url.endswith('.bmp'):
-        content_type = 'image/bmp'
+    try:
+        resp = _analyze_image(image_url)
+    except (ImageFetchError, DetectionError) as e:
+        return _analysis_error_response(e)
 
-    return HttpResponse(image_bytes, content_type=content_type)
+    if options is not None:
+        resp = project_detect_response(resp, options)
+    return fast_json_response(resp)
 
 
 @csrf_exempt
-def detect_labels(request: HttpRequest):
+def prefetch(request: HttpRequest):
     """
-    Run AWS Rekognition DetectLabels on an image URL.
-    
-    POST /api/detect-labels
+    Start analyzing an image in the background, ahead of the tap.
+
+    POST /api/prefetch
     Body: {"image_url": "s3://bucket/key or https://..."}
-    Returns: Full Rekognition DetectLabels response
+    Returns: 202 {"status": "queued" | "pending" | "cached"} at once; the later
+    /api/recommend (or detect-labels) for the same URL reuses the result.
     """
     if request.method != 'POST':
         return JsonResponse({'detail': 'Method not allowed'}, status=405)
@@ -255,26 +766,71 @@ def detect_labels(request: HttpRequest):
     except Exception:
         return JsonResponse({'detail': 'Invalid JSON body'}, status=400)
 
-    image_url = payload.get('image_url')
+    image_url = payload.get('image_url') if isinstance(payload, dict) else None
     if not isinstance(image_url, str) or not image_url:
         return JsonResponse({'detail': 'image_url is required'}, status=400)
 
     try:
-        s3_client = boto3.client('s3', region_name=os.getenv('AWS_REGION'))
-        image_bytes = _fetch_image_bytes(image_url, s3_client)
-    except Exception as e:
-        return JsonResponse({'detail': f'Failed to fetch image: {str(e)}'}, status=400)
+        etag = _image_etag(image_url)
+        status = prefetch_pool.submit(_prefetch_key(image_url, etag), image_url,
+                                      functools.partial(_coalesced_analysis, etag=etag))
+    except PrefetchQueueFull as e:
+        response = JsonResponse({'detail': str(e)}, status=503)
+        response['Retry-After'] = '1'
+        return response
+    return JsonResponse({'status': status}, status=202)
+
+
+@csrf_exempt
+def product_urls(request: HttpRequest):
+    """
+    Look up product URLs for many labels at once.
+
+    POST /api/product-urls
+    Body: {"labels": ["Tie", {"name": "Sneaker", "related": ["Shoe", "Footwear"]}, ...]}
+    Returns: {"product_urls": {"Tie": "...", "Sneaker": null, ...}}; related names
+    (Rekognition Aliases/Parents) are tried in order when a label has no entry.
+    Lets clients that resolve touches locally prefetch every candidate's URL.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'detail': 'Method not allowed'}, status=405)
 
     try:
-        rekognition = boto3.client('rekognition', region_name=os.getenv('AWS_REGION'))
-        max_labels = int(os.getenv('REKOGNITION_MAX_LABELS', '50'))
-        min_conf = float(os.getenv('DETECT_MIN_CONFIDENCE', '50'))
-        resp = rekognition.detect_labels(
-            Image={'Bytes': image_bytes},
-            MaxLabels=max_labels,
-            MinConfidence=min_conf,
-        )
+        payload = json.loads(request.body.decode('utf-8'))
+    except Exception:
+        return JsonResponse({'detail': 'Invalid JSON body'}, status=400)
+
+    labels = payload.get('labels') if isinstance(payload, dict) else None
+    if not isinstance(labels, list):
+        return JsonResponse({'detail': 'labels must be a list'}, status=400)
+    max_labels = int(os.getenv('PRODUCT_URLS_MAX_LABELS', '256'))
+    if len(labels) > max_labels:
+        return JsonResponse({'detail': f'at most {max_labels} labels per request'}, status=400)
+
+    urls: Dict[str, Optional[str]] = {}
+    try:
+        with stage('catalog'):
+            for entry in labels:
+                if isinstance(entry, dict):
+                    name, related = entry.get('name'), entry.get('related') or []
+                else:
+                    name, related = entry, []
+                if not isinstance(name, str) or not name or not isinstance(related, list):
+                    return JsonResponse({'detail': 'each label must be a name or {"name", "related"}'}, status=400)
+                urls[name] = _lookup_product_url_for_label(name, [r for r in related if isinstance(r, str)])
     except Exception as e:
-        return JsonResponse({'detail': f'Rekognition error: {str(e)}'}, status=502)
+        return JsonResponse({'detail': f'Catalog lookup error: {str(e)}'}, status=502)
+    return JsonResponse({'product_urls': urls})
+
 
-    return JsonResponse(resp)
+def metrics(request: HttpRequest):
+    """
+    Expose stage latency histograms, response counters and cache counters.
+
+    GET /api/metrics
+    Returns: Prometheus text exposition format. Counters are per process, so
+    scrape every worker (or run one worker per target).
+    """
+    if request.method != 'GET':
+        return JsonResponse({'detail': 'Method not allowed'}, status=405)
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
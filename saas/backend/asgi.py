@@ -12,5 +12,26 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+# Route /api/* to the async views in backend.api.async_views
+os.environ.setdefault('API_ASYNC_VIEWS', '1')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Load the catalog and detector now instead of on the first request
+from django.apps import apps  # noqa: E402
+
+apps.get_app_config('api').warm_up()
+
+# Imported after Django is set up; the session channel needs the app registry
+from backend.api.sessions import session_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # Django's ASGI handler only speaks HTTP, so WebSocket connections are routed here
+    if scope['type'] == 'websocket':
+        if scope['path'] == '/ws/session':
+            return await session_application(scope, receive, send)
+        await receive()
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+    return await django_application(scope, receive, send)
@@ -0,0 +1,73 @@
+"""
+Compare two benchmark reports of the same kind.
+
+    uv run python -m benchmarks.compare results/load-abc123-....json results/load-def456-....json
+
+Prints old/new values and the relative change for every shared benchmark and
+exits non-zero when a latency percentile grows, or a throughput drops, by more
+than --threshold percent.
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, Iterator, Tuple
+
+# (path within a result, True when larger is better)
+MICRO_METRICS = (('p50', False), ('p95', False), ('p99', False))
+LOAD_METRICS = (('latency_ms.p50', False), ('latency_ms.p95', False), ('latency_ms.p99', False),
+                ('throughput_rps', True))
+
+
+def _get(result: Dict[str, Any], path: str) -> Any:
+    for part in path.split('.'):
+        if not isinstance(result, dict):
+            return None
+        result = result.get(part)
+    return result
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> Iterator[Tuple[str, str, float, float, float, bool]]:
+    """Yield (benchmark, metric, old, new, change %, higher_is_better) for every shared metric."""
+    metrics = LOAD_METRICS if old.get('kind') == 'load' else MICRO_METRICS
+    for name, old_result in old['results'].items():
+        new_result = new['results'].get(name)
+        if new_result is None:
+            continue
+        for metric, higher_is_better in metrics:
+            before, after = _get(old_result, metric), _get(new_result, metric)
+            if not before or after is None:
+                continue
+            yield name, metric, before, after, (after - before) / before * 100.0, higher_is_better
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=10.0, help='Regression threshold in percent')
+    args = parser.parse_args(argv)
+
+    with open(args.old, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(args.new, encoding='utf-8') as f:
+        new = json.load(f)
+    if old.get('kind') != new.get('kind'):
+        parser.error(f"cannot compare a {old.get('kind')} report with a {new.get('kind')} report")
+
+    print(f"{old.get('commit')} -> {new.get('commit')}")
+    regressions = 0
+    for name, metric, before, after, change, higher_is_better in compare(old, new):
+        worse = -change if higher_is_better else change
+        flag = ''
+        if worse > args.threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f'{name:<32} {metric:<16} {before:>12.2f} {after:>12.2f} {change:>+8.1f}%{flag}')
+    if regressions:
+        print(f'\n{regressions} metric(s) regressed by more than {args.threshold:g}%')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
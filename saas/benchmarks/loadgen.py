@@ -0,0 +1,204 @@
+"""
+End-to-end load generator.
+
+Starts the S3 and Rekognition stubs, launches the API server pointed at them
+and drives /api/recommend, /api/detect-labels and /api/fetch-image at a fixed
+concurrency, then writes p50/p95/p99 latency and throughput per endpoint:
+
+    uv run --group prod python -m benchmarks.loadgen --server uvicorn --concurrency 32 \\
+        --requests 2000 --s3-latency-ms 20 --rekognition-latency-ms 150
+
+Pass --target to load an already running server instead (it must already be
+configured with the stub endpoints printed by ``python -m benchmarks.stubs``).
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import signal
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from .report import summarize, write_report
+from .stubs import Latency, StubServers
+
+SAAS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = ('recommend', 'detect-labels', 'fetch-image')
+BUCKET = 'bench-bucket'
+
+
+def _image_urls(stubs: Optional[StubServers], style: str, distinct: int):
+    # distinct=0 gives every request its own object, so no request is served from a cache
+    counter = itertools.count() if distinct <= 0 else itertools.cycle(range(distinct))
+    for i in counter:
+        key = f'frames/{i}.jpg'
+        if style == 'http' and stubs is not None:
+            yield f'{stubs.s3_url}/{BUCKET}/{key}'
+        else:
+            yield f's3://{BUCKET}/{key}'
+
+
+def _request(endpoint: str, image_url: str) -> Dict[str, Any]:
+    if endpoint == 'recommend':
+        return {'method': 'POST', 'url': '/api/recommend', 'json': {
+            'image_s3_url': image_url,
+            'touch_point': {'x': 540, 'y': 960},
+            'screen_resolution': {'width': 1080, 'height': 1920},
+        }}
+    if endpoint == 'detect-labels':
+        return {'method': 'POST', 'url': '/api/detect-labels', 'json': {'image_url': image_url}}
+    return {'method': 'GET', 'url': '/api/fetch-image', 'params': {'image_url': image_url}}
+
+
+async def run_endpoint(client: httpx.AsyncClient, endpoint: str, urls, total: int,
+                       concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    errors: Counter = Counter()
+    remaining = itertools.count()
+
+    async def worker():
+        while next(remaining) < total:
+            spec = _request(endpoint, next(urls))
+            start = time.perf_counter()
+            try:
+                resp = await client.request(**spec)
+                await resp.aread()
+            except httpx.HTTPError as e:
+                errors[type(e).__name__] += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000.0)
+            statuses[str(resp.status_code)] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    ok = sum(n for code, n in statuses.items() if code.startswith('2'))
+    return {
+        'requests': total,
+        'elapsed_s': elapsed,
+        'throughput_rps': len(latencies) / elapsed if elapsed else 0.0,
+        'success_rps': ok / elapsed if elapsed else 0.0,
+        'latency_ms': summarize(latencies),
+        'status': dict(statuses),
+        'errors': dict(errors),
+    }
+
+
+async def run_load(target: str, endpoints: List[str], total: int, concurrency: int, warmup: int,
+                   urls, timeout: float) -> Dict[str, Any]:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=target, limits=limits, timeout=timeout) as client:
+        results = {}
+        for endpoint in endpoints:
+            if warmup:
+                await run_endpoint(client, endpoint, urls, warmup, min(concurrency, warmup))
+            results[endpoint] = await run_endpoint(client, endpoint, urls, total, concurrency)
+        return results
+
+
+def _server_command(server: str, port: int, workers: int) -> List[str]:
+    if server == 'uvicorn':
+        return [sys.executable, '-m', 'uvicorn', 'backend.asgi:application', '--host', '127.0.0.1',
+                '--port', str(port), '--workers', str(workers), '--log-level', 'warning', '--no-access-log']
+    if server == 'gunicorn':
+        return [sys.executable, '-m', 'gunicorn', 'backend.wsgi:application', '--bind', f'127.0.0.1:{port}',
+                '--workers', str(workers), '--threads', '8', '--log-level', 'warning']
+    return [sys.executable, 'manage.py', 'runserver', f'127.0.0.1:{port}', '--noreload']
+
+
+def start_server(server: str, port: int, workers: int, env: Dict[str, str]) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        _server_command(server, port, workers), cwd=SAAS_DIR, env={**os.environ, **env},
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, start_new_session=True,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f'{server} exited: {proc.stderr.read().decode(errors="replace")[-2000:]}')
+        try:
+            # Any response (405 for a GET) means the app is serving
+            httpx.get(f'http://127.0.0.1:{port}/api/detect-labels', timeout=1)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    stop_server(proc)
+    raise RuntimeError(f'{server} did not start within 60s')
+
+
+def stop_server(proc: subprocess.Popen) -> None:
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=15)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(proc.pid, signal.SIGKILL)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', help='Base URL of a running server; skips starting stubs and a server')
+    parser.add_argument('--server', choices=('runserver', 'uvicorn', 'gunicorn'), default='runserver')
+    parser.add_argument('--workers', type=int, default=1, help='Server worker processes (uvicorn/gunicorn)')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help='Comma-separated subset of endpoints')
+    parser.add_argument('--requests', type=int, default=500, help='Measured requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--image-url-style', choices=('s3', 'http'), default='s3',
+                        help='s3:// URLs (S3Object path) or plain HTTP URLs on the S3 stub (byte path)')
+    parser.add_argument('--distinct-images', type=int, default=0,
+                        help='Cycle through this many objects (0 = a new object per request)')
+    parser.add_argument('--s3-latency-ms', type=float, default=20.0)
+    parser.add_argument('--rekognition-latency-ms', type=float, default=150.0)
+    parser.add_argument('--jitter-ms', type=float, default=10.0)
+    parser.add_argument('--fixture', help='DetectLabels response JSON returned by the Rekognition stub')
+    parser.add_argument('--output', help='Report path (default: benchmarks/results/load-<commit>-<time>.json)')
+    args = parser.parse_args(argv)
+
+    endpoints = [e.strip() for e in args.endpoints.split(',') if e.strip()]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    stubs = proc = None
+    target = args.target
+    if not target:
+        stubs = StubServers(
+            Latency(args.s3_latency_ms, args.jitter_ms),
+            Latency(args.rekognition_latency_ms, args.jitter_ms),
+            fixture_path=args.fixture,
+        )
+        env = {**stubs.environ(), 'DETECTOR_BACKEND': 'rekognition', 'DJANGO_SETTINGS_MODULE': 'backend.settings'}
+        proc = start_server(args.server, args.port, args.workers, env)
+        target = f'http://127.0.0.1:{args.port}'
+
+    try:
+        urls = _image_urls(stubs, args.image_url_style, args.distinct_images)
+        results = asyncio.run(run_load(target, endpoints, args.requests, args.concurrency, args.warmup,
+                                       urls, args.timeout))
+    finally:
+        if proc is not None:
+            stop_server(proc)
+        if stubs is not None:
+            stubs.shutdown()
+
+    print(f"{'endpoint':<14} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  status")
+    for endpoint, res in results.items():
+        lat = res['latency_ms']
+        print(f"{endpoint:<14} {res['throughput_rps']:>8.1f} {lat.get('p50', 0):>9.1f} {lat.get('p95', 0):>9.1f}"
+              f" {lat.get('p99', 0):>9.1f}  {res['status']} {res['errors'] or ''}")
+
+    config = {k: v for k, v in vars(args).items() if k != 'output'}
+    path = write_report('load', results, config, args.output)
+    print(f'\nReport written to {path}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
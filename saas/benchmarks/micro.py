@@ -0,0 +1,120 @@
+"""
+Microbenchmarks for the request hot path.
+
+    uv run python -m benchmarks.micro [--repeat 30] [--output report.json]
+
+Covers S3 URL parsing, touch-point label selection on synthetic label sets of
+10 to 1000 instances (index build + query, and query on a prebuilt index) and
+product catalog lookups. Timings are per call, in microseconds.
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+from typing import Any, Callable, Dict, List
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from backend.api.spatial import LabelIndex  # noqa: E402
+from backend.api.views import (  # noqa: E402
+    _best_label_near_point,
+    _lookup_product_url_for_label,
+    _parse_s3_url,
+)
+
+from .report import summarize, write_report  # noqa: E402
+
+INSTANCE_COUNTS = (10, 100, 1000)
+
+S3_URLS = {
+    's3_scheme': 's3://fly-vision-frames/screenshots/2025/frame-000123.png',
+    'virtual_hosted': 'https://fly-vision-frames.s3.ap-northeast-1.amazonaws.com/screenshots/frame-000123.png',
+    'path_style': 'https://s3.ap-northeast-1.amazonaws.com/fly-vision-frames/screenshots/frame-000123.png',
+    'not_s3': 'https://cdn.example.com/images/frame-000123.png',
+}
+
+
+def synthetic_labels(instances: int, per_label: int = 5, seed: int = 7) -> List[Dict[str, Any]]:
+    """DetectLabels-shaped labels with ``instances`` random boxes, ``per_label`` boxes per label."""
+    rng = random.Random(seed)
+    labels = []
+    for i in range(0, instances, per_label):
+        boxes = []
+        for _ in range(min(per_label, instances - i)):
+            width, height = rng.uniform(0.02, 0.4), rng.uniform(0.02, 0.4)
+            boxes.append({
+                'BoundingBox': {
+                    'Left': rng.uniform(0, 1 - width),
+                    'Top': rng.uniform(0, 1 - height),
+                    'Width': width,
+                    'Height': height,
+                },
+                'Confidence': rng.uniform(50, 100),
+            })
+        labels.append({
+            'Name': f'Label {i // per_label}',
+            'Confidence': max(b['Confidence'] for b in boxes),
+            'Instances': boxes,
+            'Parents': [{'Name': 'Object'}],
+            'Aliases': [],
+        })
+    return labels
+
+
+def bench(fn: Callable[[], Any], repeat: int, min_time: float = 0.05) -> Dict[str, float]:
+    timer = timeit.Timer(fn)
+    # Size each sample so it runs for at least min_time, then report per-call times
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    samples = [t / number * 1e6 for t in timer.repeat(repeat=repeat, number=number)]
+    stats = summarize(samples)
+    stats['calls_per_sample'] = number
+    stats['ops_per_sec'] = 1e6 / stats['p50'] if stats['p50'] else 0.0
+    return stats
+
+
+def run(repeat: int) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+
+    for name, url in S3_URLS.items():
+        results[f'parse_s3_url/{name}'] = bench(lambda url=url: _parse_s3_url(url), repeat)
+
+    for count in INSTANCE_COUNTS:
+        labels = synthetic_labels(count)
+        results[f'best_label_near_point/{count}'] = bench(
+            lambda labels=labels: _best_label_near_point(labels, 0.5, 0.5), repeat)
+        index = LabelIndex.from_labels(labels)
+        results[f'label_index_query/{count}'] = bench(lambda index=index: index.query(0.5, 0.5), repeat)
+
+    results['lookup_product_url/hit'] = bench(lambda: _lookup_product_url_for_label('Tie'), repeat)
+    results['lookup_product_url/related'] = bench(
+        lambda: _lookup_product_url_for_label('Neckwear', ('Accessories', 'Tie')), repeat)
+    results['lookup_product_url/miss'] = bench(
+        lambda: _lookup_product_url_for_label('Aircraft', ('Vehicle', 'Transportation')), repeat)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=30, help='Samples per benchmark')
+    parser.add_argument('--output', help='Report path (default: benchmarks/results/micro-<commit>-<time>.json)')
+    args = parser.parse_args(argv)
+
+    results = run(args.repeat)
+    width = max(len(name) for name in results)
+    print(f"{'benchmark':<{width}}  {'p50 us':>10}  {'p95 us':>10}  {'p99 us':>10}  {'ops/s':>12}")
+    for name, stats in results.items():
+        print(f"{name:<{width}}  {stats['p50']:>10.2f}  {stats['p95']:>10.2f}  {stats['p99']:>10.2f}"
+              f"  {stats['ops_per_sec']:>12.0f}")
+    path = write_report('micro', results, {'repeat': args.repeat}, args.output)
+    print(f'\nReport written to {path}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+Shared helpers for benchmark reports.
+
+Reports are JSON files stamped with the git commit, so two runs can be
+compared with ``python -m benchmarks.compare old.json new.json``.
+"""
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional, Sequence
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    # Linear interpolation between closest ranks, same as numpy's default
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99, mean, min and max of a list of samples (in whatever unit they were taken)."""
+    values = sorted(samples)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values),
+        'min': values[0],
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': values[-1],
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def write_report(kind: str, results: Dict[str, Any], config: Dict[str, Any],
+                 output: Optional[str] = None) -> str:
+    """Write a report to ``output`` (or benchmarks/results/<kind>-<commit>-<time>.json) and return its path."""
+    commit = _git_commit()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    report = {
+        'kind': kind,
+        'commit': commit,
+        'created_at': now.isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'config': config,
+        'results': results,
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{kind}-{commit or 'nogit'}-{now:%Y%m%dT%H%M%S}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    return output
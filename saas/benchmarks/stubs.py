@@ -0,0 +1,211 @@
+"""
+Local stand-ins for S3 and Rekognition with injectable latency.
+
+The backend is pointed at them through botocore's per-service endpoint
+variables (AWS_ENDPOINT_URL_S3, AWS_ENDPOINT_URL_REKOGNITION), so the whole
+service runs with no network. Run standalone with::
+
+    uv run python -m benchmarks.stubs --s3-latency-ms 20 --rekognition-latency-ms 150
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+from backend.api.detectors import DEFAULT_FIXTURE
+
+DEMO_IMAGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend', 'S3', 'demo.jpeg')
+
+
+class Latency:
+    """Fixed delay plus uniform jitter, in milliseconds."""
+
+    def __init__(self, base_ms: float = 0.0, jitter_ms: float = 0.0):
+        self.base_ms = base_ms
+        self.jitter_ms = jitter_ms
+
+    def sleep(self) -> None:
+        delay = self.base_ms + (random.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Load runs open many connections at once; the default backlog of 5 drops them
+    request_queue_size = 1024
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, headers: Dict[str, str]) -> None:
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+
+class S3StubHandler(_QuietHandler):
+    """
+    Serves GetObject, HeadObject and GetBucketLocation for any bucket and key.
+
+    Every key returns the demo JPEG with the key appended after the end-of-image
+    marker: decoders ignore the trailer, but each key hashes differently, so
+    content-keyed caches see distinct images.
+    """
+
+    image: bytes = b''
+    latency = Latency()
+    region = 'us-east-1'
+
+    def _object(self) -> Tuple[Optional[str], str]:
+        parts = urlsplit(self.path)
+        host = (self.headers.get('Host') or '').split(':')[0]
+        path = unquote(parts.path).lstrip('/')
+        bucket_from_host = host.split('.')[0] if host.count('.') >= 1 and not host.replace('.', '').isdigit() else None
+        if bucket_from_host:
+            return bucket_from_host, path
+        bucket, _, key = path.partition('/')
+        return bucket or None, key
+
+    def do_GET(self):
+        self.latency.sleep()
+        bucket, key = self._object()
+        if not key and 'location' in urlsplit(self.path).query:
+            constraint = '' if self.region == 'us-east-1' else self.region
+            body = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                    '<LocationConstraint xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+                    f'{constraint}</LocationConstraint>').encode()
+            self._send(200, body, {'Content-Type': 'application/xml'})
+            return
+        if not bucket or not key:
+            body = b'<?xml version="1.0" encoding="UTF-8"?>\n<Error><Code>NoSuchKey</Code></Error>'
+            self._send(404, body, {'Content-Type': 'application/xml'})
+            return
+        body = self.image + key.encode()
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            self._send(304, b'', {'ETag': etag})
+            return
+        self._send(200, body, {
+            'Content-Type': 'image/jpeg',
+            'ETag': etag,
+            'Last-Modified': formatdate(usegmt=True),
+            'Accept-Ranges': 'bytes',
+        })
+
+    do_HEAD = do_GET
+
+
+class RekognitionStubHandler(_QuietHandler):
+    """Answers DetectLabels (Bytes or S3Object) with a fixed DetectLabels response."""
+
+    response: Dict = DEFAULT_FIXTURE
+    latency = Latency()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        self.latency.sleep()
+        target = self.headers.get('X-Amz-Target', '')
+        if target != 'RekognitionService.DetectLabels':
+            body = json.dumps({'__type': 'InvalidRequestException', 'message': f'Unsupported target {target}'})
+            self._send(400, body.encode(), {'Content-Type': 'application/x-amz-json-1.1'})
+            return
+        min_conf = float(payload.get('MinConfidence', 0))
+        max_labels = int(payload.get('MaxLabels', 1000))
+        labels = [l for l in self.response.get('Labels', []) if l.get('Confidence', 0) >= min_conf][:max_labels]
+        body = json.dumps({'Labels': labels, 'LabelModelVersion': 'stub'}).encode()
+        self._send(200, body, {'Content-Type': 'application/x-amz-json-1.1'})
+
+
+def _serve(handler: type, host: str, port: int) -> ThreadingHTTPServer:
+    server = _StubServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name=f'{handler.__name__}', daemon=True).start()
+    return server
+
+
+class StubServers:
+    """Starts both stubs on free ports and exposes the environment that points boto3 at them."""
+
+    def __init__(self, s3_latency: Latency, rekognition_latency: Latency, host: str = '127.0.0.1',
+                 s3_port: int = 0, rekognition_port: int = 0, region: str = 'us-east-1',
+                 image_path: str = DEMO_IMAGE, fixture_path: Optional[str] = None):
+        with open(image_path, 'rb') as f:
+            image = f.read()
+        response = DEFAULT_FIXTURE
+        if fixture_path:
+            with open(fixture_path, encoding='utf-8') as f:
+                response = json.load(f)
+        s3_handler = type('S3Stub', (S3StubHandler,), {'image': image, 'latency': s3_latency, 'region': region})
+        rek_handler = type('RekognitionStub', (RekognitionStubHandler,),
+                           {'response': response, 'latency': rekognition_latency})
+        self.region = region
+        self.s3 = _serve(s3_handler, host, s3_port)
+        self.rekognition = _serve(rek_handler, host, rekognition_port)
+
+    @property
+    def s3_url(self) -> str:
+        return 'http://%s:%d' % self.s3.server_address[:2]
+
+    @property
+    def rekognition_url(self) -> str:
+        return 'http://%s:%d' % self.rekognition.server_address[:2]
+
+    def environ(self) -> Dict[str, str]:
+        return {
+            'AWS_ENDPOINT_URL_S3': self.s3_url,
+            'AWS_ENDPOINT_URL_REKOGNITION': self.rekognition_url,
+            'AWS_REGION': self.region,
+            'AWS_DEFAULT_REGION': self.region,
+            'AWS_ACCESS_KEY_ID': 'stub',
+            'AWS_SECRET_ACCESS_KEY': 'stub',
+            'AWS_SESSION_TOKEN': 'stub',
+        }
+
+    def shutdown(self) -> None:
+        self.s3.shutdown()
+        self.rekognition.shutdown()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--s3-port', type=int, default=9000)
+    parser.add_argument('--rekognition-port', type=int, default=9001)
+    parser.add_argument('--s3-latency-ms', type=float, default=0.0)
+    parser.add_argument('--rekognition-latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Uniform jitter added to both stubs')
+    parser.add_argument('--fixture', help='DetectLabels response JSON returned by the Rekognition stub')
+    args = parser.parse_args(argv)
+
+    stubs = StubServers(
+        Latency(args.s3_latency_ms, args.jitter_ms),
+        Latency(args.rekognition_latency_ms, args.jitter_ms),
+        s3_port=args.s3_port,
+        rekognition_port=args.rekognition_port,
+        fixture_path=args.fixture,
+    )
+    for name, value in stubs.environ().items():
+        print(f'export {name}={value}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stubs.shutdown()
+
+
+if __name__ == '__main__':
+    main()